@@ -0,0 +1,99 @@
+"""
+Import-time budget for the entry points.
+
+    python -m benchmarks.import_time                  # exits 1 if any entry point is over budget
+    python -m benchmarks.import_time --output imports.json
+
+Each entry point is imported in a fresh interpreter under `python -X importtime`, a few times,
+and the fastest cumulative time is checked against its budget. Entry points are also checked for
+heavy dependencies that should only load when first used, which catches a regression even on a
+machine fast enough to stay inside the time budget.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#Milliseconds; the pages are dominated by importing streamlit itself
+BUDGETS_MS = {
+    "processing.main": 250,
+    "processing.worker": 300,
+    "processing.cli": 300,
+    "processing.jobs": 150,
+    "pages.search": 800,
+    "pages.results": 800,
+}
+#Top-level packages none of the entry points may import
+HEAVY_PACKAGES = ("sklearn", "scipy", "cohere", "playwright", "numpy", "pandas", "aiohttp", "requests",
+                  "pyarrow")
+RUNS = 3
+
+
+def parse_importtime(stderr):
+    """{module: cumulative microseconds} from -X importtime output"""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        try:
+            times[name.strip()] = int(cumulative)
+        except ValueError:
+            #The header line
+            continue
+    return times
+
+
+def measure(module, runs=RUNS):
+    """Best cumulative import time of module in ms, and the heavy packages it pulled in"""
+    best = None
+    heavy = set()
+    for _ in range(runs):
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                   cwd=REPO_DIR, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(f"importing {module} failed:\n{completed.stderr[-2000:]}")
+        times = parse_importtime(completed.stderr)
+        elapsed = times[module] / 1000
+        best = elapsed if best is None else min(best, elapsed)
+        heavy |= {name.split(".")[0] for name in times if name.split(".")[0] in HEAVY_PACKAGES}
+    return best, sorted(heavy)
+
+
+def check(budgets=BUDGETS_MS, runs=RUNS):
+    """Measure every entry point; returns (results, failures)"""
+    results = {}
+    failures = []
+    for module, budget in budgets.items():
+        elapsed, heavy = measure(module, runs)
+        results[module] = {"ms": round(elapsed, 1), "budget_ms": budget, "heavy": heavy}
+        if elapsed > budget:
+            failures.append(f"{module} took {elapsed:.0f}ms to import (budget {budget}ms)")
+        if heavy:
+            failures.append(f"{module} imports {', '.join(heavy)} at import time")
+    return results, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check entry point import times against their budgets")
+    parser.add_argument("--runs", type=int, default=RUNS, help="imports per entry point; the fastest counts")
+    parser.add_argument("--output", help="also write the measurements as JSON")
+    args = parser.parse_args()
+
+    results, failures = check(runs=args.runs)
+    print(f"{'module':<20} {'ms':>8} {'budget':>8}")
+    for module, result in results.items():
+        print(f"{module:<20} {result['ms']:>8} {result['budget_ms']:>8}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+I/O cost of one investigation's data hand-offs, before and after passing profiles in memory.
+
+The "before" flow replays what findProfiles used to do with the artifact file:
+export (indent=2) -> clean_json (read + rewrite indent=4) -> json.load in findProfiles
+-> json.load in calculate_cohere_embeddings -> one json.load per clustered profile in
+summarize_cluster_full. The "after" flow writes one compact artifact and nothing is re-read.
+
+Usage: python -m benchmarks.io_roundtrip --profiles 200 [--output results.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processing.scraper import Profile, UniversalScraper, clean_json
+
+
+def make_profiles(count, seed=0):
+    rng = random.Random(seed)
+
+    def words(n):
+        return " ".join("".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(n))
+
+    profiles = []
+    for i in range(count):
+        domain = f"site{i % 40}.example"
+        profiles.append(Profile(
+            platform=domain,
+            url=f"https://{domain}/user/subject{i}",
+            username=f"subject{i}",
+            display_name=words(2),
+            bio=words(25),
+            location=words(2),
+            links=[f"https://other{j}.example/subject" for j in range(rng.randint(0, 8))],
+            page_title=words(6),
+            page_text=words(300).replace(" ", "\n", 20),
+            domain=domain,
+            followers=rng.randint(0, 100000),
+            following=rng.randint(0, 5000),
+            posts=[{"content": words(30)} for _ in range(rng.randint(0, 5))],
+            scrape_status="ok" if rng.random() > 0.2 else "auth_gate",
+        ))
+    return profiles
+
+
+class IOCounter:
+    def __init__(self):
+        self.bytes_written = 0
+        self.bytes_read = 0
+        self.parse_seconds = 0.0
+        self.serialize_seconds = 0.0
+
+    def load(self, path):
+        start = time.perf_counter()
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.parse_seconds += time.perf_counter() - start
+        self.bytes_read += os.path.getsize(path)
+        return data
+
+    def as_dict(self):
+        return {
+            "bytes_written": self.bytes_written,
+            "bytes_read": self.bytes_read,
+            "parse_seconds": round(self.parse_seconds, 6),
+            "serialize_seconds": round(self.serialize_seconds, 6),
+        }
+
+
+def run_before(scraper, profiles, path):
+    io = IOCounter()
+
+    start = time.perf_counter()
+    scraper.export_results(profiles, path, indent=2)
+    io.serialize_seconds += time.perf_counter() - start
+    io.bytes_written += os.path.getsize(path)
+
+    #clean_json reads, rewrites and truncates the file
+    size_before = os.path.getsize(path)
+    start = time.perf_counter()
+    clean_json(path)
+    io.serialize_seconds += time.perf_counter() - start
+    io.bytes_read += size_before
+    io.bytes_written += os.path.getsize(path)
+
+    data = io.load(path)          #findProfiles
+    io.load(path)                 #calculate_cohere_embeddings
+    for profile in data:
+        if profile["scrape_status"] == "ok":
+            io.load(path)         #summarize_cluster_full, once per clustered profile
+    return io
+
+
+def run_after(scraper, profiles, path):
+    io = IOCounter()
+    start = time.perf_counter()
+    rows = [asdict(profile) for profile in profiles]
+    scraper.export_results(rows, path, indent=None)
+    io.serialize_seconds += time.perf_counter() - start
+    io.bytes_written += os.path.getsize(path)
+    return io
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", type=int, default=200)
+    parser.add_argument("--output", help="also write the results JSON to this path")
+    args = parser.parse_args()
+
+    scraper = UniversalScraper(use_playwright=False)
+    #Keep stdout for the machine-readable results
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(sys.stderr):
+        before = run_before(scraper, make_profiles(args.profiles), os.path.join(tmp, "before.json"))
+        after = run_after(scraper, make_profiles(args.profiles), os.path.join(tmp, "after.json"))
+
+    results = {
+        "benchmark": "io_roundtrip",
+        "profiles": args.profiles,
+        "before": before.as_dict(),
+        "after": after.as_dict(),
+    }
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Offline end-to-end benchmark suite.
+
+    python -m benchmarks.run                         # every scenario
+    python -m benchmarks.run -s sweep -s clustering  # a subset
+    python -m benchmarks.run --output bench.json     # also save the results
+    python -m benchmarks.run --compare old.json new.json
+
+Every scenario runs in its own child process, inside a scratch directory with an empty data/
+folder, so peak RSS is per scenario and nothing touches the real data/osint.db. Results are
+JSON with the commit they were taken on, so runs can be compared across commits.
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_child(name, params, result_path):
+    """Entry point inside the child process"""
+    sys.path.insert(0, REPO_DIR)
+    from benchmarks.scenarios import SCENARIOS
+
+    workspace = tempfile.mkdtemp(prefix=f"deepsint-bench-{name}-")
+    os.makedirs(os.path.join(workspace, "data"))
+    os.chdir(workspace)
+
+    #Scenario code prints progress; keep it off the result channel
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            result = SCENARIOS[name](**params)
+        except Exception as e:
+            result = {"error": f"{type(e).__name__}: {e}"}
+    result["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+
+def run_scenario(name, params, verbose=False):
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        result_path = f.name
+    try:
+        completed = subprocess.run(
+            [sys.executable, "-m", "benchmarks.run", "--child", name,
+             "--params", json.dumps(params), "--result-path", result_path],
+            cwd=REPO_DIR, stdout=subprocess.DEVNULL if not verbose else None,
+            stderr=subprocess.DEVNULL if not verbose else None,
+        )
+        if completed.returncode != 0:
+            return {"error": f"child exited with {completed.returncode}"}
+        with open(result_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        os.unlink(result_path)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_path, new_path):
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"{'scenario':<20} {'old s':>10} {'new s':>10} {'speedup':>8} {'old rss MB':>11} {'new rss MB':>11}")
+    for name in sorted(set(old["scenarios"]) | set(new["scenarios"])):
+        a = old["scenarios"].get(name, {})
+        b = new["scenarios"].get(name, {})
+        wall_a, wall_b = a.get("wall_seconds"), b.get("wall_seconds")
+        speedup = f"{wall_a / wall_b:.2f}x" if wall_a and wall_b else "-"
+        rss_a = f"{a['peak_rss_kb'] / 1024:.1f}" if "peak_rss_kb" in a else "-"
+        rss_b = f"{b['peak_rss_kb'] / 1024:.1f}" if "peak_rss_kb" in b else "-"
+        print(f"{name:<20} {wall_a if wall_a is not None else '-':>10} {wall_b if wall_b is not None else '-':>10} "
+              f"{speedup:>8} {rss_a:>11} {rss_b:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-s", "--scenario", action="append", help="scenario to run (repeatable)")
+    parser.add_argument("--params", default="{}",
+                        help='JSON keyword arguments per scenario, e.g. \'{"sweep": {"sites": 100}}\'')
+    parser.add_argument("--output", help="write the results JSON here as well as to stdout")
+    parser.add_argument("--list", action="store_true", help="list scenarios and exit")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show scenario output")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--result-path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_child(args.child, json.loads(args.params), args.result_path)
+    if args.compare:
+        return compare(*args.compare)
+
+    sys.path.insert(0, REPO_DIR)
+    from benchmarks.scenarios import SCENARIOS
+    if args.list:
+        for name, func in SCENARIOS.items():
+            print(f"{name:<20} {func.__doc__}")
+        return
+
+    names = args.scenario or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    params = json.loads(args.params)
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "scenarios": {},
+    }
+    for name in names:
+        print(f"Running {name}...", file=sys.stderr)
+        results["scenarios"][name] = run_scenario(name, params.get(name, {}), verbose=args.verbose)
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
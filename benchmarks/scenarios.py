@@ -0,0 +1,297 @@
+"""
+Benchmark scenarios. Each one runs against the local servers in benchmarks/servers.py and returns
+a dict with at least wall_seconds, items and throughput (items per second).
+"""
+import asyncio
+import contextlib
+import os
+import random
+import time
+
+from benchmarks.io_roundtrip import make_profiles
+from benchmarks.servers import FixtureServer, FakeCohereServer
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+def _result(wall, items, **extra):
+    return dict(wall_seconds=round(wall, 4), items=items,
+                throughput=round(items / wall, 3) if wall else None, **extra)
+
+
+@contextlib.contextmanager
+def fake_cohere(**latency):
+    """
+    Run the fake Cohere API and point the client at it through the environment.
+    The cohere client reads CO_API_URL when it is imported, so import processing code inside this block.
+    """
+    with FakeCohereServer(**latency) as server:
+        previous = {key: os.environ.get(key) for key in server.environment()}
+        os.environ.update(server.environment())
+        try:
+            yield server
+        finally:
+            for key, value in previous.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+
+@scenario("sweep")
+def sweep(sites=724, per_host=8, global_limit=64):
+    """Native username sweep over a WhatsMyName-sized site list"""
+    from processing.discovery import sweep_username, HostLimiter
+
+    with FixtureServer() as server:
+        site_list = server.sweep_sites(sites)
+        start = time.perf_counter()
+        hits = asyncio.run(sweep_username("lordfurno", sites=site_list,
+                                          limiter=HostLimiter(global_limit=global_limit, per_host=per_host)))
+        wall = time.perf_counter() - start
+        return _result(wall, sites, hits=len(hits), requests=dict(server.requests))
+
+
+@scenario("batch_scrape")
+def batch_scrape(delay=0.0):
+    """Sequential UniversalScraper.batch_scrape over recorded, slow, dead, login-walled and huge pages"""
+    from processing.scraper import UniversalScraper
+
+    with FixtureServer() as server:
+        urls = server.mixed_urls()
+        scraper = UniversalScraper(use_playwright=True, headless=True)
+        start = time.perf_counter()
+        profiles = asyncio.run(scraper.batch_scrape(urls, delay))
+        wall = time.perf_counter() - start
+        return _result(wall, len(urls), scraped=len(profiles),
+                       statuses=_count(p.scrape_status for p in profiles), requests=dict(server.requests))
+
+
+@scenario("scrape_stream")
+def scrape_stream(concurrency=4, delay=0.0):
+    """Concurrent scrape_stream on one shared browser over the same URLs as batch_scrape"""
+    from processing.scraper import UniversalScraper
+
+    async def run(urls):
+        async with UniversalScraper(use_playwright=True, headless=True) as scraper:
+            return [p async for p in scraper.scrape_stream(urls, delay=delay, concurrency=concurrency)]
+
+    with FixtureServer() as server:
+        urls = server.mixed_urls()
+        start = time.perf_counter()
+        profiles = asyncio.run(run(urls))
+        wall = time.perf_counter() - start
+        return _result(wall, len(urls), scraped=len(profiles),
+                       statuses=_count(p.scrape_status for p in profiles), requests=dict(server.requests))
+
+
+@scenario("sharded_scrape")
+def sharded_scrape(shards=(1, 2, 4), hosts=8, concurrency=4, delay=0.0):
+    """
+    ShardedScraper over the recorded pages served from `hosts` servers (one host each), at each
+    shard count. URLs are split between shards by host, so hosts should be a few times the shards.
+    """
+    from processing.shards import ShardedScraper
+
+    async def run(urls, count):
+        async with ShardedScraper(count, per_host=concurrency, global_limit=count * concurrency) as scraper:
+            start = time.perf_counter()
+            profiles = [p async for p in scraper.scrape_stream(urls, delay=delay, concurrency=concurrency)]
+            return time.perf_counter() - start, profiles
+
+    with contextlib.ExitStack() as stack:
+        servers = [stack.enter_context(FixtureServer()) for _ in range(hosts)]
+        urls = [url for server in servers for url in server.profile_urls()]
+        by_shards = {}
+        for count in shards:
+            #Browser launch is excluded, it happens once per worker
+            wall, profiles = asyncio.run(run(urls, count))
+            by_shards[str(count)] = {"wall_seconds": round(wall, 4), "scraped": len(profiles),
+                                     "throughput": round(len(urls) / wall, 3) if wall else None}
+        return _result(wall, len(urls), by_shards=by_shards)
+
+
+@scenario("embeddings")
+def embeddings(profiles=200):
+    """calculate_cohere_embeddings, one embed call per profile"""
+    from dataclasses import asdict
+
+    data = [asdict(p) for p in make_profiles(profiles)]
+    with fake_cohere() as server:
+        from processing.profiler import calculate_cohere_embeddings
+        start = time.perf_counter()
+        _, meta = calculate_cohere_embeddings(data)
+        wall = time.perf_counter() - start
+        return _result(wall, len(meta), requests=dict(server.requests))
+
+
+@scenario("embeddings_batched")
+def embeddings_batched(profiles=200):
+    """embed_texts in EMBED_BATCH_SIZE batches, as the pipeline's embed stage does"""
+    from dataclasses import asdict
+
+    rows = [asdict(p) for p in make_profiles(profiles) if p.scrape_status == "ok"]
+    with fake_cohere() as server:
+        from processing.profiler import get_cohere_client, embed_texts, profile_metadata_text, EMBED_BATCH_SIZE
+        start = time.perf_counter()
+        co = get_cohere_client()
+        texts = [profile_metadata_text(row) for row in rows]
+        vectors = []
+        for i in range(0, len(texts), EMBED_BATCH_SIZE):
+            vectors.extend(embed_texts(co, texts[i:i + EMBED_BATCH_SIZE]))
+        wall = time.perf_counter() - start
+        return _result(wall, len(vectors), requests=dict(server.requests))
+
+
+@scenario("clustering")
+def clustering(sizes=(50, 100, 200, 400), dimension=1024, groups=8, seed=0):
+    """cluster_profiles_from_modalities at growing n, with planted groups"""
+    import numpy as np
+    from processing.profiler import cluster_profiles_from_modalities
+
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(groups, dimension))
+    by_size = {}
+    total_wall = 0.0
+    total_items = 0
+    for n in sizes:
+        labels = rng.integers(0, groups, size=n)
+        vectors = centers[labels] + 0.3 * rng.normal(size=(n, dimension))
+        meta = {i: vectors[i].tolist() for i in range(n)}
+        start = time.perf_counter()
+        _, clusters, _, _ = cluster_profiles_from_modalities({}, meta)
+        wall = time.perf_counter() - start
+        by_size[str(n)] = {"wall_seconds": round(wall, 4), "clusters": len(clusters)}
+        total_wall += wall
+        total_items += n
+    return _result(total_wall, total_items, by_size=by_size)
+
+
+@scenario("recluster")
+def recluster(sizes=(100, 400, 1000), dimension=1024, groups=8, eps_steps=50, seed=0):
+    """One ClusterStructure per n, then clusterings across eps_steps eps values and a new weighting"""
+    import numpy as np
+    from processing.cluster_structure import ClusterStructure
+
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(groups, dimension))
+    by_size = {}
+    total_wall = 0.0
+    total_items = 0
+    for n in sizes:
+        labels = rng.integers(0, groups, size=n)
+        vectors = centers[labels] + 0.3 * rng.normal(size=(n, dimension))
+        meta = {i: vectors[i].tolist() for i in range(n)}
+        pfp = {i: vectors[i].tolist() for i in range(0, n, 2)}
+        start = time.perf_counter()
+        structure = ClusterStructure.from_embeddings(pfp, meta)
+        structure.tree()
+        built = time.perf_counter() - start
+        start = time.perf_counter()
+        for eps in np.linspace(0.05, 0.95, eps_steps):
+            structure.cluster(eps)
+        sweep = time.perf_counter() - start
+        start = time.perf_counter()
+        structure.cluster(0.5, w_meta=0.4, w_pfp=0.6)
+        reweight = time.perf_counter() - start
+        by_size[str(n)] = {"build_seconds": round(built, 4), "per_eps_ms": round(sweep / eps_steps * 1000, 3),
+                           "reweight_ms": round(reweight * 1000, 2), "suggested_eps": structure.suggest_eps()}
+        total_wall += built + sweep + reweight
+        total_items += n
+    return _result(total_wall, total_items, by_size=by_size)
+
+
+@scenario("profile_formats")
+def profile_formats(profiles=20000):
+    """Memory per profile (objects, dicts, columnar) and write/load time of JSON, Arrow and Parquet files"""
+    import json
+    import tracemalloc
+    from dataclasses import asdict
+    from processing.profile_batch import ProfileBatch, ProfileWriter
+
+    def allocated(build):
+        tracemalloc.start()
+        value = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return value, size
+
+    objects, object_bytes = allocated(lambda: make_profiles(profiles))
+    #Dicts as a loaded JSON artifact holds them (asdict copies would share the objects' strings)
+    text = json.dumps([asdict(p) for p in objects], default=str)
+    _, dict_bytes = allocated(lambda: json.loads(text))
+    batch = ProfileBatch.from_profiles(objects)
+    memory = {"objects": round(object_bytes / profiles), "dicts": round(dict_bytes / profiles),
+              "columnar": round(batch.nbytes / profiles)}
+
+    files = {}
+    total_wall = 0.0
+    for name in ("profiles.json", "profiles.arrow", "profiles.parquet"):
+        start = time.perf_counter()
+        if name.endswith(".json"):
+            with open(name, "w", encoding="utf-8") as f:
+                json.dump([asdict(p) for p in objects], f, separators=(",", ":"), default=str)
+        else:
+            with ProfileWriter(name) as writer:
+                writer.write(objects)
+        write = time.perf_counter() - start
+
+        #Open, then one analysis query: total followers per platform
+        start = time.perf_counter()
+        if name.endswith(".json"):
+            with open(name, encoding="utf-8") as f:
+                rows = json.load(f)
+            opened = time.perf_counter() - start
+            totals = {}
+            for row in rows:
+                totals[row["platform"]] = totals.get(row["platform"], 0) + (row["followers"] or 0)
+        else:
+            loaded = ProfileBatch.read(name)
+            opened = time.perf_counter() - start
+            loaded.table.group_by("platform").aggregate([("followers", "sum")])
+        query = time.perf_counter() - start
+        total_wall += write + query
+        files[name.split(".")[-1]] = {"bytes": os.path.getsize(name), "write_seconds": round(write, 4),
+                                      "open_seconds": round(opened, 4), "open_and_query_seconds": round(query, 4)}
+    return _result(total_wall, profiles, bytes_per_profile=memory, files=files)
+
+
+@scenario("find_profiles")
+def find_profiles(concurrency=4):
+    """Full findProfiles over the recorded fixtures with the fake Cohere API"""
+    with FixtureServer() as sites, fake_cohere() as cohere_server:
+        from processing.main import findProfiles
+        urls = sites.mixed_urls()
+        start = time.perf_counter()
+        result = asyncio.run(findProfiles(urls, f"bench{random.randrange(10 ** 6)}",
+                                          refresh_summaries=True,
+                                          pipeline_options={"scrape_delay": 0.0,
+                                                            "scrape_concurrency": concurrency,
+                                                            "embedding_cache": None}))
+        wall = time.perf_counter() - start
+        requests = dict(sites.requests)
+        requests.update({f"cohere_{k}": v for k, v in cohere_server.requests.items()})
+        return _result(wall, len(urls), clusters=len(result), requests=requests)
+
+
+@scenario("import_time")
+def import_time(runs=3):
+    """Cold import of every entry point, checked against the budgets in benchmarks/import_time.py"""
+    from benchmarks.import_time import check
+    results, failures = check(runs=runs)
+    wall = sum(result["ms"] for result in results.values()) / 1000
+    return _result(wall, len(results), modules=results, failures=failures)
+
+
+def _count(values):
+    counts = {}
+    for value in values:
+        counts[value] = counts.get(value, 0) + 1
+    return counts
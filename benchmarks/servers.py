@@ -0,0 +1,281 @@
+"""
+Local stand-ins for profile sites and the Cohere API, so benchmarks run offline and repeatably.
+
+FixtureServer routes:
+    /profile/<name>             recorded HTML page from fixtures/profiles/<name>.html
+    /api/<name>                 recorded JSON API response from fixtures/api/<name>.json
+    /login/<name>               login-walled page (password field)
+    /slow/<ms>/<route>          any route above, after a delay
+    /dead/<anything>            connection dropped without a response
+    /huge/<kb>                  generated profile page of roughly <kb> kilobytes
+    /sweep/<site>/<account>     WhatsMyName-style check; every third site reports a hit
+
+FakeCohereServer implements POST /v2/embed and /v2/chat (plain and streamed) with configurable
+latency. Embeddings are hashed bags of words, so similar pages still end up close together.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+EMBED_DIMENSION = 256
+
+
+class _BackgroundServer:
+    """ThreadingHTTPServer on an ephemeral port, run in a daemon thread, counting requests per route"""
+
+    handler_class = None
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        handler = type("Handler", (self.handler_class,), {"server_ref": self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, route):
+        with self._lock:
+            self.requests[route] += 1
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, content_type):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _read_fixture(*parts):
+    path = os.path.join(FIXTURE_DIR, *parts)
+    if not os.path.isfile(path):
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def huge_page(kilobytes):
+    paragraph = ("<p>Open source maintainer, chess enthusiast and weekend climber. "
+                 "Writes about distributed systems, compilers and coffee.</p>\n")
+    repeat = max(1, (kilobytes * 1024) // len(paragraph))
+    return (f"<html><head><title>huge profile</title></head><body>"
+            f"<h1 class='display-name'>Huge Page</h1><div class='bio'>Very long profile</div>"
+            f"{paragraph * repeat}</body></html>")
+
+
+class FixtureHandler(_QuietHandler):
+    server_ref = None
+
+    def do_GET(self):
+        self.route(self.path.split("?", 1)[0])
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        self.route(self.path.split("?", 1)[0])
+
+    def route(self, path):
+        parts = [p for p in path.split("/") if p]
+        kind = parts[0] if parts else ""
+        self.server_ref.count(kind)
+
+        if kind == "slow" and len(parts) >= 3:
+            time.sleep(int(parts[1]) / 1000)
+            return self.route("/" + "/".join(parts[2:]))
+        if kind == "dead":
+            self.close_connection = True
+            self.connection.close()
+            return
+        if kind == "huge" and len(parts) == 2:
+            return self.send_body(200, huge_page(int(parts[1])), "text/html; charset=utf-8")
+        if kind == "sweep" and len(parts) == 3:
+            if int(parts[1]) % 3 == 0:
+                return self.send_body(200, f"<html><div class='profile'>{parts[2]}</div></html>", "text/html")
+            return self.send_body(404, "<html>Not Found</html>", "text/html")
+        if kind in ("profile", "login") and len(parts) == 2:
+            body = _read_fixture("profiles" if kind == "profile" else "login", parts[1] + ".html")
+            if body is not None:
+                return self.send_body(200, body, "text/html; charset=utf-8")
+        if kind == "api" and len(parts) == 2:
+            body = _read_fixture("api", parts[1] + ".json")
+            if body is not None:
+                return self.send_body(200, body, "application/json")
+        self.send_body(404, "not found", "text/plain")
+
+
+class FixtureServer(_BackgroundServer):
+    handler_class = FixtureHandler
+
+    def profile_urls(self):
+        """One URL per recorded page and API fixture"""
+        urls = []
+        for name in sorted(os.listdir(os.path.join(FIXTURE_DIR, "profiles"))):
+            urls.append(f"{self.base_url}/profile/{name[:-5]}")
+        for name in sorted(os.listdir(os.path.join(FIXTURE_DIR, "api"))):
+            urls.append(f"{self.base_url}/api/{name[:-5]}")
+        return urls
+
+    def mixed_urls(self, slow_ms=1500, huge_kb=2048):
+        """Recorded pages plus the slow, dead, login-walled and huge cases"""
+        return self.profile_urls() + [
+            f"{self.base_url}/slow/{slow_ms}/profile/{self.first_profile()}",
+            f"{self.base_url}/dead/profile",
+            f"{self.base_url}/login/signin",
+            f"{self.base_url}/huge/{huge_kb}",
+        ]
+
+    def first_profile(self):
+        return sorted(os.listdir(os.path.join(FIXTURE_DIR, "profiles")))[0][:-5]
+
+    def sweep_sites(self, count):
+        """WhatsMyName-format site list pointing at this server"""
+        return [{
+            "name": f"site{i}",
+            "uri_check": f"{self.base_url}/sweep/{i}/{{account}}",
+            "e_code": 200,
+            "e_string": "class='profile'",
+            "m_string": "Not Found",
+            "m_code": 404,
+            "known": [],
+            "cat": "benchmark",
+        } for i in range(count)]
+
+
+def hashed_embedding(text, dimension=EMBED_DIMENSION):
+    """Deterministic bag-of-words embedding, L2 normalised"""
+    vector = [0.0] * dimension
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=4).digest()
+        index = int.from_bytes(digest, "little")
+        vector[index % dimension] += 1.0 if index & 1 << 31 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class FakeCohereHandler(_QuietHandler):
+    server_ref = None
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        path = self.path.split("?", 1)[0].rstrip("/")
+        server = self.server_ref
+
+        if path.endswith("/v2/embed"):
+            server.count("embed")
+            texts = payload.get("texts") or []
+            server.count_items("embed_texts", len(texts))
+            time.sleep(server.embed_latency + server.embed_latency_per_text * len(texts))
+            body = {
+                "id": "bench",
+                "embeddings": {"float": [hashed_embedding(t) for t in texts]},
+                "texts": texts,
+                "meta": {"api_version": {"version": "2"}},
+                "response_type": "embeddings_by_type",
+            }
+            return self.send_body(200, json.dumps(body), "application/json")
+
+        if path.endswith("/v2/chat"):
+            server.count("chat_stream" if payload.get("stream") else "chat")
+            words = server.summary_words(payload)
+            if payload.get("stream"):
+                return self.stream_chat(words)
+            time.sleep(server.chat_latency + server.chat_token_latency * len(words))
+            body = {
+                "id": "bench",
+                "finish_reason": "COMPLETE",
+                "message": {"role": "assistant", "content": [{"type": "text", "text": " ".join(words)}]},
+                "usage": {"billed_units": {"input_tokens": 1, "output_tokens": len(words)}},
+            }
+            return self.send_body(200, json.dumps(body), "application/json")
+
+        self.send_body(404, json.dumps({"message": "not found"}), "application/json")
+
+    def stream_chat(self, words):
+        server = self.server_ref
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(data):
+            self.wfile.write(f"event: {data['type']}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        time.sleep(server.chat_latency)
+        event({"type": "message-start", "id": "bench", "delta": {"message": {"role": "assistant"}}})
+        event({"type": "content-start", "index": 0, "delta": {"message": {"content": {"type": "text", "text": ""}}}})
+        for i, word in enumerate(words):
+            time.sleep(server.chat_token_latency)
+            text = word if i == 0 else " " + word
+            event({"type": "content-delta", "index": 0, "delta": {"message": {"content": {"text": text}}}})
+        event({"type": "content-end", "index": 0})
+        event({"type": "message-end", "delta": {"finish_reason": "COMPLETE"}})
+
+
+class FakeCohereServer(_BackgroundServer):
+    handler_class = FakeCohereHandler
+
+    def __init__(self, embed_latency=0.05, embed_latency_per_text=0.002,
+                 chat_latency=0.3, chat_token_latency=0.01, summary_length=40, **kwargs):
+        super().__init__(**kwargs)
+        self.embed_latency = embed_latency
+        self.embed_latency_per_text = embed_latency_per_text
+        self.chat_latency = chat_latency
+        self.chat_token_latency = chat_token_latency
+        self.summary_length = summary_length
+
+    def count_items(self, route, n):
+        with self._lock:
+            self.requests[route] += n
+
+    def summary_words(self, payload):
+        """A summary made of the first words of the documents, so it varies with the input"""
+        words = []
+        for doc in payload.get("documents") or []:
+            text = doc.get("data", {}).get("text", "") if isinstance(doc, dict) else str(doc)
+            words.extend(text.split())
+            if len(words) >= self.summary_length:
+                break
+        return (words or ["nothing", "to", "summarize"])[:self.summary_length]
+
+    def environment(self):
+        """Environment variables that point the cohere client at this server"""
+        return {"CO_API_URL": self.base_url, "COHERE_API_KEY": "benchmark"}
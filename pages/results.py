@@ -1,64 +1,12 @@
 import streamlit as st
-import aiosqlite
-import json
-import asyncio
 from datetime import datetime
+from processing.results_store import PAGE_SIZE
+from ui.data import init_storage, current_version, results_page, result_detail, profile_search, cluster_structure
 
-DB_PATH = "data/osint.db"
-
-async def get_all_results():
-    """Retrieve all processing results from database"""
-    try:
-        async with aiosqlite.connect(DB_PATH) as db:
-            cursor = await db.execute("""
-                SELECT id, username, total_profiles, clusters_json, file_path, status, created_at
-                FROM processing_results 
-                ORDER BY created_at DESC
-            """)
-            rows = await cursor.fetchall()
-            
-            results = []
-            for row in rows:
-                result = {
-                    "id": row[0],
-                    "username": row[1],
-                    "total_profiles": row[2],
-                    "clusters": json.loads(row[3]) if row[3] else {},
-                    "file_path": row[4],
-                    "status": row[5],
-                    "created_at": row[6]
-                }
-                results.append(result)
-            return results
-    except Exception as e:
-        st.error(f"Error retrieving results: {e}")
-        return []
+#Hits shown for a profile search
+SEARCH_LIMIT = 20
 
-async def get_result_by_id(result_id):
-    """Retrieve specific result by ID"""
-    try:
-        async with aiosqlite.connect(DB_PATH) as db:
-            cursor = await db.execute("""
-                SELECT id, username, total_profiles, clusters_json, file_path, status, created_at
-                FROM processing_results 
-                WHERE id = ?
-            """, (result_id,))
-            row = await cursor.fetchone()
-            
-            if row:
-                return {
-                    "id": row[0],
-                    "username": row[1],
-                    "total_profiles": row[2],
-                    "clusters": json.loads(row[3]) if row[3] else {},
-                    "file_path": row[4],
-                    "status": row[5],
-                    "created_at": row[6]
-                }
-            return None
-    except Exception as e:
-        st.error(f"Error retrieving result: {e}")
-        return None
+DB_PATH = "data/osint.db"
 
 def format_datetime(iso_string):
     """Format ISO datetime string for display"""
@@ -68,22 +16,184 @@ def format_datetime(iso_string):
     except:
         return iso_string
 
+def _reset_pages():
+    # Cursors of the pages before the current one; empty means first page
+    st.session_state.results_cursors = []
+    st.session_state.results_cursor = None
+
+def show_result_detail(result_id):
+    """Clusters and members are only read for the result that is open"""
+    detail = result_detail(result_id, db_path=DB_PATH)
+    if not detail:
+        return
+    selected_result = detail['result']
+
+    st.divider()
+    st.subheader(f"Detailed Results for: {selected_result['username']}")
+
+    # Overview metrics
+    col1, col2, col3, col4 = st.columns(4)
+
+    with col1:
+        st.metric("Total Profiles", selected_result['total_profiles'])
+
+    with col2:
+        st.metric("Clusters Found", selected_result['cluster_count'])
+
+    with col3:
+        st.metric("Status", selected_result['status'])
+
+    with col4:
+        st.metric("Date", format_datetime(selected_result['created_at']))
+
+    # Changes recorded by a delta re-investigation
+    changes = detail['changes']
+    if changes:
+        with st.expander(f"Changes since the previous investigation ({len(changes)})", expanded=False):
+            for change in changes:
+                where = f"**{change['platform'] or 'Unknown'}**: {change['url']}"
+                if change['change'] == 'changed':
+                    st.write(f"✏️ {where}: {change['field']} changed from "
+                             f"\"{change['old_value'] or ''}\" to \"{change['new_value'] or ''}\"")
+                elif change['change'] == 'added':
+                    st.write(f"➕ {where}")
+                else:
+                    st.write(f"➖ {where}")
+
+    # Display clusters
+    clusters = detail['clusters']
+    if clusters:
+        st.subheader("Cluster Analysis")
+
+        for cluster in clusters:
+            with st.expander(f"📁 Cluster {cluster['cluster_key']}", expanded=False):
+
+                # Cluster summary
+                col1, col2 = st.columns(2)
+
+                with col1:
+                    st.write(f"**Profile Count:** {cluster['profile_count']}")
+                    st.write(f"**Platforms:** {', '.join(p or 'Unknown' for p in cluster['platforms'])}")
+
+                with col2:
+                    if cluster['summary']:
+                        st.write("**Summary:**")
+                        st.write(cluster['summary'])
+
+                # Show profiles in this cluster
+                members = cluster['members']
+                if members:
+                    st.write("**Profiles:**")
+                    for i, profile in enumerate(members, 1):
+                        platform = profile['platform'] or 'Unknown'
+                        url = profile['url'] or 'No URL'
+                        st.write(f"{i}. **{platform}**: {url}")
+
+    if selected_result['file_path']:
+        show_granularity(selected_result['file_path'], clusters)
+
+    # Clear selection button
+    if st.button("← Back to Results List"):
+        del st.session_state.selected_result_id
+        st.rerun()
+
+@st.fragment
+def show_granularity(file_path, clusters):
+    """Re-cluster a saved result at another eps or weighting; reruns only this section"""
+    loaded = cluster_structure(file_path, db_path=DB_PATH)
+    if loaded is None or len(loaded[0]) < 2:
+        return
+    structure, saved = loaded
+    members = {m['profile_index']: m for cluster in clusters for m in cluster['members']}
+
+    with st.expander("Adjust clustering granularity", expanded=False):
+        # Weighting only matters once some profiles have a picture embedding; at 0 metadata
+        # weight, pairs without pictures would have no similarity at all
+        if structure.has_pfp.any():
+            w_meta = st.slider("Metadata weight (the rest goes to profile pictures)", 0.05, 1.0,
+                               max(0.05, float(saved['w_meta'])), 0.05, key=f"w_meta_{file_path}")
+            w_pfp = round(1.0 - w_meta, 2)
+        else:
+            w_meta, w_pfp = saved['w_meta'], saved['w_pfp']
+        suggested = structure.suggest_eps(w_meta, w_pfp)
+        eps = st.slider("Max distance within a cluster (eps)", 0.0, 1.0, float(saved['eps']), 0.01,
+                        key=f"eps_{file_path}",
+                        help="Lower splits profiles into tighter clusters, higher merges them")
+        st.caption(f"Suggested eps: {suggested} (widest gap between merge distances); "
+                   f"saved clusters used {saved['eps']}")
+
+        # Cluster count across eps, from the same spanning tree
+        steps = [round(step * 0.02, 2) for step in range(51)]
+        st.line_chart({"eps": steps, "clusters": structure.cluster_counts(steps, w_meta, w_pfp).tolist()},
+                      x="eps", y="clusters", height=160)
+
+        _, regrouped = structure.cluster(eps, w_meta, w_pfp)
+        st.write(f"**{len(regrouped)} clusters** at eps {eps} (summaries above are for the saved clusters)")
+        for label, indices in sorted(regrouped.items(), key=lambda item: -len(item[1])):
+            lines = [f"{members[i]['platform'] or 'Unknown'}: {members[i]['url'] or 'No URL'}"
+                     if i in members else f"Profile {i}" for i in indices]
+            st.markdown(f"**Cluster {label}** ({len(indices)})  \n" + "  \n".join(lines))
+
+def show_profile_search():
+    """Ranked full-text hits over every scraped profile and summary, each linking to its investigation"""
+    query = st.text_input("Search all scraped profiles",
+                          placeholder="employer, handle, location... (add * for prefix matches)").strip()
+    if not query:
+        return
+
+    try:
+        hits = profile_search(current_version(DB_PATH), query, SEARCH_LIMIT, db_path=DB_PATH)
+    except Exception as e:
+        st.error(f"Search failed: {e}")
+        return
+
+    if not hits:
+        st.info("No profiles match that search.")
+        return
+
+    st.caption(f"Top {len(hits)} matches")
+    for hit in hits:
+        col1, col2 = st.columns([5, 1])
+        with col1:
+            if hit['kind'] == 'summary':
+                st.markdown(f"**Cluster summary** · {hit['username']}")
+            else:
+                st.markdown(f"{hit['title'] or hit['platform'] or 'Profile'} · {hit['platform'] or ''} · "
+                            f"{hit['username']} · {hit['url'] or ''}")
+            st.caption(hit['snippet'])
+        with col2:
+            if hit['result_id'] is not None and st.button("Open", key=f"hit_{hit['rowid']}"):
+                st.session_state.selected_result_id = hit['result_id']
+                st.rerun()
+
 def show_results_page():
     st.title("📊 OSINT Results")
-    
-    # Get all results
-    results = asyncio.run(get_all_results())
-    
-    if not results:
+    init_storage(DB_PATH)
+
+    if "results_cursors" not in st.session_state:
+        _reset_pages()
+
+    show_profile_search()
+
+    username = st.text_input("Filter by username", key="results_username", on_change=_reset_pages).strip()
+
+    try:
+        results, next_cursor = results_page(current_version(DB_PATH), st.session_state.results_cursor,
+                                            username=username or None, db_path=DB_PATH)
+    except Exception as e:
+        st.error(f"Error retrieving results: {e}")
+        return
+
+    if not results and not st.session_state.results_cursors:
         st.info("No results found. Run some searches first!")
         return
-    
+
     # Results overview
     st.subheader("Recent Searches")
-    
+
     # Create columns for the results table
     col1, col2, col3, col4, col5 = st.columns([2, 1, 1, 1, 2])
-    
+
     with col1:
         st.write("**Username**")
     with col2:
@@ -94,85 +204,49 @@ def show_results_page():
         st.write("**Status**")
     with col5:
         st.write("**Date**")
-    
+
     st.divider()
-    
-    # Display each result
+
+    # Display each result on this page
     for result in results:
         col1, col2, col3, col4, col5 = st.columns([2, 1, 1, 1, 2])
-        
+
         with col1:
             if st.button(f"🔍 {result['username']}", key=f"btn_{result['id']}"):
                 st.session_state.selected_result_id = result['id']
-        
+
         with col2:
             st.write(result['total_profiles'])
-        
+
         with col3:
-            st.write(len(result['clusters']))
-        
+            st.write(result['cluster_count'])
+
         with col4:
             status_color = "🟢" if result['status'] == 'success' else "🔴"
             st.write(f"{status_color} {result['status']}")
-        
+
         with col5:
             st.write(format_datetime(result['created_at']))
-    
+
+    # Pagination
+    page_number = len(st.session_state.results_cursors) + 1
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if st.button("← Newer", disabled=page_number == 1):
+            st.session_state.results_cursor = st.session_state.results_cursors.pop()
+            st.rerun()
+    with col2:
+        st.caption(f"Page {page_number} ({PAGE_SIZE} per page)")
+    with col3:
+        if st.button("Older →", disabled=next_cursor is None):
+            st.session_state.results_cursors.append(st.session_state.results_cursor)
+            st.session_state.results_cursor = next_cursor
+            st.rerun()
+
     # Show detailed view if a result is selected
     if 'selected_result_id' in st.session_state:
-        selected_result = asyncio.run(get_result_by_id(st.session_state.selected_result_id))
-        
-        if selected_result:
-            st.divider()
-            st.subheader(f"Detailed Results for: {selected_result['username']}")
-            
-            # Overview metrics
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                st.metric("Total Profiles", selected_result['total_profiles'])
-            
-            with col2:
-                st.metric("Clusters Found", len(selected_result['clusters']))
-            
-            with col3:
-                st.metric("Status", selected_result['status'])
-            
-            with col4:
-                st.metric("Date", format_datetime(selected_result['created_at']))
-            
-            # Display clusters
-            if selected_result['clusters']:
-                st.subheader("Cluster Analysis")
-                
-                for cluster_name, cluster_data in selected_result['clusters'].items():
-                    with st.expander(f"📁 {cluster_name.replace('_', ' ').title()}", expanded=False):
-                        
-                        # Cluster summary
-                        col1, col2 = st.columns(2)
-                        
-                        with col1:
-                            st.write(f"**Profile Count:** {cluster_data.get('profile_count', 0)}")
-                            st.write(f"**Platforms:** {', '.join(cluster_data.get('platforms', []))}")
-                        
-                        with col2:
-                            if 'summary' in cluster_data:
-                                st.write("**Summary:**")
-                                st.write(cluster_data['summary'])
-                        
-                        # Show profiles in this cluster
-                        if 'profiles' in cluster_data and cluster_data['profiles']:
-                            st.write("**Profiles:**")
-                            for i, profile in enumerate(cluster_data['profiles'], 1):
-                                platform = profile.get('platform', 'Unknown')
-                                url = profile.get('url', 'No URL')
-                                st.write(f"{i}. **{platform}**: {url}")
-            
-            # Clear selection button
-            if st.button("← Back to Results List"):
-                del st.session_state.selected_result_id
-                st.rerun()
-    
+        show_result_detail(st.session_state.selected_result_id)
+
     # Refresh button
     if st.button("🔄 Refresh Results"):
         st.rerun()
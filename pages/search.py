@@ -0,0 +1,116 @@
+import streamlit as st
+import asyncio
+from processing.jobs import enqueue_job, QUEUED, RUNNING, DONE, FAILED
+from ui.data import init_storage, job_progress, recent_jobs, invalidate
+
+#Seconds between job status checks while an investigation runs
+POLL_INTERVAL = 1.0
+
+
+def render_clusters(result, container):
+    """Draw each cluster's platforms and whatever summary text has arrived so far"""
+    with container.container():
+        if not result:
+            return
+        st.subheader("Cluster Analysis")
+        for cluster_key, cluster in result.items():
+            with st.expander(f"📁 Cluster {cluster_key}", expanded=True):
+                st.write(f"**Profile Count:** {len(cluster['platforms'])}")
+                st.write(f"**Platforms:** {', '.join(cluster['platforms'])}")
+                st.write("**Summary:**")
+                if cluster["summary"]:
+                    st.write(cluster["summary"])
+                elif cluster.get("summary_error"):
+                    st.caption(f"Summary failed: {cluster['summary_error']}")
+                else:
+                    st.caption("Generating...")
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return ""
+    minutes, seconds = divmod(int(seconds), 60)
+    return f", about {minutes}m {seconds:02d}s left" if minutes else f", about {seconds}s left"
+
+
+def render_job(job):
+    """Status line, scrape progress bar and partial clusters of a job"""
+    if job["status"] == QUEUED:
+        st.info(f"Job {job['id']} is queued, waiting for a worker...")
+    elif job["status"] == RUNNING:
+        stage = job["stage"] or "starting"
+        if job["urls_total"]:
+            st.progress(job["fraction"], text=f"Job {job['id']}: {stage}, {job['urls_done']}/{job['urls_total']} "
+                                              f"profiles{format_eta(job['eta_seconds'])}")
+        else:
+            st.info(f"Job {job['id']}: {stage}...")
+    elif job["status"] == DONE:
+        st.success("Investigation complete" if job["result"] else "No profiles could be scraped")
+    elif job["status"] == FAILED:
+        st.error(f"Investigation failed: {job['error']}")
+
+    render_clusters(job["result"], st.empty())
+
+
+@st.fragment(run_every=POLL_INTERVAL)
+def live_job(job_id):
+    """Re-runs on its own every POLL_INTERVAL while the rest of the page stays idle and clickable"""
+    job = job_progress(job_id)
+    if job is None:
+        st.error(f"Job {job_id} not found")
+        return
+    render_job(job)
+    if job["status"] in (DONE, FAILED):
+        #New results exist; rerun the whole page so it stops polling and shows them
+        invalidate()
+        st.rerun(scope="app")
+
+
+def follow_job(job_id):
+    """Show a job; poll it in a fragment only while it is still queued or running"""
+    job = job_progress(job_id)
+    if job is None:
+        st.error(f"Job {job_id} not found")
+    elif job["status"] in (DONE, FAILED):
+        render_job(job)
+    else:
+        live_job(job_id)
+
+
+def show_search_page():
+    st.title("🔍 OSINT Search")
+    init_storage()
+
+    with st.form("search_form"):
+        username = st.text_input("Username or email")
+        manual_links = st.text_area(
+            "Profile URLs (optional, one per line)",
+            help="Skip Blackbird and investigate these URLs directly"
+        )
+        refresh_summaries = st.checkbox("Regenerate cached summaries", value=False)
+        delta = st.checkbox("Only re-scrape new or stale profiles", value=False,
+                            help="Reuse profiles from this subject's last investigation that are still fresh")
+        pivot = st.checkbox("Follow links to other profiles", value=False,
+                            help="Also scrape profiles linked from the ones found, within a small page budget")
+        submitted = st.form_submit_button("Search")
+
+    if submitted:
+        if not username:
+            st.error("Please enter a username or email")
+            return
+        profile_links = [line.strip() for line in manual_links.splitlines() if line.strip()]
+        options = {"refresh_summaries": refresh_summaries, "delta": delta}
+        if pivot:
+            options["pivot"] = {}
+        st.session_state.active_job_id = asyncio.run(enqueue_job(username, profile_links, options=options))
+
+    recent = recent_jobs(limit=10)
+    if recent:
+        with st.expander("Recent investigations", expanded=False):
+            for job in recent:
+                stage = f" ({job['stage']})" if job["status"] == RUNNING and job["stage"] else ""
+                if st.button(f"#{job['id']} {job['username']}: {job['status']}{stage}", key=f"job_{job['id']}"):
+                    st.session_state.active_job_id = job["id"]
+
+    if "active_job_id" in st.session_state:
+        follow_job(st.session_state.active_job_id)
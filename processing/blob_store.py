@@ -0,0 +1,434 @@
+"""
+Content-addressed, compressed storage for scraped profiles.
+
+A profile is normalised (volatile fields such as scraped_at dropped, keys sorted, compact JSON),
+hashed with sha256, and stored once in profile_blobs no matter how many investigations scraped
+it. Payloads are zlib-compressed against a preset dictionary trained from earlier payloads, since
+profiles share most of their structure. profiles rows reference blobs by hash and keep the hot
+fields (display_name, bio, scrape_status, ...) as real columns, so listing and filtering never
+decompress anything.
+
+    python -m processing.blob_store migrate            # move legacy raw_json rows into blobs and report
+    python -m processing.blob_store migrate --prune-artifacts
+    python -m processing.blob_store report
+    python -m processing.blob_store train              # retrain the dictionary and recompress
+"""
+import argparse
+import asyncio
+import datetime
+import hashlib
+import json
+import os
+import re
+import zlib
+from collections import Counter
+
+from .db import get_db, get_sync_db
+
+DB_PATH = r"data/osint.db"
+
+#Left out of the hash so re-scraping an unchanged page doesn't produce a new blob
+VOLATILE_FIELDS = ("scraped_at",)
+#Copied into profiles columns for querying without decompressing
+HOT_FIELDS = ("display_name", "handle", "bio", "location", "scrape_status", "scraped_at")
+
+COMPRESSION_LEVEL = 9
+#zlib only looks back 32 KiB, so a longer dictionary is wasted
+DICTIONARY_SIZE = 32 * 1024
+#Train a dictionary automatically once this many blobs exist, from up to TRAINING_SAMPLES of them
+AUTO_TRAIN_BLOBS = 256
+TRAINING_SAMPLES = 2000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blob_dicts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    data BLOB NOT NULL,
+    samples INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS profile_blobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    hash TEXT NOT NULL UNIQUE, -- sha256 of the normalised payload
+    dict_id INTEGER REFERENCES blob_dicts(id), -- NULL means plain zlib
+    raw_size INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    created_at TEXT NOT NULL
+);
+"""
+
+INSERT_BLOB_SQL = """
+INSERT OR IGNORE INTO profile_blobs (hash, dict_id, raw_size, data, created_at) VALUES (?, ?, ?, ?, ?)
+"""
+#Takes a JSON list of hashes, so the statement text (and its prepared statement) never changes
+BLOB_IDS_SQL = "SELECT hash, id FROM profile_blobs WHERE hash IN (SELECT value FROM json_each(?))"
+GET_BLOB_SQL = "SELECT dict_id, data FROM profile_blobs WHERE hash = ?"
+DICTS_SQL = "SELECT id, data FROM blob_dicts ORDER BY id"
+FILE_PROFILES_SQL = """
+SELECT b.dict_id, b.data, p.scraped_at FROM profiles p JOIN profile_blobs b ON b.hash = p.blob_hash
+ WHERE p.file_path = ? ORDER BY p.profile_index
+"""
+
+_SEGMENT = re.compile(r'"\w+":(?:null,|\[\],|\{\},|"",)?|[^"{}\[\],:]{6,120}')
+
+
+def normalize_profile(profile):
+    """Canonical bytes for a profile dict; equal content gives equal bytes"""
+    payload = {key: value for key, value in profile.items() if key not in VOLATILE_FIELDS}
+    return json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False,
+                      default=str).encode("utf-8")
+
+
+def payload_hash(payload):
+    return hashlib.sha256(payload).hexdigest()
+
+
+def hot_values(profile):
+    return tuple(profile.get(field) for field in HOT_FIELDS)
+
+
+def train_dictionary(samples, size=DICTIONARY_SIZE):
+    """
+    Build a zlib preset dictionary from sample payloads: the JSON keys and text fragments found
+    in the most payloads, weighted by length, with the most valuable last (zlib reaches the end
+    of the dictionary with the shortest distances).
+    """
+    doc_freq = Counter()
+    for payload in samples:
+        doc_freq.update(set(_SEGMENT.findall(payload.decode("utf-8", "ignore"))))
+    scored = sorted(((freq * len(segment), segment) for segment, freq in doc_freq.items() if freq > 1),
+                    reverse=True)
+    chosen = []
+    total = 0
+    for _, segment in scored:
+        data = segment.encode("utf-8")
+        if total + len(data) > size:
+            continue
+        chosen.append(data)
+        total += len(data)
+    return b"".join(reversed(chosen))
+
+
+class BlobCodec:
+    """Compresses with the newest dictionary and decompresses with whichever one a blob used"""
+
+    def __init__(self):
+        self.dictionaries = {}
+        self.current = None
+
+    def load(self, rows):
+        for dict_id, data in rows:
+            self.dictionaries[dict_id] = data
+        if self.dictionaries:
+            self.current = max(self.dictionaries)
+
+    def compress(self, payload):
+        if self.current is None:
+            return None, zlib.compress(payload, COMPRESSION_LEVEL)
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=self.dictionaries[self.current])
+        return self.current, compressor.compress(payload) + compressor.flush()
+
+    def decompress(self, dict_id, data):
+        if dict_id is None:
+            return zlib.decompress(data)
+        decompressor = zlib.decompressobj(zdict=self.dictionaries[dict_id])
+        return decompressor.decompress(data) + decompressor.flush()
+
+
+#db path -> BlobCodec
+_codecs = {}
+
+
+async def _codec(conn, db_path, dict_id=None):
+    """The codec for a database, reloading dictionaries if dict_id (or any) is unknown"""
+    codec = _codecs.get(db_path)
+    if codec is None or (dict_id is not None and dict_id not in codec.dictionaries):
+        codec = _codecs[db_path] = BlobCodec()
+        cursor = await conn.execute(DICTS_SQL)
+        codec.load(await cursor.fetchall())
+    return codec
+
+
+def _codec_sync(conn, db_path, dict_id=None):
+    codec = _codecs.get(db_path)
+    if codec is None or (dict_id is not None and dict_id not in codec.dictionaries):
+        codec = _codecs[db_path] = BlobCodec()
+        codec.load(conn.execute(DICTS_SQL).fetchall())
+    return codec
+
+
+def decode_blob(conn, dict_id, data, db_path=DB_PATH):
+    """Profile dict from a stored blob (sync connection)"""
+    return json.loads(_codec_sync(conn, db_path, dict_id).decompress(dict_id, data))
+
+
+async def store_profile_blobs(conn, profiles, db_path=DB_PATH):
+    """
+    Store every profile whose content isn't stored yet. Call inside a write transaction.
+    Returns the blob hash of each profile, in order, and (blob_id, profile) for the blobs
+    that were new, for indexing.
+    """
+    payloads = [normalize_profile(profile) for profile in profiles]
+    hashes = [payload_hash(payload) for payload in payloads]
+    unique = {}
+    for digest, payload, profile in zip(hashes, payloads, profiles):
+        unique.setdefault(digest, (payload, profile))
+
+    cursor = await conn.execute(BLOB_IDS_SQL, (json.dumps(list(unique)),))
+    existing = {row[0] for row in await cursor.fetchall()}
+    new = [digest for digest in unique if digest not in existing]
+    if not new:
+        return hashes, []
+
+    codec = await _codec(conn, db_path)
+    created_at = datetime.datetime.utcnow().isoformat()
+    rows = []
+    for digest in new:
+        payload = unique[digest][0]
+        dict_id, data = codec.compress(payload)
+        rows.append((digest, dict_id, len(payload), data, created_at))
+    await conn.executemany(INSERT_BLOB_SQL, rows)
+
+    cursor = await conn.execute(BLOB_IDS_SQL, (json.dumps(new),))
+    ids = dict(await cursor.fetchall())
+
+    if codec.current is None:
+        await _maybe_train(conn, db_path)
+    return hashes, [(ids[digest], unique[digest][1]) for digest in new]
+
+
+async def _maybe_train(conn, db_path):
+    #Another process may have trained one already
+    _codecs.pop(db_path, None)
+    if (await _codec(conn, db_path)).current is not None:
+        return
+    cursor = await conn.execute("SELECT count(*) FROM profile_blobs")
+    if (await cursor.fetchone())[0] >= AUTO_TRAIN_BLOBS:
+        await train_and_store(conn, db_path)
+
+
+async def train_and_store(conn, db_path=DB_PATH, samples=TRAINING_SAMPLES):
+    """Train a dictionary from the newest blobs and make it current; returns its id (or None)"""
+    codec = await _codec(conn, db_path)
+    cursor = await conn.execute("SELECT dict_id, data FROM profile_blobs ORDER BY id DESC LIMIT ?", (samples,))
+    payloads = []
+    for dict_id, data in await cursor.fetchall():
+        if dict_id is not None and dict_id not in codec.dictionaries:
+            codec = await _codec(conn, db_path, dict_id)
+        payloads.append(codec.decompress(dict_id, data))
+    dictionary = train_dictionary(payloads)
+    if not dictionary:
+        return None
+    cursor = await conn.execute("INSERT INTO blob_dicts (data, samples, created_at) VALUES (?, ?, ?)",
+                                (dictionary, len(payloads), datetime.datetime.utcnow().isoformat()))
+    codec.load([(cursor.lastrowid, dictionary)])
+    return cursor.lastrowid
+
+
+def load_profile(digest, db_path=DB_PATH):
+    """A stored profile by blob hash, or None"""
+    conn = get_sync_db(db_path)
+    row = conn.execute(GET_BLOB_SQL, (digest,)).fetchone()
+    return decode_blob(conn, row[0], row[1], db_path) if row else None
+
+
+def load_profiles_for_file(file_path, db_path=DB_PATH):
+    """An investigation's profiles in scrape order, as the JSON artifact used to hold them"""
+    conn = get_sync_db(db_path)
+    profiles = []
+    for dict_id, data, scraped_at in conn.execute(FILE_PROFILES_SQL, (file_path,)).fetchall():
+        profile = decode_blob(conn, dict_id, data, db_path)
+        profile["scraped_at"] = scraped_at
+        profiles.append(profile)
+    return profiles
+
+
+async def load_profiles_for_file_async(file_path, db_path=DB_PATH):
+    """load_profiles_for_file for code running on the event loop"""
+    db = await get_db(db_path)
+    rows = await db.fetchall(FILE_PROFILES_SQL, (file_path,))
+    codec = _codecs.get(db_path)
+    if codec is None or any(dict_id is not None and dict_id not in codec.dictionaries for dict_id, _, _ in rows):
+        codec = _codecs[db_path] = BlobCodec()
+        codec.load(await db.fetchall(DICTS_SQL))
+    profiles = []
+    for dict_id, data, scraped_at in rows:
+        profile = json.loads(codec.decompress(dict_id, data))
+        profile["scraped_at"] = scraped_at
+        profiles.append(profile)
+    return profiles
+
+
+def profile_column_upgrades(columns):
+    """ALTER statements that bring a legacy profiles table (raw_json only) up to the blob layout"""
+    return [f"ALTER TABLE profiles ADD COLUMN {name} TEXT"
+            for name in ("blob_hash",) + HOT_FIELDS if name not in columns]
+
+
+def _database_size(db_path):
+    return sum(os.path.getsize(path) for path in (db_path, db_path + "-wal") if os.path.exists(path))
+
+
+async def size_report(db_path=DB_PATH):
+    db = await get_db(db_path)
+    await db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    profiles = (await db.fetchone("SELECT count(*) FROM profiles"))[0]
+    blobs, raw, stored = await db.fetchone(
+        "SELECT count(*), coalesce(sum(raw_size), 0), coalesce(sum(length(data)), 0) FROM profile_blobs")
+    with_dict = (await db.fetchone("SELECT count(*) FROM profile_blobs WHERE dict_id IS NOT NULL"))[0]
+    return {
+        "profiles": profiles,
+        "blobs": blobs,
+        "dedup_ratio": round(profiles / blobs, 2) if blobs else None,
+        "raw_bytes": raw,
+        "stored_bytes": stored,
+        "compression_ratio": round(raw / stored, 2) if stored else None,
+        "blobs_with_dictionary": with_dict,
+        "file_bytes": _database_size(db_path),
+    }
+
+
+async def migrate(db_path=DB_PATH, batch_size=500):
+    """
+    Move legacy profiles.raw_json rows into blobs, (re)train the dictionary, recompress blobs
+    that don't use it, drop raw_json and VACUUM. Returns (size before, report after).
+    """
+    #Deferred: search_index uses this module to index blobs
+    from .results_store import init_results_db
+    from .search_index import init_search_index, rebuild_search_index
+
+    db = await get_db(db_path)
+    await db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    before = _database_size(db_path)
+    await db.executescript(SCHEMA)
+
+    columns = {row[1] for row in await db.fetchall("PRAGMA table_info(profiles)")}
+    for statement in profile_column_upgrades(columns):
+        await db.execute(statement)
+
+    if "raw_json" in columns:
+        last_id = 0
+        while True:
+            rows = await db.fetchall("SELECT id, raw_json FROM profiles WHERE id > ? AND raw_json IS NOT NULL "
+                                     "ORDER BY id LIMIT ?", (last_id, batch_size))
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            profiles = [json.loads(raw) for _, raw in rows]
+            async with db.transaction() as conn:
+                hashes, _ = await store_profile_blobs(conn, profiles, db_path)
+                await conn.executemany(
+                    f"UPDATE profiles SET blob_hash = ?, {', '.join(f'{f} = ?' for f in HOT_FIELDS)}, "
+                    "raw_json = NULL WHERE id = ?",
+                    [(digest,) + hot_values(profile) + (row[0],)
+                     for digest, profile, row in zip(hashes, profiles, rows)])
+
+    blobs = (await db.fetchone("SELECT count(*) FROM profile_blobs"))[0]
+    if blobs >= AUTO_TRAIN_BLOBS:
+        await _train(db_path)
+
+    #The search index no longer reads raw_json; drop its old triggers before the column
+    await init_results_db(db_path)
+    await init_search_index(db_path)
+    if "raw_json" in columns:
+        await db.execute("ALTER TABLE profiles DROP COLUMN raw_json")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_profiles_blob ON profiles(blob_hash)")
+    await asyncio.to_thread(rebuild_search_index, db_path)
+
+    await db.execute("VACUUM")
+    await db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return before, await size_report(db_path)
+
+
+async def recompress(db_path=DB_PATH, batch_size=500):
+    """Recompress every blob not stored with the current dictionary"""
+    db = await get_db(db_path)
+    codec = _codecs[db_path] = BlobCodec()
+    codec.load(await db.fetchall(DICTS_SQL))
+    if codec.current is None:
+        return 0
+    count = 0
+    while True:
+        rows = await db.fetchall("SELECT id, dict_id, data FROM profile_blobs "
+                                 "WHERE dict_id IS NULL OR dict_id != ? LIMIT ?", (codec.current, batch_size))
+        if not rows:
+            return count
+        async with db.transaction() as conn:
+            updates = []
+            for blob_id, dict_id, data in rows:
+                if dict_id is not None and dict_id not in codec.dictionaries:
+                    codec = await _codec(conn, db_path, dict_id)
+                new_dict, new_data = codec.compress(codec.decompress(dict_id, data))
+                updates.append((new_dict, new_data, blob_id))
+            await conn.executemany("UPDATE profile_blobs SET dict_id = ?, data = ? WHERE id = ?", updates)
+        count += len(rows)
+
+
+def prune_artifacts(db_path=DB_PATH):
+    """Delete JSON artifacts whose profiles are all in the blob store; returns (files, bytes) freed"""
+    conn = get_sync_db(db_path)
+    files = freed = 0
+    for (file_path,) in conn.execute("SELECT file_path FROM user_files").fetchall():
+        if not os.path.isfile(file_path):
+            continue
+        stored = conn.execute("SELECT count(*) FROM profiles WHERE file_path = ? AND blob_hash IS NOT NULL",
+                              (file_path,)).fetchone()[0]
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                expected = len(json.load(f))
+        except (OSError, ValueError):
+            continue
+        if stored and stored >= expected:
+            freed += os.path.getsize(file_path)
+            os.remove(file_path)
+            files += 1
+    return files, freed
+
+
+def _print_report(report, before=None):
+    print(f"profiles: {report['profiles']}  unique blobs: {report['blobs']}  dedup: {report['dedup_ratio']}x")
+    print(f"payload: {report['raw_bytes']} bytes raw, {report['stored_bytes']} stored "
+          f"({report['compression_ratio']}x, {report['blobs_with_dictionary']} blobs use the dictionary)")
+    if before is not None:
+        after = report["file_bytes"]
+        change = (after / before - 1) * 100 if before else 0.0
+        #On a small database the new tables and search index can outweigh what the blobs save
+        print(f"database file: {before} -> {after} bytes "
+              f"({abs(change):.1f}% {'larger' if change > 0 else 'smaller'})")
+    else:
+        print(f"database file: {report['file_bytes']} bytes")
+
+
+async def _train(db_path):
+    db = await get_db(db_path)
+    async with db.transaction() as conn:
+        dict_id = await train_and_store(conn, db_path)
+    count = await recompress(db_path) if dict_id is not None else 0
+    return dict_id, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compressed, deduplicated profile storage")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = commands.add_parser("migrate", help="move raw_json rows into blobs, then report")
+    migrate_parser.add_argument("--prune-artifacts", action="store_true",
+                                help="also delete JSON artifact files that are fully stored")
+    commands.add_parser("report", help="show storage and dedup statistics")
+    commands.add_parser("train", help="train a new dictionary and recompress every blob with it")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        before, report = asyncio.run(migrate(args.db))
+        _print_report(report, before)
+        if args.prune_artifacts:
+            files, freed = prune_artifacts(args.db)
+            print(f"artifacts: removed {files} files, {freed} bytes")
+    elif args.command == "report":
+        _print_report(asyncio.run(size_report(args.db)))
+    else:
+        dict_id, count = asyncio.run(_train(args.db))
+        print(f"dictionary {dict_id}: recompressed {count} blobs" if dict_id else "not enough data to train")
+
+
+if __name__ == "__main__":
+    main()
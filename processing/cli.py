@@ -0,0 +1,295 @@
+"""
+Headless batch mode: investigate many subjects from a file.
+
+    python -m processing.cli subjects.txt --output results.jsonl --concurrency 8
+
+subjects.txt holds one username per line, or JSONL objects such as
+{"username": "lordfurno", "profile_links": ["https://..."]} to skip discovery for that subject.
+Subjects run concurrently and share one browser, one HTTP session and one Cohere client, under
+global and per-host request limits. Every finished subject is appended to the output JSONL as
+soon as it completes (profiles also land in SQLite as usual), and subjects already recorded as
+done there are skipped, so an interrupted run picks up where it stopped.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+from .discovery import HostLimiter, SWEEP_USER_AGENT, discover_profiles, load_sites, sweep_profile_links
+from .main import stream_profiles
+from .pivot import MAX_DEPTH, MAX_PAGES, PER_HOST as PIVOT_PER_HOST
+from .profiler import get_cohere_client
+from .summary import get_chat_client
+from .shards import SCRAPE_SHARDS, make_scraper
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_INTERVAL = 2.0
+
+
+def read_subjects(path):
+    """Subjects from a file of usernames or JSONL objects, in file order and without duplicates"""
+    subjects = []
+    seen = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                entry = json.loads(line)
+                subject = {"username": entry["username"], "profile_links": entry.get("profile_links") or []}
+            else:
+                subject = {"username": line, "profile_links": []}
+            if subject["username"] not in seen:
+                seen.add(subject["username"])
+                subjects.append(subject)
+    return subjects
+
+
+def completed_usernames(output_path):
+    """Usernames already recorded as done in a previous run's output"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                #Last line of an interrupted run may be cut off
+                continue
+            if record.get("status") == "done":
+                done.add(record["username"])
+    return done
+
+
+class Progress:
+    """Counts subjects and renders a one-line status with rate and ETA"""
+
+    def __init__(self, total, skipped=0):
+        self.total = total
+        self.skipped = skipped
+        self.done = 0
+        self.failed = 0
+        self.running = 0
+        self.started_at = time.monotonic()
+
+    def line(self):
+        finished = self.done + self.failed
+        elapsed = time.monotonic() - self.started_at
+        rate = finished / elapsed * 60 if elapsed else 0.0
+        remaining = self.total - self.skipped - finished
+        eta = _format_seconds(remaining / rate * 60) if rate else "--"
+        return (f"[{finished + self.skipped}/{self.total}] {rate:.1f} subjects/min  ETA {eta}  "
+                f"running {self.running}  failed {self.failed}")
+
+
+def _format_seconds(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+async def show_progress(progress, stream=sys.stderr, interval=PROGRESS_INTERVAL):
+    while True:
+        stream.write("\r" + progress.line() + " " * 8)
+        stream.flush()
+        await asyncio.sleep(interval)
+
+
+class ResultWriter:
+    """Appends one JSON line per subject and flushes it, so finished work survives a crash"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = asyncio.Lock()
+
+    async def write(self, record):
+        async with self._lock:
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class BatchRunner:
+    """Runs discovery and findProfiles for many subjects on shared resources"""
+
+    def __init__(self, concurrency=4, global_limit=50, per_host=4, discovery="sweep",
+                 refresh_summaries=False, scrape_concurrency=3, scrape_delay=1.0, delta=False, pivot=None,
+                 shards=SCRAPE_SHARDS):
+        self.concurrency = concurrency
+        self.shards = shards
+        self.discovery = discovery
+        self.refresh_summaries = refresh_summaries
+        self.delta = delta
+        #PivotCrawler options, or None to only scrape the discovered profiles
+        self.pivot = pivot
+        self.scrape_concurrency = scrape_concurrency
+        self.scrape_delay = scrape_delay
+        #One limiter for scraping and sweeping, so a host is never hit harder than per_host in total
+        self.limiter = HostLimiter(global_limit=global_limit, per_host=per_host)
+        self.scraper = None
+        self.session = None
+        self.cohere_client = None
+        self.chat_client = None
+        self.sites = None
+
+    async def __aenter__(self):
+        #With shards, each shard process enforces per_host for the hosts it owns
+        self.scraper = make_scraper(self.shards, limiter=self.limiter)
+        await self.scraper.start()
+        if self.discovery == "sweep":
+            import aiohttp
+            self.session = aiohttp.ClientSession(headers={"User-Agent": SWEEP_USER_AGENT})
+            self.sites = load_sites()
+        self.cohere_client = get_cohere_client()
+        #One chat client (and connection pool) for every subject's summaries
+        self.chat_client = get_chat_client(async_client=True)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.session is not None:
+            await self.session.close()
+        await self.scraper.close()
+
+    async def discover(self, username):
+        if self.discovery == "sweep":
+            return await sweep_profile_links(username, sites=self.sites, session=self.session,
+                                             limiter=self.limiter)
+        return await asyncio.to_thread(discover_profiles, username)
+
+    async def investigate(self, subject):
+        """Run one subject and return its output record; failures are recorded, not raised"""
+        username = subject["username"]
+        start = time.monotonic()
+        record = {"username": username}
+        try:
+            links = subject["profile_links"] or await self.discover(username)
+            clusters = {}
+            pivot = None
+            if self.pivot is not None:
+                #Sweeps for pivot handles share the discovery session and limits
+                pivot = dict(self.pivot, session=self.session, limiter=self.limiter, sites=self.sites)
+            async for event in stream_profiles(
+                    links, username, refresh_summaries=self.refresh_summaries, scraper=self.scraper,
+                    delta=self.delta, pivot=pivot, chat_client=self.chat_client,
+                    pipeline_options={"scrape_delay": self.scrape_delay,
+                                      "scrape_concurrency": self.scrape_concurrency,
+                                      "cohere_client": self.cohere_client}):
+                if event[0] == "delta":
+                    record["delta"] = event[1]
+                elif event[0] == "pivot":
+                    record["pivot"] = event[1]
+                elif event[0] == "clusters":
+                    clusters = {str(key): {"platforms": platforms, "summary": ""}
+                                for key, platforms in event[1].items()}
+                elif event[0] == "summary_done":
+                    clusters[str(event[1])]["summary"] = event[2]
+                elif event[0] == "summary_failed":
+                    clusters[str(event[1])]["summary_error"] = event[2]
+            record.update(status="done", profile_links=len(links), clusters=clusters)
+        except Exception as e:
+            logger.exception("Investigation of %s failed", username)
+            record.update(status="failed", error=f"{type(e).__name__}: {e}")
+        record["elapsed"] = round(time.monotonic() - start, 2)
+        return record
+
+    async def run(self, subjects, writer, progress):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def one(subject):
+            async with semaphore:
+                progress.running += 1
+                try:
+                    record = await self.investigate(subject)
+                finally:
+                    progress.running -= 1
+                if record["status"] == "done":
+                    progress.done += 1
+                else:
+                    progress.failed += 1
+                await writer.write(record)
+
+        await asyncio.gather(*(one(subject) for subject in subjects))
+
+
+async def run_batch(subjects_path, output_path, concurrency=4, global_limit=50, per_host=4,
+                    discovery="sweep", refresh_summaries=False, scrape_concurrency=3, scrape_delay=1.0,
+                    delta=False, pivot=None, shards=SCRAPE_SHARDS, show=True):
+    subjects = read_subjects(subjects_path)
+    done = completed_usernames(output_path)
+    pending = [subject for subject in subjects if subject["username"] not in done]
+    progress = Progress(len(subjects), skipped=len(subjects) - len(pending))
+    print(f"{len(subjects)} subjects, {progress.skipped} already done, {len(pending)} to run", file=sys.stderr)
+    if not pending:
+        return progress
+
+    writer = ResultWriter(output_path)
+    ticker = asyncio.create_task(show_progress(progress)) if show else None
+    try:
+        async with BatchRunner(concurrency=concurrency, global_limit=global_limit, per_host=per_host,
+                               discovery=discovery, refresh_summaries=refresh_summaries,
+                               scrape_concurrency=scrape_concurrency, scrape_delay=scrape_delay,
+                               delta=delta, pivot=pivot, shards=shards) as runner:
+            await runner.run(pending, writer, progress)
+    finally:
+        if ticker is not None:
+            ticker.cancel()
+            print("\r" + progress.line(), file=sys.stderr)
+        writer.close()
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Investigate many subjects from a file")
+    parser.add_argument("subjects", help="file with one username per line, or JSONL with username/profile_links")
+    parser.add_argument("-o", "--output", default="results.jsonl",
+                        help="JSONL file results are appended to; also used to resume")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="subjects investigated at once")
+    parser.add_argument("--global-limit", type=int, default=50, help="max requests in flight overall")
+    parser.add_argument("--per-host", type=int, default=4, help="max requests in flight per host")
+    parser.add_argument("--scrape-concurrency", type=int, default=3, help="pages scraped at once per subject")
+    parser.add_argument("--scrape-delay", type=float, default=1.0, help="seconds between page scrapes per worker")
+    parser.add_argument("--shards", type=int, default=SCRAPE_SHARDS,
+                        help="browser processes rendering pages, split by host (0 or 1: in-process)")
+    parser.add_argument("--discovery", choices=("sweep", "blackbird"), default="sweep",
+                        help="how to find profile links for subjects that have none")
+    parser.add_argument("--refresh-summaries", action="store_true", help="ignore cached summaries")
+    parser.add_argument("--delta", action="store_true",
+                        help="only re-scrape profiles that are new or stale since each subject's last run")
+    parser.add_argument("--pivot", action="store_true",
+                        help="also scrape profiles linked from the discovered ones (see processing/pivot.py)")
+    parser.add_argument("--pivot-depth", type=int, default=MAX_DEPTH, help="link hops followed from discovered profiles")
+    parser.add_argument("--pivot-budget", type=int, default=MAX_PAGES, help="max pivoted pages per subject")
+    parser.add_argument("--pivot-per-host", type=int, default=PIVOT_PER_HOST, help="max pivoted pages per host")
+    parser.add_argument("--pivot-sweep", action="store_true",
+                        help="also sweep handles found on profiles for accounts on other sites")
+    parser.add_argument("-q", "--quiet", action="store_true", help="no live progress line")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(message)s")
+    pivot = None
+    if args.pivot:
+        pivot = {"max_depth": args.pivot_depth, "max_pages": args.pivot_budget,
+                 "per_host": args.pivot_per_host, "sweep": args.pivot_sweep}
+    try:
+        progress = asyncio.run(run_batch(
+            args.subjects, args.output, concurrency=args.concurrency, global_limit=args.global_limit,
+            per_host=args.per_host, discovery=args.discovery, refresh_summaries=args.refresh_summaries,
+            scrape_concurrency=args.scrape_concurrency, scrape_delay=args.scrape_delay, delta=args.delta,
+            pivot=pivot, shards=args.shards, show=not args.quiet))
+    except KeyboardInterrupt:
+        print("\nInterrupted; rerun the same command to resume", file=sys.stderr)
+        sys.exit(130)
+    sys.exit(1 if progress.failed else 0)
+
+
+if __name__ == "__main__":
+    main()
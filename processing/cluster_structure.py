@@ -0,0 +1,245 @@
+"""
+Clusterings at any granularity from one similarity computation.
+
+Clustering fuses per-modality cosine similarities into a distance matrix and runs DBSCAN. With
+min_samples=1 (what the pipeline uses) DBSCAN's clusters at eps are the connected components of
+"distance <= eps", i.e. single-linkage clusters cut at eps. The minimum spanning tree of the fused
+distances therefore holds the clustering for every eps at once: keeping the tree edges no longer
+than eps gives exactly DBSCAN's labels, and the sorted edge weights are the heights at which
+clusters merge.
+
+ClusterStructure keeps the per-modality similarities, computed once, and derives the fused
+distances and spanning tree per weighting on demand. A new eps costs a union-find over n-1
+edges; a new weighting costs one O(n^2) numpy pass. Neither touches the embeddings. The
+structure is saved per investigation in cluster_structures, so the Results page can re-cluster
+a saved result.
+"""
+import datetime
+import json
+import sqlite3
+import zlib
+
+import numpy as np
+
+from .db import get_db, get_sync_db
+from .tracing import traced
+
+DB_PATH = r"data/osint.db"
+
+W_META = 0.7
+W_PFP = 0.3
+DEFAULT_EPS = 0.5
+#Range suggest_eps looks for a cut in, and the smallest gap it trusts over DEFAULT_EPS
+EPS_RANGE = (0.05, 0.95)
+MIN_GAP = 0.02
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cluster_structures (
+    file_path TEXT PRIMARY KEY, -- the investigation
+    profile_ids TEXT NOT NULL, -- JSON list of profile indices, in matrix order
+    has_meta BLOB NOT NULL, -- one byte per profile
+    has_pfp BLOB NOT NULL,
+    sim_meta BLOB NOT NULL, -- zlib'd float32 upper triangle
+    sim_pfp BLOB NOT NULL,
+    w_meta REAL NOT NULL, -- what the saved clusters used
+    w_pfp REAL NOT NULL,
+    eps REAL NOT NULL,
+    created_at TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+INSERT_STRUCTURE_SQL = """
+INSERT OR REPLACE INTO cluster_structures
+  (file_path, profile_ids, has_meta, has_pfp, sim_meta, sim_pfp, w_meta, w_pfp, eps, created_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+GET_STRUCTURE_SQL = """
+SELECT profile_ids, has_meta, has_pfp, sim_meta, sim_pfp, w_meta, w_pfp, eps FROM cluster_structures WHERE file_path = ?
+"""
+
+_schema_ready = set()
+
+
+def cosine_matrix(profile_ids, vectors):
+    """Pairwise cosine similarities of the profiles that have a vector, and which ones do"""
+    has = np.array([pid in vectors for pid in profile_ids], dtype=bool)
+    n = len(profile_ids)
+    if not has.any():
+        return np.zeros((n, n)), has
+    dimension = len(next(iter(vectors.values())))
+    matrix = np.zeros((n, dimension))
+    for idx, pid in enumerate(profile_ids):
+        if has[idx]:
+            matrix[idx] = vectors[pid]
+    norms = np.linalg.norm(matrix, axis=1)
+    norms[norms == 0] = 1.0
+    matrix /= norms[:, None]
+    return matrix @ matrix.T, has
+
+
+def spanning_tree(dist):
+    """Edges (weights, i, j) of the minimum spanning tree of a dense distance matrix, lightest first"""
+    n = len(dist)
+    if n < 2:
+        return np.zeros(0), np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    #Prim's algorithm, one numpy pass per vertex added
+    in_tree = np.zeros(n, dtype=bool)
+    in_tree[0] = True
+    best = dist[0].astype(float)
+    parent = np.zeros(n, dtype=int)
+    weights, sources, targets = [], [], []
+    for _ in range(n - 1):
+        j = int(np.argmin(np.where(in_tree, np.inf, best)))
+        weights.append(best[j])
+        sources.append(parent[j])
+        targets.append(j)
+        in_tree[j] = True
+        closer = dist[j] < best
+        best = np.where(closer, dist[j], best)
+        parent = np.where(closer, j, parent)
+    order = np.argsort(weights, kind="stable")
+    return np.asarray(weights)[order], np.asarray(sources)[order], np.asarray(targets)[order]
+
+
+def _pack_triangle(matrix):
+    return zlib.compress(matrix[np.triu_indices(len(matrix), 1)].astype(np.float32).tobytes())
+
+
+def _unpack_triangle(data, n):
+    matrix = np.zeros((n, n))
+    upper = np.triu_indices(n, 1)
+    matrix[upper] = np.frombuffer(zlib.decompress(data), dtype=np.float32)
+    matrix[(upper[1], upper[0])] = matrix[upper]
+    return matrix
+
+
+class ClusterStructure:
+    """
+    Per-modality similarities of one investigation's profiles, and clusterings derived from them.
+
+        structure = ClusterStructure.from_embeddings(pfp, meta)
+        pid_to_label, clusters = structure.cluster(eps=0.4)
+        structure.suggest_eps()
+    """
+
+    def __init__(self, profile_ids, sim_meta, has_meta, sim_pfp, has_pfp):
+        self.profile_ids = list(profile_ids)
+        self.sim_meta = sim_meta
+        self.has_meta = has_meta
+        self.sim_pfp = sim_pfp
+        self.has_pfp = has_pfp
+        #(w_meta, w_pfp) -> spanning tree
+        self._trees = {}
+
+    @classmethod
+    @traced("cluster_structure", attributes=lambda cls, pfp, meta: {"n": len(set(pfp) | set(meta))})
+    def from_embeddings(cls, pfp, meta):
+        """pfp and meta map profile index -> embedding; either may lack some profiles"""
+        profile_ids = sorted(set(meta) | set(pfp))
+        sim_meta, has_meta = cosine_matrix(profile_ids, meta)
+        sim_pfp, has_pfp = cosine_matrix(profile_ids, pfp)
+        return cls(profile_ids, sim_meta, has_meta, sim_pfp, has_pfp)
+
+    def __len__(self):
+        return len(self.profile_ids)
+
+    def similarities(self, w_meta=W_META, w_pfp=W_PFP):
+        """Weighted similarity over the modalities both profiles have; 0 where they share none"""
+        mask_meta = np.outer(self.has_meta, self.has_meta).astype(float)
+        mask_pfp = np.outer(self.has_pfp, self.has_pfp).astype(float)
+        np.fill_diagonal(mask_meta, 0.0)
+        np.fill_diagonal(mask_pfp, 0.0)
+        num = w_meta * self.sim_meta * mask_meta + w_pfp * self.sim_pfp * mask_pfp
+        denom = w_meta * mask_meta + w_pfp * mask_pfp
+        return np.divide(num, denom, out=np.zeros_like(num), where=denom != 0)
+
+    def distances(self, w_meta=W_META, w_pfp=W_PFP):
+        dist = 1.0 - self.similarities(w_meta, w_pfp)
+        np.fill_diagonal(dist, 0.0)
+        return dist
+
+    def tree(self, w_meta=W_META, w_pfp=W_PFP):
+        key = (float(w_meta), float(w_pfp))
+        if key not in self._trees:
+            self._trees[key] = spanning_tree(self.distances(w_meta, w_pfp))
+        return self._trees[key]
+
+    def labels(self, eps=DEFAULT_EPS, w_meta=W_META, w_pfp=W_PFP):
+        """DBSCAN(eps, min_samples=1) labels, numbered the same way (by each cluster's first profile)"""
+        weights, sources, targets = self.tree(w_meta, w_pfp)
+        parent = list(range(len(self.profile_ids)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        kept = np.searchsorted(weights, eps, side="right")
+        for i, j in zip(sources[:kept].tolist(), targets[:kept].tolist()):
+            parent[find(i)] = find(j)
+        numbering = {}
+        return [numbering.setdefault(find(i), len(numbering)) for i in range(len(parent))]
+
+    def cluster(self, eps=DEFAULT_EPS, w_meta=W_META, w_pfp=W_PFP):
+        """(profile index -> label, label -> profile indices), as cluster_profiles_from_modalities returns them"""
+        pid_to_label = dict(zip(self.profile_ids, self.labels(eps, w_meta, w_pfp)))
+        clusters = {}
+        for pid, label in pid_to_label.items():
+            clusters.setdefault(label, []).append(pid)
+        return pid_to_label, clusters
+
+    def cluster_counts(self, eps_values, w_meta=W_META, w_pfp=W_PFP):
+        """Number of clusters at each eps, without labelling anything"""
+        weights = self.tree(w_meta, w_pfp)[0]
+        return len(self.profile_ids) - np.searchsorted(weights, np.asarray(eps_values), side="right")
+
+    def suggest_eps(self, w_meta=W_META, w_pfp=W_PFP):
+        """
+        The middle of the widest gap between merge heights inside EPS_RANGE: the cut whose
+        clusters survive the longest range of eps. DEFAULT_EPS when no gap stands out.
+        """
+        weights = self.tree(w_meta, w_pfp)[0]
+        low, high = EPS_RANGE
+        heights = np.concatenate(([low], weights[(weights > low) & (weights < high)], [high]))
+        if len(heights) < 3:
+            return DEFAULT_EPS
+        gaps = np.diff(heights)
+        widest = int(np.argmax(gaps))
+        if gaps[widest] < MIN_GAP:
+            return DEFAULT_EPS
+        return round(float(heights[widest] + gaps[widest] / 2), 3)
+
+
+async def save_cluster_structure(file_path, structure, eps=DEFAULT_EPS, w_meta=W_META, w_pfp=W_PFP,
+                                 db_path=DB_PATH):
+    """Store an investigation's structure with the parameters its saved clusters used"""
+    db = await get_db(db_path)
+    if db_path not in _schema_ready:
+        await db.executescript(SCHEMA)
+        _schema_ready.add(db_path)
+    await db.execute(INSERT_STRUCTURE_SQL, (
+        file_path, json.dumps([int(pid) for pid in structure.profile_ids]),
+        structure.has_meta.astype(np.uint8).tobytes(), structure.has_pfp.astype(np.uint8).tobytes(),
+        _pack_triangle(structure.sim_meta), _pack_triangle(structure.sim_pfp),
+        w_meta, w_pfp, eps, datetime.datetime.utcnow().isoformat(),
+    ))
+
+
+def load_cluster_structure(file_path, db_path=DB_PATH):
+    """(structure, {"eps", "w_meta", "w_pfp"}) saved for an investigation, or None"""
+    try:
+        row = get_sync_db(db_path).execute(GET_STRUCTURE_SQL, (file_path,)).fetchone()
+    except sqlite3.OperationalError as e:
+        #Nothing has been clustered since this table was added
+        if "no such table" in str(e):
+            return None
+        raise
+    if row is None:
+        return None
+    profile_ids = json.loads(row[0])
+    n = len(profile_ids)
+    structure = ClusterStructure(profile_ids,
+                                 _unpack_triangle(row[3], n), np.frombuffer(row[1], dtype=np.uint8).astype(bool),
+                                 _unpack_triangle(row[4], n), np.frombuffer(row[2], dtype=np.uint8).astype(bool))
+    return structure, {"w_meta": row[5], "w_pfp": row[6], "eps": row[7]}
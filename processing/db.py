@@ -0,0 +1,175 @@
+"""
+Shared SQLite access.
+
+Every module used to open a fresh connection per call. Here each process keeps one long-lived
+connection per database (per event loop for the async side, per thread for the sync side), in WAL
+mode with tuned pragmas, so statements stay prepared in the connection's statement cache and
+readers never block the writer.
+
+    db = await get_db()
+    rows = await db.fetchall("SELECT ... WHERE username = ?", (username,))
+    await db.executemany(INSERT_SQL, rows)           #one transaction
+    async with db.transaction() as conn:              #several statements, one transaction
+        await conn.execute(...)
+
+Writes take the write lock up front (BEGIN IMMEDIATE) and wait up to BUSY_TIMEOUT_MS for other
+processes, so several workers can write to the same file at once.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+from contextlib import asynccontextmanager
+
+import aiosqlite
+
+DB_PATH = r"data/osint.db"
+
+BUSY_TIMEOUT_MS = 30000
+#Statements kept prepared per connection; all SQL lives in module constants so the text repeats exactly
+STATEMENT_CACHE_SIZE = 256
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    #Durable at checkpoints, not every commit; safe in WAL mode (no corruption on power loss)
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+    #Negative means KiB: 64 MiB page cache
+    "PRAGMA cache_size = -65536",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA foreign_keys = ON",
+)
+
+
+def connect_sync(db_path=DB_PATH):
+    """A plain sqlite3 connection with the same pragmas, in autocommit mode"""
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                           cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+_sync_local = threading.local()
+
+
+def get_sync_db(db_path=DB_PATH):
+    """Long-lived sync connection for the calling thread, e.g. for Streamlit page reads"""
+    connections = getattr(_sync_local, "connections", None)
+    if connections is None:
+        connections = _sync_local.connections = {}
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = connections[db_path] = connect_sync(db_path)
+    return conn
+
+
+class Database:
+    """One aiosqlite connection plus a lock that keeps coroutines from interleaving transactions"""
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self.conn = None
+        self._lock = asyncio.Lock()
+
+    async def connect(self):
+        conn = aiosqlite.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                                 cached_statements=STATEMENT_CACHE_SIZE)
+        #The connection runs on its own thread; don't let a forgotten close keep the process alive
+        conn.daemon = True
+        self.conn = await conn
+        for pragma in PRAGMAS:
+            await self.conn.execute(pragma)
+        return self
+
+    async def close(self):
+        if self.conn is not None:
+            conn, self.conn = self.conn, None
+            await conn.close()
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Exclusive write transaction; commits on success, rolls back on error"""
+        async with self._lock:
+            await self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                await self.conn.execute("ROLLBACK")
+                raise
+            await self.conn.execute("COMMIT")
+
+    async def execute(self, sql, params=()):
+        """Run one statement in its own transaction and return the cursor"""
+        async with self._lock:
+            return await self.conn.execute(sql, params)
+
+    async def executemany(self, sql, rows):
+        """Run a statement for every row, all in one transaction"""
+        async with self.transaction() as conn:
+            await conn.executemany(sql, rows)
+
+    async def executescript(self, script):
+        async with self._lock:
+            await self.conn.executescript(script)
+
+    async def fetchone(self, sql, params=()):
+        async with self._lock:
+            cursor = await self.conn.execute(sql, params)
+            return await cursor.fetchone()
+
+    async def fetchall(self, sql, params=()):
+        async with self._lock:
+            cursor = await self.conn.execute(sql, params)
+            return await cursor.fetchall()
+
+
+#(event loop, db path) -> task connecting its Database. asyncio locks and futures belong to one loop,
+#so each loop gets its own connection.
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def _forget_after_fork():
+    """Connection threads don't survive fork; a child must open its own connections"""
+    _databases.clear()
+    _sync_local.__dict__.clear()
+
+
+os.register_at_fork(after_in_child=_forget_after_fork)
+
+
+async def get_db(db_path=DB_PATH):
+    """The shared Database for this event loop and path, connecting on first use"""
+    loop = asyncio.get_running_loop()
+    key = (loop, db_path)
+    with _databases_lock:
+        #Loops from finished asyncio.run calls never come back; close what they left behind
+        stale = [_databases.pop(k) for k in list(_databases) if k[0].is_closed()]
+        task = _databases.get(key)
+        if task is None:
+            task = _databases[key] = loop.create_task(Database(db_path).connect())
+    for old in stale:
+        await _close_task(old)
+    try:
+        return await task
+    except Exception:
+        with _databases_lock:
+            if _databases.get(key) is task:
+                del _databases[key]
+        raise
+
+
+async def _close_task(task):
+    if task.done() and not task.cancelled() and task.exception() is None:
+        await task.result().close()
+
+
+async def close_all():
+    """Close this loop's connections (e.g. before the loop exits)"""
+    loop = asyncio.get_running_loop()
+    with _databases_lock:
+        tasks = [_databases.pop(k) for k in list(_databases) if k[0] is loop]
+    for task in tasks:
+        await _close_task(task)
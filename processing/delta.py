@@ -0,0 +1,176 @@
+"""
+Delta re-investigation: only scrape what may have changed since a subject's last investigation.
+
+The new discovery hit list is compared with the profiles stored by the subject's latest
+investigation. URLs that are new, or whose stored profile is older than its site's TTL, are
+scraped again; the rest are reused as stored (their embeddings and summaries come from the
+caches). What changed is written to profile_changes:
+
+    added    a URL that wasn't in the last investigation
+    removed  a URL from the last investigation that discovery no longer finds
+    changed  one row per field (display_name, handle, bio, location, scrape_status) that differs
+"""
+import datetime
+import os
+import sqlite3
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from .blob_store import load_profiles_for_file_async
+from .db import get_db, get_sync_db
+
+DB_PATH = r"data/osint.db"
+
+#How long a stored profile counts as fresh
+DEFAULT_TTL_HOURS = float(os.getenv("DEEPSINT_PROFILE_TTL_HOURS", "24"))
+#Per-site overrides, keyed by platform (the host without www.); these rarely change or rate limit hard
+SITE_TTL_HOURS = {
+    "api.github.com": 72,
+    "codeforces.com": 168,
+    "lichess.org": 168,
+    "hub.docker.com": 168,
+    "api.monkeytype.com": 72,
+    "kaggle.com": 72,
+}
+#Other statuses (error, challenge, empty, unknown) are retried on every run
+REUSABLE_STATUSES = ("ok", "auth_gate")
+CHANGE_FIELDS = ("display_name", "handle", "bio", "location", "scrape_status")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profile_changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    file_path TEXT NOT NULL, -- the investigation that saw the change
+    url TEXT NOT NULL,
+    platform TEXT,
+    change TEXT NOT NULL, -- added, removed, changed
+    field TEXT,
+    old_value TEXT,
+    new_value TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_profile_changes_file ON profile_changes(file_path);
+CREATE INDEX IF NOT EXISTS idx_profile_changes_username ON profile_changes(username, created_at);
+"""
+
+LATEST_FILE_SQL = "SELECT file_path FROM user_files WHERE username = ? ORDER BY id DESC LIMIT 1"
+INSERT_CHANGE_SQL = """
+INSERT INTO profile_changes (username, file_path, url, platform, change, field, old_value, new_value, created_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+FILE_CHANGES_SQL = """
+SELECT url, platform, change, field, old_value, new_value FROM profile_changes WHERE file_path = ? ORDER BY id
+"""
+
+
+@dataclass
+class DeltaPlan:
+    scrape: List[str] = field(default_factory=list)
+    #Fresh stored profiles, used as they are
+    reuse: List[dict] = field(default_factory=list)
+    #url -> stale stored profile, kept if its re-scrape fails
+    fallback: Dict[str, dict] = field(default_factory=dict)
+    removed: List[dict] = field(default_factory=list)
+
+    def describe(self):
+        new = len(self.scrape) - len(self.fallback)
+        return (f"{len(self.reuse)} fresh, {len(self.fallback)} stale, {new} new, "
+                f"{len(self.removed)} no longer found")
+
+
+def site_ttl(platform):
+    return datetime.timedelta(hours=SITE_TTL_HOURS.get(platform, DEFAULT_TTL_HOURS))
+
+
+def _is_fresh(profile, now):
+    if profile.get("scrape_status") not in REUSABLE_STATUSES or not profile.get("scraped_at"):
+        return False
+    try:
+        scraped_at = datetime.datetime.fromisoformat(profile["scraped_at"])
+    except ValueError:
+        return False
+    return now - scraped_at < site_ttl(profile.get("platform"))
+
+
+async def init_delta_db(db_path=DB_PATH):
+    db = await get_db(db_path)
+    await db.executescript(SCHEMA)
+
+
+async def load_snapshot(username, db_path=DB_PATH):
+    """url -> profile from the subject's latest investigation; empty if there is none"""
+    db = await get_db(db_path)
+    row = await db.fetchone(LATEST_FILE_SQL, (username,))
+    if row is None:
+        return {}
+    return {profile["url"]: profile for profile in await load_profiles_for_file_async(row[0], db_path)}
+
+
+def plan_delta(urls, snapshot, now=None):
+    """Split a discovery hit list into what to scrape and what to reuse from snapshot"""
+    #Profiles store scraped_at in local time (see Profile)
+    now = now or datetime.datetime.now()
+    plan = DeltaPlan()
+    for url in dict.fromkeys(urls):
+        stored = snapshot.get(url)
+        if stored is None:
+            plan.scrape.append(url)
+        elif _is_fresh(stored, now):
+            plan.reuse.append(stored)
+        else:
+            plan.scrape.append(url)
+            plan.fallback[url] = stored
+    found = set(urls)
+    plan.removed = [profile for url, profile in snapshot.items() if url not in found]
+    return plan
+
+
+def diff_profiles(snapshot, profiles, removed):
+    """(url, platform, change, field, old, new) for everything that differs from snapshot"""
+    changes = []
+    for profile in profiles:
+        old = snapshot.get(profile.get("url"))
+        if old is None:
+            changes.append((profile.get("url"), profile.get("platform"), "added", None, None, None))
+            continue
+        for name in CHANGE_FIELDS:
+            if (old.get(name) or None) != (profile.get(name) or None):
+                changes.append((profile.get("url"), profile.get("platform"), "changed", name,
+                                old.get(name), profile.get(name)))
+    for profile in removed:
+        changes.append((profile.get("url"), profile.get("platform"), "removed", None, None, None))
+    return changes
+
+
+async def record_changes(username, file_path, changes, db_path=DB_PATH):
+    if not changes:
+        return
+    created_at = datetime.datetime.utcnow().isoformat()
+    db = await get_db(db_path)
+    await db.executemany(INSERT_CHANGE_SQL, [(username, file_path) + tuple(change) + (created_at,)
+                                             for change in changes])
+
+
+def summarize_changes(changes):
+    counts = {"added": 0, "removed": 0, "changed": 0}
+    changed_urls = set()
+    for url, _, change, *_ in changes:
+        if change == "changed":
+            changed_urls.add(url)
+        else:
+            counts[change] += 1
+    counts["changed"] = len(changed_urls)
+    return counts
+
+
+def get_changes(file_path, db_path=DB_PATH):
+    """Changes an investigation recorded, for the Results page"""
+    try:
+        rows = get_sync_db(db_path).execute(FILE_CHANGES_SQL, (file_path,)).fetchall()
+    except sqlite3.OperationalError as e:
+        #Delta mode has never run on this database
+        if "no such table" in str(e):
+            return []
+        raise
+    return [{"url": row[0], "platform": row[1], "change": row[2], "field": row[3],
+             "old_value": row[4], "new_value": row[5]} for row in rows]
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import os
+import platform
+import re
+import subprocess
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Dict, List, Optional
+from urllib.parse import urlparse
+
+if TYPE_CHECKING:
+    #Imported where it is used: aiohttp is slow to import and Blackbird discovery doesn't need it
+    import aiohttp
+
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+#WhatsMyName site list, the same data Blackbird checks
+WMN_DATA_PATH = os.path.join(SCRIPT_DIR, "data", "wmn-data.json")
+
+SWEEP_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+#Blackbird prints one line per hit containing the profile URL
+URL_PATTERN = re.compile(r"https?://[^\s\"'<>\]]+")
+
+
+def run_blackbird(username: str, timeout: float = 300):
+    """Run Blackbird through the platform script and return its raw output"""
+    if platform.system() == "Windows":
+        command = [os.path.join(SCRIPT_DIR, "run_blackbird.bat"), username]
+    else:
+        command = ["bash", os.path.join(SCRIPT_DIR, "run_blackbird.sh"), username]
+
+    completed = subprocess.run(command, capture_output=True, text=True, timeout=timeout, cwd=SCRIPT_DIR)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip() or completed.stdout.strip() or "Blackbird failed")
+    return completed.stdout
+
+
+def extract_profile_links(output: str) -> List[str]:
+    """Pull the unique profile URLs out of Blackbird output, in order of appearance"""
+    links = []
+    seen = set()
+    for match in URL_PATTERN.findall(output):
+        url = match.rstrip(".,)")
+        if url not in seen:
+            seen.add(url)
+            links.append(url)
+    return links
+
+
+def discover_profiles(username: str, timeout: float = 300) -> List[str]:
+    """Find candidate profile URLs for a username with Blackbird"""
+    return extract_profile_links(run_blackbird(username, timeout=timeout))
+
+
+class HostLimiter:
+    """Caps requests in flight overall and per host; share one instance to share the limits"""
+
+    def __init__(self, global_limit: int = 50, per_host: int = 4):
+        self.global_limit = global_limit
+        self.per_host = per_host
+        self._global = asyncio.Semaphore(global_limit)
+        self._hosts = defaultdict(lambda: asyncio.Semaphore(per_host))
+
+    @asynccontextmanager
+    async def limit(self, url: str):
+        async with self._global, self._hosts[urlparse(url).netloc]:
+            yield
+
+
+def load_sites(path: str = WMN_DATA_PATH) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["sites"]
+
+
+def site_account(site: Dict, username: str):
+    account = username
+    for char in site.get("strip_bad_char", ""):
+        account = account.replace(char, "")
+    return account
+
+
+def is_hit(site: Dict, status: int, body: str):
+    """WhatsMyName rule: expected status and string present, missing-profile string absent"""
+    if status != site["e_code"] or site["e_string"] not in body:
+        return False
+    return not (site.get("m_string") and site["m_string"] in body)
+
+
+async def check_site(session, site: Dict, username: str, limiter: HostLimiter, timeout: float = 15):
+    """Return the hit for one site, or None when the account doesn't exist or the site failed"""
+    import aiohttp
+    account = site_account(site, username)
+    url = site["uri_check"].replace("{account}", account)
+    body = site.get("post_body")
+    try:
+        async with limiter.limit(url):
+            async with session.request(
+                "POST" if body else "GET", url,
+                data=body.replace("{account}", account) if body else None,
+                headers=site.get("headers"),
+                timeout=aiohttp.ClientTimeout(total=timeout),
+                allow_redirects=True,
+            ) as response:
+                status = response.status
+                text = await response.text(errors="ignore")
+    except (aiohttp.ClientError, asyncio.TimeoutError, UnicodeError, ValueError):
+        return None
+
+    if not is_hit(site, status, text):
+        return None
+    return {
+        "name": site["name"],
+        "url": url,
+        "pretty_url": site.get("uri_pretty", site["uri_check"]).replace("{account}", account),
+        "category": site.get("cat"),
+    }
+
+
+async def sweep_username(username: str, sites: Optional[List[Dict]] = None,
+                         session: Optional["aiohttp.ClientSession"] = None,
+                         limiter: Optional[HostLimiter] = None, timeout: float = 15) -> List[Dict]:
+    """
+    Check every WhatsMyName site for the username concurrently, without shelling out to Blackbird.
+    Pass a shared session and limiter to reuse connections and limits across subjects.
+    """
+    if sites is None:
+        sites = load_sites()
+    if limiter is None:
+        limiter = HostLimiter()
+
+    own_session = session is None
+    if own_session:
+        import aiohttp
+        session = aiohttp.ClientSession(headers={"User-Agent": SWEEP_USER_AGENT})
+    try:
+        results = await asyncio.gather(*(check_site(session, site, username, limiter, timeout)
+                                         for site in sites))
+    finally:
+        if own_session:
+            await session.close()
+    return [hit for hit in results if hit]
+
+
+async def sweep_profile_links(username: str, **kwargs) -> List[str]:
+    """Profile URLs for a username from the native sweep, in the same form Blackbird reports them"""
+    return [hit["url"] for hit in await sweep_username(username, **kwargs)]
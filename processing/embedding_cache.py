@@ -0,0 +1,89 @@
+"""
+Metadata embeddings, stored once per distinct text.
+
+An embedding only depends on the model and the text that was embedded, so it is keyed by a hash
+of both. Re-scraping a page that hasn't changed, or reusing a stored profile, costs no Cohere call.
+Vectors are stored as float32 bytes.
+"""
+import hashlib
+import json
+import logging
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from .db import get_db
+from .profiler import EMBED_MODEL
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = r"data/osint.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profile_embeddings (
+    key TEXT PRIMARY KEY, -- sha256 of model and text
+    model TEXT NOT NULL,
+    vector BLOB NOT NULL, -- float32
+    created_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+GET_EMBEDDINGS_SQL = "SELECT key, vector FROM profile_embeddings WHERE key IN (SELECT value FROM json_each(?))"
+INSERT_EMBEDDING_SQL = "INSERT OR IGNORE INTO profile_embeddings (key, model, vector, created_at) VALUES (?, ?, ?, ?)"
+
+
+def embedding_key(text: str, model: str = EMBED_MODEL):
+    return hashlib.sha256(f"{model}\n{text}".encode("utf-8")).hexdigest()
+
+
+def _unpack(data):
+    vector = array("f")
+    vector.frombytes(data)
+    return vector.tolist()
+
+
+class EmbeddingCache:
+    """SQLite backed cache of metadata embeddings keyed by content"""
+
+    def __init__(self, db_path: str = DB_PATH, model: str = EMBED_MODEL):
+        self.db_path = db_path
+        self.model = model
+        self._ready = False
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, text: str):
+        return embedding_key(text, self.model)
+
+    async def _db(self):
+        db = await get_db(self.db_path)
+        if not self._ready:
+            await db.executescript(SCHEMA)
+            self._ready = True
+        return db
+
+    async def get_many(self, keys: List[str]) -> Dict[str, list]:
+        """Cached embeddings for whichever keys have one"""
+        db = await self._db()
+        rows = await db.fetchall(GET_EMBEDDINGS_SQL, (json.dumps(list(set(keys))),))
+        found = {key: _unpack(vector) for key, vector in rows}
+        self.hits += sum(1 for key in keys if key in found)
+        self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    async def put_many(self, embeddings: Dict[str, list]):
+        if not embeddings:
+            return
+        db = await self._db()
+        now = time.time()
+        await db.executemany(INSERT_EMBEDDING_SQL, [
+            (key, self.model, array("f", vector).tobytes(), now)
+            for key, vector in embeddings.items()
+        ])
+
+    def log_stats(self, label: Optional[str] = None):
+        total = self.hits + self.misses
+        hit_rate = (self.hits / total) if total else 0.0
+        logger.info("Embedding cache%s: %d/%d hits (%.0f%%)", f" [{label}]" if label else "",
+                    self.hits, total, hit_rate * 100)
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": hit_rate}
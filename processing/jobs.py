@@ -0,0 +1,229 @@
+import json
+import time
+import datetime
+
+from .db import get_db, get_sync_db
+
+DB_PATH = r"data/osint.db"
+
+#Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+#A running job whose heartbeat is older than this is assumed to belong to a dead worker
+HEARTBEAT_TIMEOUT = 60.0
+#Jobs that have been claimed this many times are failed instead of requeued
+MAX_ATTEMPTS = 3
+
+JOB_COLUMNS = ("id, username, profile_links, options, status, stage, worker_id, attempts, "
+               "result_json, error, created_at, started_at, heartbeat_at, finished_at, "
+               "urls_done, urls_total, stage_started_at")
+
+#Progress columns added after the table first shipped
+PROGRESS_COLUMNS = {"urls_done": "INTEGER", "urls_total": "INTEGER", "stage_started_at": "REAL"}
+
+#Hot statements, kept as constants so the connection's statement cache reuses them
+CLAIM_JOB_SQL = f"""
+UPDATE jobs
+   SET status = ?, worker_id = ?, attempts = attempts + 1, stage = 'claimed',
+       started_at = ?, heartbeat_at = ?, error = NULL
+ WHERE id = (SELECT id FROM jobs WHERE status = ? ORDER BY id LIMIT 1)
+RETURNING {JOB_COLUMNS}
+"""
+
+HEARTBEAT_SQL = """
+UPDATE jobs
+   SET heartbeat_at = ?, stage = COALESCE(?, stage), result_json = COALESCE(?, result_json),
+       urls_done = COALESCE(?, urls_done), urls_total = COALESCE(?, urls_total),
+       stage_started_at = COALESCE(?, stage_started_at)
+ WHERE id = ? AND worker_id = ? AND status = ?
+"""
+
+GET_JOB_SQL = f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?"
+
+
+def _now_iso():
+    return datetime.datetime.utcnow().isoformat()
+
+
+def _row_to_job(row):
+    if row is None:
+        return None
+    return {
+        "id": row[0],
+        "username": row[1],
+        "profile_links": json.loads(row[2]) if row[2] else [],
+        "options": json.loads(row[3]) if row[3] else {},
+        "status": row[4],
+        "stage": row[5],
+        "worker_id": row[6],
+        "attempts": row[7],
+        "result": json.loads(row[8]) if row[8] else None,
+        "error": row[9],
+        "created_at": row[10],
+        "started_at": row[11],
+        "heartbeat_at": row[12],
+        "finished_at": row[13],
+        "urls_done": row[14],
+        "urls_total": row[15],
+        "stage_started_at": row[16],
+    }
+
+
+def job_progress(job, now=None):
+    """
+    Progress of a job: stage, URLs done/total and, while scraping, an ETA in seconds
+    extrapolated from how long the URLs done so far took.
+    """
+    now = now or time.time()
+    done, total = job["urls_done"] or 0, job["urls_total"] or 0
+    eta = None
+    if job["status"] == RUNNING and job["stage"] == "scraping" and job["stage_started_at"] and 0 < done < total:
+        eta = (now - job["stage_started_at"]) / done * (total - done)
+    return {
+        "status": job["status"],
+        "stage": job["stage"],
+        "urls_done": done,
+        "urls_total": total,
+        "fraction": done / total if total else 0.0,
+        "eta_seconds": eta,
+    }
+
+
+async def init_jobs_db(db_path=DB_PATH):
+    """Create the job queue table if it doesn't exist."""
+    db = await get_db(db_path)
+    await db.executescript("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
+            profile_links TEXT, -- JSON list; empty means run discovery first
+            options TEXT, -- JSON dict of findProfiles options
+            status TEXT NOT NULL, -- queued, running, done, failed
+            stage TEXT, -- current stage while running
+            worker_id TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            result_json TEXT, -- partial while running, final once done
+            error TEXT,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            heartbeat_at REAL, -- unix time of the last heartbeat
+            finished_at TEXT,
+            urls_done INTEGER, -- profile URLs scraped (or reused) so far
+            urls_total INTEGER,
+            stage_started_at REAL -- unix time the current stage started
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, id);
+        """)
+    columns = {row[1] for row in await db.fetchall("PRAGMA table_info(jobs)")}
+    for name, kind in PROGRESS_COLUMNS.items():
+        if name not in columns:
+            await db.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+
+
+async def enqueue_job(username, profile_links=None, options=None, db_path=DB_PATH):
+    """Queue an investigation and return its job id."""
+    db = await get_db(db_path)
+    cursor = await db.execute(
+        "INSERT INTO jobs (username, profile_links, options, status, created_at) VALUES (?, ?, ?, ?, ?)",
+        (username, json.dumps(profile_links or []), json.dumps(options or {}), QUEUED, _now_iso())
+    )
+    return cursor.lastrowid
+
+
+async def claim_job(worker_id, db_path=DB_PATH):
+    """
+    Atomically move the oldest queued job to running and return it, or None if the queue is empty.
+    The select and update happen in one statement, so two workers can never claim the same job.
+    """
+    db = await get_db(db_path)
+    rows = await db.fetchall(CLAIM_JOB_SQL, (RUNNING, worker_id, _now_iso(), time.time(), QUEUED))
+    return _row_to_job(rows[0] if rows else None)
+
+
+async def heartbeat(job_id, worker_id, stage=None, partial_result=None, progress=None, db_path=DB_PATH):
+    """
+    Record that the worker is alive, optionally with its current stage, partial result and
+    progress, a (urls_done, urls_total, stage_started_at) tuple.
+    """
+    db = await get_db(db_path)
+    await db.execute(HEARTBEAT_SQL, (time.time(), stage,
+                                     json.dumps(partial_result) if partial_result is not None else None)
+                     + tuple(progress or (None, None, None)) + (job_id, worker_id, RUNNING))
+
+
+async def complete_job(job_id, worker_id, result, db_path=DB_PATH):
+    db = await get_db(db_path)
+    await db.execute("""
+    UPDATE jobs SET status = ?, stage = NULL, result_json = ?, finished_at = ?
+     WHERE id = ? AND worker_id = ?
+    """, (DONE, json.dumps(result), _now_iso(), job_id, worker_id))
+
+
+async def fail_job(job_id, worker_id, error, db_path=DB_PATH):
+    db = await get_db(db_path)
+    await db.execute("""
+    UPDATE jobs SET status = ?, error = ?, finished_at = ?
+     WHERE id = ? AND worker_id = ?
+    """, (FAILED, str(error), _now_iso(), job_id, worker_id))
+
+
+async def requeue_stale_jobs(timeout=HEARTBEAT_TIMEOUT, max_attempts=MAX_ATTEMPTS, worker_id=None, db_path=DB_PATH):
+    """
+    Put running jobs whose worker stopped heartbeating back in the queue.
+    With worker_id, that worker's jobs are requeued straight away (used when its process is known to be dead).
+    Jobs that already used max_attempts are failed instead. Returns the number of jobs touched.
+    """
+    if worker_id is not None:
+        where, params = "status = ? AND worker_id = ?", (RUNNING, worker_id)
+    else:
+        where, params = "status = ? AND heartbeat_at < ?", (RUNNING, time.time() - timeout)
+
+    db = await get_db(db_path)
+    async with db.transaction() as conn:
+        failed = await conn.execute(f"""
+        UPDATE jobs SET status = ?, error = 'worker died too many times', finished_at = ?
+         WHERE {where} AND attempts >= ?
+        """, (FAILED, _now_iso()) + params + (max_attempts,))
+        requeued = await conn.execute(f"""
+        UPDATE jobs SET status = ?, worker_id = NULL, stage = NULL, result_json = NULL,
+                        urls_done = NULL, urls_total = NULL, stage_started_at = NULL
+         WHERE {where}
+        """, (QUEUED,) + params)
+    return failed.rowcount + requeued.rowcount
+
+
+async def get_job(job_id, db_path=DB_PATH):
+    db = await get_db(db_path)
+    return _row_to_job(await db.fetchone(GET_JOB_SQL, (job_id,)))
+
+
+def _list_jobs_query(statuses, limit):
+    query = f"SELECT {JOB_COLUMNS} FROM jobs"
+    params = ()
+    if statuses:
+        query += f" WHERE status IN ({', '.join('?' for _ in statuses)})"
+        params = tuple(statuses)
+    return query + " ORDER BY id DESC LIMIT ?", params + (limit,)
+
+
+async def list_jobs(statuses=None, limit=50, db_path=DB_PATH):
+    """Most recent jobs first, optionally filtered by status."""
+    db = await get_db(db_path)
+    return [_row_to_job(row) for row in await db.fetchall(*_list_jobs_query(statuses, limit))]
+
+
+#Sync reads for the Streamlit pages, which poll without starting an event loop per call
+
+def list_jobs_sync(statuses=None, limit=50, db_path=DB_PATH):
+    return [_row_to_job(row) for row in get_sync_db(db_path).execute(*_list_jobs_query(statuses, limit)).fetchall()]
+
+
+def get_job_progress(job_id, db_path=DB_PATH):
+    """The job, with its partial result, merged with job_progress; None if there is no such job"""
+    job = _row_to_job(get_sync_db(db_path).execute(GET_JOB_SQL, (job_id,)).fetchone())
+    if job is not None:
+        job.update(job_progress(job))
+    return job
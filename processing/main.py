@@ -1,70 +1,104 @@
-from .scraper import UniversalScraper, clean_json
-from .profiler import calculate_cohere_embeddings, cluster_profiles_from_modalities
-import json
+from .shards import make_scraper
+from .pipeline import InvestigationPipeline
 import asyncio
+import logging
 import os
-import aiosqlite
+import uuid
 import datetime
-from .summary import summarize_cluster_full
+from .summary import stream_cluster_summaries
+from .summary_cache import SummaryCache
+from .tracing import traced, trace_investigation, log_breakdown, recorder
+from .db import get_db
+from .blob_store import SCHEMA as BLOB_SCHEMA, HOT_FIELDS, hot_values, profile_column_upgrades, store_profile_blobs
+from .results_store import init_results_db, save_result
+from .search_index import init_search_index, index_profile_blobs
+from .embedding_cache import EmbeddingCache
+from .delta import init_delta_db, load_snapshot, plan_delta, diff_profiles, record_changes, summarize_changes
+from .pivot import PivotCrawler
+
+logger = logging.getLogger(__name__)
 
 #Use osint.db for testing
 DB_PATH = r"data/osint.db"
+#Profiles live in the blob store; set DEEPSINT_JSON_ARTIFACTS=1 to also write a JSON file per investigation
+WRITE_JSON_ARTIFACTS = os.getenv("DEEPSINT_JSON_ARTIFACTS", "0") == "1"
 
 def get_versioned_filename(base_path):
-    version = 1
-    while os.path.exists(base_path + f"_v{version}.json"):
-        version += 1
-    return base_path + f"_v{version}.json"
+    """
+    Unique artifact name for this run, built without probing the filesystem:
+    a UTC timestamp keeps names sortable and a random suffix rules out collisions.
+    """
+    stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    return f"{base_path}_{stamp}_{uuid.uuid4().hex[:8]}.json"
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_files (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    file_path TEXT NOT NULL UNIQUE,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS profiles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    profile_index INTEGER NOT NULL,
+    platform TEXT,
+    url TEXT,
+    blob_hash TEXT REFERENCES profile_blobs(hash), -- full scraped object, see blob_store
+    display_name TEXT,
+    handle TEXT,
+    bio TEXT,
+    location TEXT,
+    scrape_status TEXT,
+    scraped_at TEXT,
+    cluster_id TEXT, -- optional: store cluster label
+    created_at TEXT NOT NULL,
+    UNIQUE(file_path, profile_index)
+);
+"""
+
+#Created after legacy tables have been given their new columns
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_profiles_blob ON profiles(blob_hash);
+CREATE INDEX IF NOT EXISTS idx_user_files_username ON user_files(username, id);
+"""
+
+INSERT_FILE_SQL = "INSERT OR IGNORE INTO user_files (username, file_path, created_at) VALUES (?, ?, ?)"
+
+INSERT_PROFILE_SQL = """
+INSERT OR IGNORE INTO profiles
+  (username, file_path, profile_index, platform, url, blob_hash, {}, cluster_id, created_at)
+VALUES (?, ?, ?, ?, ?, ?, {}, ?, ?)
+""".format(", ".join(HOT_FIELDS), ", ".join("?" for _ in HOT_FIELDS))
 
 
 async def init_db(db_path=DB_PATH):
-    """Create tables if they don't exist."""
-    async with aiosqlite.connect(db_path) as db:
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS user_files (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL,
-            file_path TEXT NOT NULL UNIQUE,
-            created_at TEXT NOT NULL
-        )
-        """)
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS profiles (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL,
-            file_path TEXT NOT NULL,
-            profile_index INTEGER NOT NULL,
-            platform TEXT,
-            url TEXT,
-            raw_json TEXT, -- store full scraped object as JSON string
-            cluster_id TEXT, -- optional: store cluster label
-            created_at TEXT NOT NULL,
-            UNIQUE(file_path, profile_index)
-        )
-        """)
-        await db.commit()
+    """Create tables if they don't exist, and add the blob columns to a legacy profiles table."""
+    db = await get_db(db_path)
+    await db.executescript(BLOB_SCHEMA + SCHEMA)
+    columns = {row[1] for row in await db.fetchall("PRAGMA table_info(profiles)")}
+    for statement in profile_column_upgrades(columns):
+        await db.execute(statement)
+    await db.executescript(INDEXES)
 
+@traced("insert_file_to_db_async")
 async def insert_file_to_db_async(username, file_path, db_path=DB_PATH):
-    """Insert file record (safe for concurrent async usage)."""
+    """Insert file record (safe for concurrent async usage); a file that is already recorded is left as is."""
     created_at = datetime.datetime.utcnow().isoformat()
-    async with aiosqlite.connect(db_path) as db:
-        try:
-            await db.execute(
-                "INSERT INTO user_files (username, file_path, created_at) VALUES (?, ?, ?)",
-                (username, file_path, created_at)
-            )
-            await db.commit()
-        except aiosqlite.IntegrityError:
-            # already exists; ignore or update timestamp if you want
-            # Optionally: update the created_at or log
-            print("UH OH")
-            pass
-
-async def insert_profiles_from_json_async(username, file_path, data, clusters=None, db_path=DB_PATH):
+    db = await get_db(db_path)
+    await db.execute(INSERT_FILE_SQL, (username, file_path, created_at))
+
+@traced("insert_profiles_from_json_async",
+        attributes=lambda username, file_path, data, *args, **kwargs: {"batch_size": len(data)})
+async def insert_profiles_from_json_async(username, file_path, data, clusters=None, db_path=DB_PATH, start_index=0):
     """
-    Insert each profile object into `profiles`.
+    Insert each profile object into `profiles`, all in one transaction.
+    Profile content goes to the blob store (once per unique profile) and into the search index.
     data should be a list-like object where each element is the scraped profile dict.
     clusters (optional) is a mapping cluster->list_of_indices so we can set cluster_id.
+    start_index is the profile_index of data[0], for inserting a file's profiles in several batches.
     """
     created_at = datetime.datetime.utcnow().isoformat()
     # build a mapping index -> cluster id (optional)
@@ -74,71 +108,177 @@ async def insert_profiles_from_json_async(username, file_path, data, clusters=No
             for i in indices:
                 index_to_cluster[i] = str(cluster_id)
 
-    async with aiosqlite.connect(db_path) as db:
-        insert_sql = """
-        INSERT OR IGNORE INTO profiles
-          (username, file_path, profile_index, platform, url, raw_json, cluster_id, created_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """
-        for idx, profile_obj in enumerate(data):
+    db = await get_db(db_path)
+    async with db.transaction() as conn:
+        hashes, new_blobs = await store_profile_blobs(conn, data, db_path)
+        await index_profile_blobs(conn, new_blobs, username, file_path)
+
+        rows = []
+        for idx, (profile_obj, blob_hash) in enumerate(zip(data, hashes), start_index):
             platform = profile_obj.get("platform") or profile_obj.get("site") or None
             url = profile_obj.get("url") or profile_obj.get("profile_url") or None
-            raw_json = json.dumps(profile_obj, ensure_ascii=False)
-            cluster_id = index_to_cluster.get(idx)
-            await db.execute(insert_sql, (username, file_path, idx, platform, url, raw_json, cluster_id, created_at))
-        await db.commit()
+            rows.append((username, file_path, idx, platform, url, blob_hash) + hot_values(profile_obj)
+                        + (index_to_cluster.get(idx), created_at))
+        await conn.executemany(INSERT_PROFILE_SQL, rows)
 
 
-#Output stuff as a dictionary
-async def findProfiles(profileLinks, user):
+async def stream_profiles(profileLinks, user, refresh_summaries=False, on_stage=None, pipeline_options=None,
+                          scraper=None, delta=False, pivot=None, chat_client=None, db_path=DB_PATH):
     """
-    This will go through the entire scraping, profiling and summarization process
-    profileLinks are the profiles from blackbird, and user will be username/name/email being searched
-    user is needed for the file names.
+    Async generator version of findProfiles that reports results as soon as they exist.
+    With pivot, yields ("pivot", stats) once the profiles linked from the scraped ones are scraped.
+    With delta, then yields ("delta", counts) with how many profiles were reused, scraped,
+    added, removed and changed since the subject's last investigation.
+    Yields ("clusters", {cluster: [platforms]}) once clustering is done, then
+    ("summary", cluster, chunk) for each streamed piece of summary text and
+    ("summary_done", cluster, full_text) when a cluster's summary is complete, or
+    ("summary_failed", cluster, error) if it failed; the result is saved without that summary.
+    on_stage (optional) is an async callable told the name of each stage as it starts.
+    pipeline_options (optional) are passed to InvestigationPipeline, e.g. scrape_delay or scrape_concurrency.
+    scraper (optional) is a UniversalScraper to reuse, e.g. one with a browser shared across subjects.
+    delta only scrapes profiles that are new or stale since the subject's last investigation (see delta.py).
+    pivot (optional) is a dict of PivotCrawler options, e.g. {"max_pages": 30}; {} uses the defaults (see pivot.py).
+    chat_client (optional) is the async Cohere client summaries use, e.g. one shared across subjects.
+    db_path is the database every store (profiles, results, caches, changes) reads and writes;
+    spans go wherever tracing.recorder writes (the worker points it at the same database).
     """
+    with trace_investigation(user, urls=len(profileLinks)) as root:
+        async for event in _stream_profiles(profileLinks, user, refresh_summaries, on_stage,
+                                            dict(pipeline_options or {}), scraper, delta, pivot, chat_client,
+                                            db_path):
+            yield event
+    #None when tracing is off
+    if root.trace_id is not None:
+        log_breakdown(root.trace_id, db_path=recorder.db_path)
 
-    await init_db()
 
+async def _stream_profiles(profileLinks, user, refresh_summaries, on_stage, pipeline_options, scraper, delta, pivot,
+                           chat_client, db_path):
 
-    #First is scraping
-    scraper = UniversalScraper(use_playwright=True, headless=True)
+    async def report_stage(stage):
+        if on_stage is not None:
+            await on_stage(stage)
 
-    results = await scraper.batch_scrape(profileLinks, 3)
+    await init_db(db_path)
+    await init_results_db(db_path)
+    await init_search_index(db_path)
+    await init_delta_db(db_path)
 
-    if not results:
-        return {}
+    #Re-investigation: reuse fresh stored profiles, re-scrape the rest
+    snapshot, plan = {}, None
+    seeds = profileLinks
+    if delta:
+        snapshot = await load_snapshot(user, db_path=db_path)
+        plan = plan_delta(profileLinks, snapshot)
+        logger.info("Delta re-investigation of %s: %s", user, plan.describe())
+        profileLinks = plan.scrape
 
     #Create file path
     file_path = get_versioned_filename(f"{user}")
 
-    scraper.export_results(results, file_path)
-    clean_json(file_path)
-    #HAVE DATABASE MOVE HERE
-    await insert_file_to_db_async(user, file_path)
+    async def persist(start_index, rows):
+        await insert_profiles_from_json_async(user, file_path, rows, clusters=None, db_path=db_path,
+                                              start_index=start_index)
 
-    #Expect the exported JSON to be a list of profile dicts; adjust if shape differs
-    with open(file_path, "r", encoding="utf-8") as fh:
-        data = json.load(fh)
+    #Scrape, clean, persist and embed run as overlapping stages
+    if scraper is None:
+        #Sharded across processes when DEEPSINT_SCRAPE_SHARDS > 1
+        scraper = make_scraper()
+    #Pass embedding_cache=None in pipeline_options to always call Cohere
+    pipeline_options.setdefault("embedding_cache", EmbeddingCache(db_path=db_path))
+    pipeline = InvestigationPipeline(scraper, persist=persist, **pipeline_options)
+    await report_stage("scraping")
+    if plan is not None:
+        data = await pipeline.run(profileLinks, reuse=plan.reuse, fallback=plan.fallback)
+    else:
+        data = await pipeline.run(profileLinks)
 
-    await insert_profiles_from_json_async(user, file_path, data, clusters=None)
+    #Follow links and handles on the scraped profiles; pivoted profiles are clustered with the rest
+    if pivot is not None:
+        await report_stage("pivoting")
+        crawler = PivotCrawler(user, seeds=seeds, snapshot=snapshot, **pivot)
+        data = await crawler.expand(pipeline, data)
+        yield "pivot", crawler.report()
 
-    #Determine Cohere embeddings
-    pfp_embeddings, meta_embeddings = calculate_cohere_embeddings(file_path)
-    pid_to_label, clusters, combined_sim, dist = cluster_profiles_from_modalities(pfp_embeddings, meta_embeddings)
+    #Diffed after the pivot, so profiles it finds again aren't reported as removed
+    if plan is not None:
+        found = {profile.get("url") for profile in data}
+        removed = [profile for profile in plan.removed if profile.get("url") not in found]
+        #A first investigation has nothing to compare against
+        changes = diff_profiles(snapshot, data, removed) if snapshot else []
+        await record_changes(user, file_path, changes, db_path=db_path)
+        yield "delta", dict(summarize_changes(changes), reused=pipeline.reused,
+                            scraped=len(data) - pipeline.reused - pipeline.fallbacks)
 
+    if not data:
+        await save_result(user, None, [], {}, {}, db_path=db_path)
+        return
 
-    profile_info = {}
-    for key in clusters.keys():
-        profile_info[key] = [[]]
-        #Open json scraper file in the database
-        #Let's call this data for now
-        #Do the json.load() process
+    #The in-memory profiles feed every later stage; the blob store already holds them
+    if WRITE_JSON_ARTIFACTS:
+        scraper.export_results(data, file_path, indent=None)
+    #HAVE DATABASE MOVE HERE
+    await insert_file_to_db_async(user, file_path, db_path=db_path)
+
+    #Cluster as soon as embedding drains
+    await report_stage("clustering")
+    #Deferred like the other numpy users: only needed once there is something to cluster
+    from .cluster_structure import ClusterStructure, save_cluster_structure
+    #Similarities are kept with the investigation so the Results page can re-cluster it at any granularity
+    structure = ClusterStructure.from_embeddings(pipeline.pfp_embeddings, pipeline.meta_embeddings)
+    pid_to_label, clusters = structure.cluster()
+    await save_cluster_structure(file_path, structure, db_path=db_path)
+
+    #Platforms are known as soon as clustering is done, summaries follow
+    yield "clusters", {key: [data[val]["platform"] for val in clusters[key]] for key in clusters.keys()}
+
+    await report_stage("summarizing")
+    summary_cache = SummaryCache(db_path=db_path)
+    summaries = {key: [] for key in clusters.keys()}
+    finished = {}
+    try:
+        async for key, chunk in stream_cluster_summaries(clusters, data, user,
+                                                         cache=summary_cache,
+                                                         force_refresh=refresh_summaries,
+                                                         client=chat_client):
+            if chunk is None:
+                finished[key] = "".join(summaries[key])
+                yield "summary_done", key, finished[key]
+            elif isinstance(chunk, Exception):
+                yield "summary_failed", key, f"{type(chunk).__name__}: {chunk}"
+            else:
+                summaries[key].append(chunk)
+                yield "summary", key, chunk
+    finally:
+        summary_cache.log_stats(user)
+        summary_cache.close()
+
+    await save_result(user, file_path, data, clusters, finished, db_path=db_path)
 
-        for val in clusters[key]:
-            profile_info[key][0].append(data[val]["platform"])
-        #Add summary here
 
-        profile_info[key].append(summarize_cluster_full(clusters[key],file_path, user))
+#Output stuff as a dictionary
+async def findProfiles(profileLinks, user, refresh_summaries=False, on_stage=None, pipeline_options=None,
+                       scraper=None, delta=False, pivot=None):
+    """
+    This will go through the entire scraping, profiling and summarization process
+    profileLinks are the profiles from blackbird, and user will be username/name/email being searched
+    user is needed for the file names.
+    refresh_summaries forces every cluster summary to be regenerated instead of served from cache.
+    on_stage (optional) is an async callable told the name of each stage as it starts.
+    pipeline_options (optional) are passed to InvestigationPipeline, e.g. scrape_delay or scrape_concurrency.
+    scraper (optional) is a UniversalScraper to reuse, e.g. one with a browser shared across subjects.
+    delta only scrapes profiles that are new or stale since the subject's last investigation.
+    pivot (optional) is a dict of PivotCrawler options; when given, linked profiles are scraped too.
+    """
+    profile_info = {}
+    async for event in stream_profiles(profileLinks, user, refresh_summaries=refresh_summaries,
+                                       on_stage=on_stage, pipeline_options=pipeline_options,
+                                       scraper=scraper, delta=delta, pivot=pivot):
+        if event[0] == "clusters":
+            for key, platforms in event[1].items():
+                profile_info[key] = [platforms]
+        elif event[0] == "summary_done":
+            profile_info[event[1]].append(event[2])
 
     return profile_info
 
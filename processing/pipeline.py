@@ -0,0 +1,278 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, asdict, fields
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+from .scraper import UniversalScraper, Profile, clean_profile
+from .profiler import get_cohere_client, profile_metadata_text, embed_texts, EMBED_BATCH_SIZE
+from .embedding_cache import EmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+#Max items buffered between two stages; a full queue pauses the stage upstream
+QUEUE_SIZE = 16
+#Max profiles written to the DB in one go
+PERSIST_BATCH_SIZE = 32
+
+_DONE = object()
+
+_PROFILE_FIELDS = {f.name for f in fields(Profile)}
+
+
+def profile_from_dict(row: dict):
+    """Profile from a stored profile dict, ignoring keys the dataclass no longer has"""
+    return Profile(**{key: value for key, value in row.items() if key in _PROFILE_FIELDS})
+
+
+@dataclass
+class StageStats:
+    """Where a stage spent its wall time"""
+    name: str
+    items: int = 0
+    busy: float = 0.0     #working on items
+    idle: float = 0.0     #waiting for input from upstream
+    blocked: float = 0.0  #waiting for room downstream (backpressure)
+
+    async def get(self, queue: asyncio.Queue):
+        start = time.perf_counter()
+        item = await queue.get()
+        self.idle += time.perf_counter() - start
+        return item
+
+    async def put(self, queue: asyncio.Queue, item):
+        start = time.perf_counter()
+        await queue.put(item)
+        self.blocked += time.perf_counter() - start
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def _drain(queue: asyncio.Queue, first, limit: int):
+    """Take `first` plus whatever is already waiting in the queue, up to limit items"""
+    batch = [first]
+    while len(batch) < limit:
+        try:
+            item = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            break
+        if item is _DONE:
+            return batch, True
+        batch.append(item)
+    return batch, False
+
+
+async def _run_stages(*coros):
+    """Run stages concurrently; if one fails the rest are cancelled"""
+    tasks = [asyncio.create_task(c) for c in coros]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+class InvestigationPipeline:
+    """
+    Scrape -> clean -> persist -> embed, connected by bounded queues so every stage
+    works on profiles as soon as they arrive instead of waiting for the previous stage to finish.
+    """
+
+    def __init__(self, scraper: UniversalScraper,
+                 persist: Optional[Callable[[int, List[dict]], Awaitable[None]]] = None,
+                 scrape_delay: float = 3.0, scrape_concurrency: int = 3,
+                 queue_size: int = QUEUE_SIZE, embed_batch_size: int = EMBED_BATCH_SIZE,
+                 cohere_client=None, embedding_cache: Optional[EmbeddingCache] = None,
+                 on_progress: Optional[Callable[[int, int], None]] = None):
+        self.scraper = scraper
+        self.cohere_client = cohere_client
+        self.embedding_cache = embedding_cache
+        #Told (urls done, urls total) whenever a URL has been scraped, failed or been reused
+        self.on_progress = on_progress
+        self.persist = persist
+        self.scrape_delay = scrape_delay
+        self.scrape_concurrency = scrape_concurrency
+        self.queue_size = queue_size
+        self.embed_batch_size = embed_batch_size
+
+        self.stats: Dict[str, StageStats] = {
+            name: StageStats(name) for name in ("scrape", "clean", "persist", "embed")
+        }
+        self.wall_time = 0.0
+        #Outputs, indexed by arrival order
+        self.profiles: List[Profile] = []
+        self.data: List[dict] = []
+        self.pfp_embeddings: Dict[int, list] = {}
+        self.meta_embeddings: Dict[int, list] = {}
+        #Profiles that came from the database instead of a scrape
+        self.reused = 0
+        self.fallbacks = 0
+        self.urls_done = 0
+        self.urls_total = 0
+
+    async def run(self, urls: List[str], reuse: Sequence[dict] = (), fallback: Optional[Dict[str, dict]] = None):
+        """
+        Run every stage to completion and return the profile dicts.
+        reuse are stored profiles that go through the later stages without being scraped;
+        fallback maps url -> stored profile, used when that url's scrape comes back empty.
+        """
+        scraped = asyncio.Queue(maxsize=self.queue_size)
+        cleaned = asyncio.Queue(maxsize=self.queue_size)
+        persisted = asyncio.Queue(maxsize=self.queue_size)
+
+        start = time.perf_counter()
+        await _run_stages(
+            self._scrape_stage(urls, scraped, reuse, fallback or {}),
+            self._clean_stage(scraped, cleaned),
+            self._persist_stage(cleaned, persisted),
+            self._embed_stage(persisted),
+        )
+        #Accumulates when run is called again, e.g. for pivot rounds
+        self.wall_time += time.perf_counter() - start
+        self.log_report()
+        return self.data
+
+    async def _scrape_stage(self, urls, out: asyncio.Queue, reuse, fallback):
+        stats = self.stats["scrape"]
+        self.urls_total += len(urls) + len(reuse)
+        for row in reuse:
+            self.reused += 1
+            self._url_done()
+            await stats.put(out, profile_from_dict(row))
+        if not urls:
+            await out.put(_DONE)
+            return
+
+        scraped_urls = set()
+        owns_browser = not self.scraper.started
+        try:
+            if owns_browser:
+                await self.scraper.start()
+            stream = self.scraper.scrape_stream(urls, delay=self.scrape_delay,
+                                                concurrency=self.scrape_concurrency,
+                                                on_attempt=lambda url: self._url_done())
+            while True:
+                start = time.perf_counter()
+                try:
+                    profile = await stream.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    stats.busy += time.perf_counter() - start
+                stats.items += 1
+                scraped_urls.add(profile.url)
+                await stats.put(out, profile)
+        finally:
+            if owns_browser:
+                await self.scraper.close()
+        for url, row in fallback.items():
+            if url not in scraped_urls:
+                self.fallbacks += 1
+                await stats.put(out, profile_from_dict(row))
+        await out.put(_DONE)
+
+    def _url_done(self):
+        self.urls_done += 1
+        if self.on_progress is not None:
+            self.on_progress(self.urls_done, self.urls_total)
+
+    async def _clean_stage(self, inp: asyncio.Queue, out: asyncio.Queue):
+        stats = self.stats["clean"]
+        #e.g. ShardedScraper, which cleans in its shard processes
+        already_clean = getattr(self.scraper, "cleans_profiles", False)
+        while True:
+            profile = await stats.get(inp)
+            if profile is _DONE:
+                break
+            if not already_clean:
+                start = time.perf_counter()
+                clean_profile(profile)
+                stats.busy += time.perf_counter() - start
+            stats.items += 1
+            await stats.put(out, profile)
+        await out.put(_DONE)
+
+    async def _persist_stage(self, inp: asyncio.Queue, out: asyncio.Queue):
+        stats = self.stats["persist"]
+        finished = False
+        while not finished:
+            first = await stats.get(inp)
+            if first is _DONE:
+                break
+            batch, finished = _drain(inp, first, PERSIST_BATCH_SIZE)
+
+            start = time.perf_counter()
+            start_index = len(self.data)
+            rows = [asdict(profile) for profile in batch]
+            self.profiles.extend(batch)
+            self.data.extend(rows)
+            if self.persist is not None:
+                await self.persist(start_index, rows)
+            stats.busy += time.perf_counter() - start
+            stats.items += len(batch)
+
+            for offset, row in enumerate(rows):
+                await stats.put(out, (start_index + offset, row))
+        await out.put(_DONE)
+
+    async def _embed_stage(self, inp: asyncio.Queue):
+        stats = self.stats["embed"]
+        finished = False
+        while not finished:
+            first = await stats.get(inp)
+            if first is _DONE:
+                break
+            batch, finished = _drain(inp, first, self.embed_batch_size)
+
+            #Has to be okay, not auth blocked
+            batch = [(idx, row) for idx, row in batch if row["scrape_status"] == "ok"]
+            if not batch:
+                continue
+            start = time.perf_counter()
+            texts = [profile_metadata_text(row) for _, row in batch]
+            embeddings = await self._embed(texts)
+            for (idx, _), embedding in zip(batch, embeddings):
+                self.meta_embeddings[idx] = embedding
+            stats.busy += time.perf_counter() - start
+            stats.items += len(batch)
+
+    async def _embed(self, texts: List[str]):
+        """Embeddings for texts, only calling Cohere for the ones not in the cache"""
+        if self.embedding_cache is None:
+            return await asyncio.to_thread(embed_texts, self._client(), texts)
+        keys = [self.embedding_cache.key(text) for text in texts]
+        found = await self.embedding_cache.get_many(keys)
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            fresh = await asyncio.to_thread(embed_texts, self._client(), list(missing.values()))
+            fresh = dict(zip(missing, fresh))
+            await self.embedding_cache.put_many(fresh)
+            found.update(fresh)
+        return [found[key] for key in keys]
+
+    def _client(self):
+        if self.cohere_client is None:
+            self.cohere_client = get_cohere_client()
+        return self.cohere_client
+
+    def report(self):
+        """Per-stage busy/idle/blocked seconds plus the share of wall time spent busy"""
+        report = []
+        for stats in self.stats.values():
+            row = stats.as_dict()
+            row["utilization"] = (stats.busy / self.wall_time) if self.wall_time else 0.0
+            report.append(row)
+        return report
+
+    def log_report(self):
+        logger.info("Pipeline finished in %.2fs (%d stored profiles reused, %d stale kept after a failed scrape)",
+                    self.wall_time, self.reused, self.fallbacks)
+        for row in self.report():
+            logger.info(
+                "  %-8s items=%-4d busy=%.2fs idle=%.2fs blocked=%.2fs utilization=%.0f%%",
+                row["name"], row["items"], row["busy"], row["idle"], row["blocked"],
+                row["utilization"] * 100
+            )
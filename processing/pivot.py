@@ -0,0 +1,305 @@
+"""
+Pivot crawling: follow the links and handles found on scraped profiles to more profiles.
+
+After the discovered URLs are scraped, every profile's links and social_links are normalised,
+filtered down to URLs that look like profiles on other sites and pushed onto a frontier ordered
+by (depth, tier): links to well-known social sites first, then accounts the optional username
+sweep found for new handles, then any other outbound link. The frontier is scraped in rounds,
+one depth at a time, through the same pipeline, so pivoted profiles are persisted, embedded and
+clustered with the rest.
+
+Cost stays bounded however densely pages link to each other: at most MAX_LINKS_PER_PROFILE links
+are read per profile, the frontier holds at most max_frontier URLs, and each round only takes
+what is left of the total and per-host budgets. Every URL ever offered goes into a Bloom filter
+(fixed memory, so the heavy repeats of a link-dense crawl are dropped with one hash test) and
+every URL actually queued into an exact set of normalised URLs.
+
+In a delta re-investigation the crawler is given the previous investigation's snapshot, so
+profiles it pivoted to last time are reused while fresh and kept if their re-scrape fails,
+exactly like the discovered ones.
+"""
+import hashlib
+import heapq
+import logging
+import math
+import re
+from collections import Counter
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+#Budgets
+MAX_DEPTH = 2
+MAX_PAGES = 30
+PER_HOST = 3
+MAX_FRONTIER = 500
+MAX_HANDLES = 2
+#Links read per profile; scraped pages already cap links at 20
+MAX_LINKS_PER_PROFILE = 50
+
+#Frontier tiers, lower is scraped first
+TIER_SOCIAL = 0
+TIER_SWEEP = 1
+TIER_LINK = 2
+
+#Sites whose profile links are worth following first, and where the path starts with the handle
+SOCIAL_HOSTS = {
+    "github.com", "gitlab.com", "x.com", "instagram.com", "linkedin.com", "facebook.com",
+    "youtube.com", "tiktok.com", "medium.com", "reddit.com", "twitch.tv", "mastodon.social",
+    "bsky.app", "keybase.io", "huggingface.co", "kaggle.com", "codeforces.com", "lichess.org",
+    "dev.to", "stackoverflow.com", "substack.com", "threads.net", "t.me",
+}
+HOST_ALIASES = {"twitter.com": "x.com", "mobile.twitter.com": "x.com", "m.facebook.com": "facebook.com",
+                "mobile.x.com": "x.com", "m.youtube.com": "youtube.com"}
+#Path segments that lead to a site's own pages rather than to someone's profile
+SKIP_SEGMENTS = {
+    "login", "signin", "sign_in", "signup", "sign_up", "join", "register", "logout", "about", "privacy",
+    "terms", "tos", "legal", "help", "support", "settings", "explore", "search", "share", "sharer",
+    "intent", "hashtag", "tags", "tag", "download", "pricing", "features", "blog", "docs", "policies",
+    "cookies", "contact", "careers", "jobs", "press", "home", "watch", "status", "posts", "p",
+    "oauth", "auth", "sessions", "site", "i",
+}
+SKIP_HOSTS = {
+    "google.com", "goo.gl", "apple.com", "apps.apple.com", "play.google.com", "schema.org", "w3.org",
+    "fonts.googleapis.com", "cloudflare.com", "gravatar.com", "archive.org", "wikipedia.org",
+}
+ASSET_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".ico", ".css", ".js", ".pdf",
+                    ".zip", ".mp4", ".mp3", ".xml", ".json", ".woff", ".woff2")
+TRACKING_PARAMS = {"fbclid", "gclid", "igshid", "si", "ref", "ref_src", "ref_url", "s", "t", "feature"}
+
+_SLASHES = re.compile(r"/{2,}")
+_HANDLE = re.compile(r"^@?([A-Za-z0-9][A-Za-z0-9._-]{1,38})$")
+
+
+class BloomFilter:
+    """Set membership in fixed memory; may answer yes for an item never added (rate ~error_rate)"""
+
+    def __init__(self, capacity=100_000, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        """Add item; returns True if it may have been added before"""
+        present = True
+        for position in self._positions(item):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                present = False
+                self.bits[byte] |= 1 << bit
+        return present
+
+    def __contains__(self, item):
+        return all(self.bits[p // 8] & (1 << (p % 8)) for p in self._positions(item))
+
+
+def normalize_host(host):
+    host = (host or "").lower().rstrip(".")
+    if host.startswith("www."):
+        host = host[4:]
+    return HOST_ALIASES.get(host, host)
+
+
+def normalize_url(url):
+    """Canonical form of a profile URL (https, bare host, no tracking, no trailing slash), or None"""
+    try:
+        parts = urlsplit(url.strip())
+        host = normalize_host(parts.hostname)
+    except (AttributeError, ValueError):
+        return None
+    if parts.scheme not in ("http", "https") or not host:
+        return None
+    path = _SLASHES.sub("/", parts.path).rstrip("/")
+    if host in SOCIAL_HOSTS:
+        #Handles are case-insensitive on these sites
+        path = path.lower()
+    query = urlencode(sorted((key, value) for key, value in parse_qsl(parts.query)
+                             if key.lower() not in TRACKING_PARAMS and not key.lower().startswith("utm_")))
+    return urlunsplit(("https", host, path, query, ""))
+
+
+def is_profile_candidate(url, source_host=None):
+    """Whether a normalised URL plausibly points at a profile on another site"""
+    parts = urlsplit(url)
+    host = parts.hostname or ""
+    if host == source_host or host in SKIP_HOSTS or any(host.endswith("." + skip) for skip in SKIP_HOSTS):
+        return False
+    segments = [segment for segment in parts.path.split("/") if segment]
+    if not 1 <= len(segments) <= 3:
+        return False
+    if segments[0].lower() in SKIP_SEGMENTS or parts.path.lower().endswith(ASSET_EXTENSIONS):
+        return False
+    return True
+
+
+def handle_from_url(url):
+    """The account handle in a social profile URL, e.g. https://github.com/alice -> alice"""
+    parts = urlsplit(url)
+    if parts.hostname not in SOCIAL_HOSTS:
+        return None
+    segments = [segment for segment in parts.path.split("/") if segment]
+    if segments and segments[0] in ("in", "u", "user", "users", "profile") and len(segments) > 1:
+        segments = segments[1:]
+    if not segments or segments[0].lower() in SKIP_SEGMENTS:
+        return None
+    match = _HANDLE.match(segments[0])
+    return match.group(1).lower() if match else None
+
+
+class PivotCrawler:
+    """
+    Budgeted frontier of profile URLs found on scraped profiles.
+
+        crawler = PivotCrawler(username, seeds=profile_links)
+        data = await crawler.expand(pipeline, data)
+    """
+
+    def __init__(self, username, seeds=(), max_depth=MAX_DEPTH, max_pages=MAX_PAGES, per_host=PER_HOST,
+                 max_frontier=MAX_FRONTIER, sweep=False, max_handles=MAX_HANDLES,
+                 session=None, limiter=None, sites=None, snapshot=None):
+        self.username = username.lower()
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.per_host = per_host
+        self.max_frontier = max_frontier
+        self.sweep = sweep
+        self.max_handles = max_handles
+        #Passed to the sweep, e.g. the batch runner's shared session and limits
+        self.sweep_options = {"session": session, "limiter": limiter, "sites": sites}
+        #url -> stored profile of a delta re-investigation (see delta.py)
+        self.snapshot = snapshot
+
+        self.offered = BloomFilter()
+        self.queued = set()
+        self.frontier = []
+        self._seq = 0
+        self.depth_of = {}
+        self.host_pages = Counter()
+        self.handles = set()
+        self.stats = Counter()
+
+        for url in seeds:
+            url = normalize_url(url)
+            if url:
+                self.offered.add(url)
+                self.queued.add(url)
+                self.depth_of[url] = 0
+                self.handles.add(handle_from_url(url))
+        self.handles.add(self.username)
+
+    def offer(self, url, depth, tier):
+        """Queue url at depth unless it was seen before, is too deep or isn't a profile"""
+        self.stats["offered"] += 1
+        if depth > self.max_depth:
+            return False
+        if self.offered.add(url) or url in self.queued:
+            self.stats["duplicate"] += 1
+            return False
+        self.queued.add(url)
+        self.depth_of[url] = depth
+        self._seq += 1
+        entry = (depth, tier, self._seq, url)
+        heapq.heappush(self.frontier, entry)
+        if len(self.frontier) > self.max_frontier:
+            #Drop the worst entry; one O(max_frontier) pass, only once the frontier is full
+            worst = max(self.frontier)
+            self.frontier.remove(worst)
+            heapq.heapify(self.frontier)
+            self.stats["frontier_dropped"] += 1
+            return worst is not entry
+        return True
+
+    def offer_profile(self, profile):
+        """Queue the profile URLs linked from a scraped profile; returns new handles seen on it"""
+        source = profile.get("url")
+        depth = self.depth_of.get(normalize_url(source) if source else None, 0) + 1
+        source_host = urlsplit(normalize_url(source) or "").hostname
+        links = [(link, TIER_SOCIAL) for link in profile.get("social_links") or []]
+        links += [(link, TIER_LINK) for link in profile.get("links") or []]
+        new_handles = []
+        for link, tier in links[:MAX_LINKS_PER_PROFILE]:
+            url = normalize_url(link) if isinstance(link, str) else None
+            if url is None or not is_profile_candidate(url, source_host):
+                continue
+            host = urlsplit(url).hostname
+            self.offer(url, depth, TIER_SOCIAL if host in SOCIAL_HOSTS else tier)
+            handle = handle_from_url(url)
+            if handle and handle not in self.handles:
+                self.handles.add(handle)
+                new_handles.append((handle, depth))
+        handle = (profile.get("handle") or "").lstrip("@").lower()
+        if _HANDLE.match(handle) and handle not in self.handles:
+            self.handles.add(handle)
+            new_handles.append((handle, depth))
+        return new_handles
+
+    def next_round(self):
+        """Pop the shallowest depth's best URLs, within the total and per-host budgets"""
+        remaining = self.max_pages - self.stats["scheduled"]
+        batch = []
+        depth = self.frontier[0][0] if self.frontier else None
+        while self.frontier and len(batch) < remaining and self.frontier[0][0] == depth:
+            entry = heapq.heappop(self.frontier)
+            host = urlsplit(entry[3]).hostname
+            if self.host_pages[host] >= self.per_host:
+                self.stats["over_host_budget"] += 1
+                continue
+            self.host_pages[host] += 1
+            batch.append(entry[3])
+        self.stats["scheduled"] += len(batch)
+        return batch
+
+    async def _sweep(self, handles):
+        """Offer the accounts the username sweep finds for new handles"""
+        from .discovery import sweep_profile_links
+        for handle, depth in handles[:max(0, self.max_handles - self.stats["handles_swept"])]:
+            self.stats["handles_swept"] += 1
+            options = {key: value for key, value in self.sweep_options.items() if value is not None}
+            try:
+                links = await sweep_profile_links(handle, **options)
+            except Exception as e:
+                logger.warning("Pivot sweep for %s failed: %s", handle, e)
+                continue
+            for link in links:
+                url = normalize_url(link)
+                if url:
+                    self.offer(url, depth, TIER_SWEEP)
+
+    async def expand(self, pipeline, data):
+        """Scrape the frontier through pipeline, a round per depth, and return all profile dicts"""
+        handles = []
+        for profile in data:
+            handles += self.offer_profile(profile)
+        while True:
+            if self.sweep and handles:
+                await self._sweep(handles)
+            batch = self.next_round()
+            if not batch:
+                break
+            logger.info("Pivot round at depth %d: %d URLs, %d left in the frontier",
+                        self.depth_of[batch[0]], len(batch), len(self.frontier))
+            start = len(pipeline.data)
+            if self.snapshot:
+                from .delta import plan_delta
+                plan = plan_delta(batch, self.snapshot)
+                await pipeline.run(plan.scrape, reuse=plan.reuse, fallback=plan.fallback)
+            else:
+                await pipeline.run(batch)
+            self.stats["scraped"] += len(pipeline.data) - start
+            handles = []
+            for profile in pipeline.data[start:]:
+                handles += self.offer_profile(profile)
+        logger.info("Pivot crawl for %s: %s", self.username, dict(self.stats))
+        return pipeline.data
+
+    def report(self):
+        return {"scraped": self.stats["scraped"], "scheduled": self.stats["scheduled"],
+                "offered": self.stats["offered"], "duplicates": self.stats["duplicate"],
+                "over_host_budget": self.stats["over_host_budget"], "handles_swept": self.stats["handles_swept"],
+                "frontier_left": len(self.frontier), "frontier_dropped": self.stats["frontier_dropped"]}
@@ -0,0 +1,322 @@
+"""
+Columnar storage for large numbers of profiles.
+
+    python -m processing.profile_batch export sweep.arrow              # every stored profile
+    python -m processing.profile_batch export alice.parquet --username alice
+    python -m processing.profile_batch info sweep.arrow
+
+A ProfileBatch holds profiles as Arrow columns instead of one object per profile. platform,
+domain and scrape_status are interned (dictionary encoded, each distinct string stored once),
+followers and following are int64 columns, scraped_at is a timestamp, links and social_links
+are list columns, and posts and metadata are JSON strings.
+
+.arrow files (Arrow IPC, uncompressed) are memory-mapped when read: opening a sweep is nearly
+free and only the columns an analysis touches are paged in. .parquet files are smaller (zstd)
+and read only the requested columns. JSON stays available through to_json.
+"""
+import argparse
+import datetime
+import json
+import os
+from dataclasses import fields
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from .blob_store import decode_blob
+from .db import get_sync_db
+from .scraper import Profile
+
+DB_PATH = r"data/osint.db"
+
+#Profiles per record batch; bounds memory while writing
+CHUNK_SIZE = 10_000
+COLUMNAR_EXTENSIONS = (".arrow", ".parquet")
+
+INTERNED_FIELDS = ("platform", "domain", "scrape_status")
+INTEGER_FIELDS = ("followers", "following")
+LIST_FIELDS = ("links", "social_links")
+JSON_FIELDS = ("posts", "metadata")
+TIMESTAMP_FIELDS = ("scraped_at",)
+PROFILE_FIELDS = tuple(f.name for f in fields(Profile))
+
+#Extra interned columns written by export_store
+STORE_COLUMNS = ("subject", "file_path")
+
+EXPORT_SQL = """
+SELECT p.username, p.file_path, b.dict_id, b.data, p.scraped_at
+  FROM profiles p JOIN profile_blobs b ON b.hash = p.blob_hash
+ {where} ORDER BY p.id
+"""
+
+_INTERNED = pa.dictionary(pa.int32(), pa.string())
+
+
+def _field_type(name):
+    if name in INTERNED_FIELDS:
+        return _INTERNED
+    if name in INTEGER_FIELDS:
+        return pa.int64()
+    if name in LIST_FIELDS:
+        return pa.list_(pa.string())
+    if name in TIMESTAMP_FIELDS:
+        return pa.timestamp("us")
+    return pa.string()
+
+
+def profile_schema(extra=()):
+    return pa.schema([pa.field(name, _field_type(name)) for name in PROFILE_FIELDS]
+                     + [pa.field(name, _INTERNED) for name in extra])
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value):
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class _Interner:
+    """String -> code for one dictionary column; the dictionary only grows, so later batches are deltas"""
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def encode(self, values):
+        codes = []
+        for value in values:
+            if value is None:
+                codes.append(None)
+                continue
+            code = self.codes.get(value)
+            if code is None:
+                code = self.codes[value] = len(self.values)
+                self.values.append(value)
+            codes.append(code)
+        return pa.DictionaryArray.from_arrays(pa.array(codes, pa.int32()), pa.array(self.values, pa.string()))
+
+
+class _Encoder:
+    """Turns lists of profiles into record batches of one schema, interning as it goes"""
+
+    def __init__(self, extra=()):
+        self.schema = profile_schema(extra)
+        self.interners = {name: _Interner() for name in INTERNED_FIELDS + tuple(extra)}
+
+    def _column(self, name, values):
+        if name in self.interners:
+            return self.interners[name].encode(values)
+        if name in INTEGER_FIELDS:
+            return pa.array([_to_int(value) for value in values], pa.int64())
+        if name in TIMESTAMP_FIELDS:
+            return pa.array([_parse_time(value) for value in values], pa.timestamp("us"))
+        if name in JSON_FIELDS:
+            return pa.array([json.dumps(value, default=str, ensure_ascii=False) if value else None
+                             for value in values], pa.string())
+        if name in LIST_FIELDS:
+            return pa.array([[str(item) for item in value] if value else None for value in values],
+                            pa.list_(pa.string()))
+        return pa.array([None if value is None else str(value) for value in values], pa.string())
+
+    def encode(self, profiles):
+        rows = [profile if isinstance(profile, dict) else {name: getattr(profile, name) for name in PROFILE_FIELDS}
+                for profile in profiles]
+        return pa.record_batch([self._column(name, [row.get(name) for row in rows]) for name in self.schema.names],
+                               schema=self.schema)
+
+
+class ProfileWriter:
+    """Write profiles (Profile objects or dicts) to an .arrow or .parquet file a chunk at a time"""
+
+    def __init__(self, path, extra=(), chunk_size=CHUNK_SIZE):
+        if not path.endswith(COLUMNAR_EXTENSIONS):
+            raise ValueError(f"{path}: expected one of {', '.join(COLUMNAR_EXTENSIONS)}")
+        self.path = path
+        self.chunk_size = chunk_size
+        self.encoder = _Encoder(extra)
+        self.rows = 0
+        self._pending = []
+        self._tmp = f"{path}.tmp"
+        if path.endswith(".parquet"):
+            self._writer = pq.ParquetWriter(self._tmp, self.encoder.schema, compression="zstd")
+        else:
+            self._writer = ipc.new_file(self._tmp, self.encoder.schema,
+                                        options=ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+
+    def write(self, profiles):
+        for profile in profiles:
+            self._pending.append(profile)
+            if len(self._pending) >= self.chunk_size:
+                self._flush()
+
+    def write_table(self, table):
+        """Write an Arrow table as is; columns it lacks are written as nulls"""
+        self._flush()
+        schema = self.encoder.schema
+        columns = [table.column(name) if name in table.column_names else pa.nulls(table.num_rows, field.type)
+                   for name, field in zip(schema.names, schema)]
+        #One shared dictionary per column, so the IPC file needs no dictionary replacement
+        table = pa.table(columns, schema=schema).unify_dictionaries()
+        for batch in table.to_batches(max_chunksize=self.chunk_size):
+            self._writer.write_batch(batch)
+        self.rows += table.num_rows
+
+    def _flush(self):
+        if self._pending:
+            self._writer.write_batch(self.encoder.encode(self._pending))
+            self.rows += len(self._pending)
+            self._pending = []
+
+    def close(self):
+        """Finish the file; it is written under a temp name and moved into place"""
+        self._flush()
+        self._writer.close()
+        os.replace(self._tmp, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._writer.close()
+            os.remove(self._tmp)
+
+
+def _profile_from_row(row):
+    """Profile from a to_pylist() row, restoring the defaults empty columns stand for"""
+    values = {name: row.get(name) for name in PROFILE_FIELDS}
+    for name in LIST_FIELDS:
+        values[name] = values[name] or []
+    for name in JSON_FIELDS:
+        values[name] = json.loads(values[name]) if values[name] else ([] if name == "posts" else {})
+    for name in TIMESTAMP_FIELDS:
+        if values[name] is not None:
+            values[name] = values[name].isoformat()
+    return Profile(**values)
+
+
+class ProfileBatch:
+    """
+    Profiles as an Arrow table.
+
+        batch = ProfileBatch.read("sweep.arrow")            # memory-mapped
+        batch.column("followers")                           # one column, no Profile objects
+        for profile in batch: ...                           # Profiles, a record batch at a time
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    @classmethod
+    def from_profiles(cls, profiles, chunk_size=CHUNK_SIZE):
+        """Batch built in memory from Profile objects or profile dicts"""
+        profiles = list(profiles)
+        encoder = _Encoder()
+        batches = [encoder.encode(profiles[start:start + chunk_size])
+                   for start in range(0, len(profiles), chunk_size)]
+        return cls(pa.Table.from_batches(batches, schema=encoder.schema))
+
+    @classmethod
+    def read(cls, path, columns=None):
+        """Open an .arrow (memory-mapped) or .parquet file; columns limits what is loaded"""
+        if path.endswith(".parquet"):
+            return cls(pq.read_table(path, columns=columns, memory_map=True))
+        table = ipc.open_file(pa.memory_map(path, "r")).read_all()
+        return cls(table.select(columns) if columns else table)
+
+    def write(self, path):
+        #The columns are already encoded; re-encoding would null scraped_at and double-encode JSON
+        with ProfileWriter(path, extra=[name for name in self.table.column_names
+                                        if name not in PROFILE_FIELDS]) as writer:
+            writer.write_table(self.table)
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def __iter__(self):
+        for batch in self.table.to_batches():
+            for row in batch.to_pylist():
+                yield _profile_from_row(row)
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+    def column(self, name):
+        return self.table.column(name)
+
+    def to_dicts(self):
+        """Profile dicts, as the pipeline and JSON artifacts use them"""
+        return [{name: getattr(profile, name) for name in PROFILE_FIELDS} for profile in self]
+
+    def to_json(self, path, indent=None):
+        data = self.to_dicts()
+        tmp_name = f"{path}.tmp"
+        with open(tmp_name, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=indent, separators=None if indent else (",", ":"),
+                      default=str, ensure_ascii=False)
+        os.replace(tmp_name, path)
+        return data
+
+
+def export_store(path, username=None, db_path=DB_PATH, chunk_size=CHUNK_SIZE):
+    """Write every stored profile (or one subject's) to a columnar file; returns the row count"""
+    conn = get_sync_db(db_path)
+    sql = EXPORT_SQL.format(where="WHERE p.username = ?" if username else "")
+    cursor = conn.execute(sql, (username,) if username else ())
+    with ProfileWriter(path, extra=STORE_COLUMNS, chunk_size=chunk_size) as writer:
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            profiles = []
+            for subject, file_path, dict_id, data, scraped_at in rows:
+                profile = decode_blob(conn, dict_id, data, db_path)
+                profile.update(scraped_at=scraped_at, subject=subject, file_path=file_path)
+                profiles.append(profile)
+            writer.write(profiles)
+    return writer.rows
+
+
+def _print_info(path):
+    batch = ProfileBatch.read(path)
+    print(f"{path}: {len(batch)} profiles, {os.path.getsize(path)} bytes on disk, {batch.nbytes} in memory")
+    for name in INTERNED_FIELDS:
+        counts = batch.column(name).value_counts().to_pylist()
+        top = sorted(counts, key=lambda item: -item["counts"])[:5]
+        print(f"  {name}: " + ", ".join(f"{item['values']} ({item['counts']})" for item in top))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar profile files for large sweeps")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="write stored profiles to an .arrow or .parquet file")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--username", help="only this subject's profiles")
+    info_parser = commands.add_parser("info", help="summarise a columnar profile file")
+    info_parser.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        count = export_store(args.path, username=args.username, db_path=args.db)
+        print(f"Wrote {count} profiles to {args.path} ({os.path.getsize(args.path)} bytes)")
+    else:
+        _print_info(args.path)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,12 @@
 from typing import Dict
 import os, json
 import base64
-from dotenv import load_dotenv
-import numpy as np
-from sklearn.cluster import DBSCAN
 from collections import defaultdict
-from numpy.linalg import norm
 
-import cohere
-import requests
+from .tracing import traced
+
+#numpy, sklearn, cohere and requests are imported where they are used: together they take
+#seconds to load, and most processes that import this module only need a couple of them
 def image_to_base64_data_url(image_path: str):
     _, file_extension = os.path.splitext(image_path)
     file_type = file_extension[1:] #Remove the .
@@ -19,6 +17,7 @@ def image_to_base64_data_url(image_path: str):
 
 
 def download_image(image_url: str, save_path: str):
+    import requests
     response = requests.get(image_url, stream=True)
     try:
         response.raise_for_status()
@@ -31,65 +30,102 @@ def download_image(image_url: str, save_path: str):
 
 
 
-def calculate_cohere_embeddings(file_path: str):
-    load_dotenv()
-    api_key = os.getenv("COHERE_API_KEY")
+EMBED_MODEL = "embed-english-v3.0"
+#Cohere accepts up to 96 texts per embed call
+EMBED_BATCH_SIZE = 96
+
+
+_cohere_client = None
+
+
+def get_cohere_client():
+    """One client per process, so its connection pool is reused (see also warmup.py)"""
+    global _cohere_client
+    if _cohere_client is None:
+        import cohere
+        from dotenv import load_dotenv
+        load_dotenv()
+        api_key = os.getenv("COHERE_API_KEY")
+        _cohere_client = cohere.ClientV2(api_key = api_key)
+    return _cohere_client
+
+
+def profile_metadata_text(profile: dict):
+    """Text that represents a scraped profile for the metadata embedding"""
+    metadata = ""
+    for dataType in ["page_title","bio", "page_text"]:
+        if dataType == "links":
+            for link in profile[dataType]:
+                metadata += link
+        elif profile[dataType]:
+            #Not null
+            metadata += profile[dataType]
+    return metadata
+
+
+@traced("embed_texts", attributes=lambda co, texts: {"batch_size": len(texts)})
+def embed_texts(co, texts):
+    """Embed a batch of metadata texts in a single call"""
+    doc_emb = co.embed(
+        texts=texts,
+        model=EMBED_MODEL,
+        input_type="search_document",
+        embedding_types=["float"]
+    )
+    #ClientV2 returns embeddings grouped by type
+    return doc_emb.embeddings.float_
+
 
-    co = cohere.ClientV2(api_key = api_key)
+@traced("calculate_cohere_embeddings",
+        attributes=lambda profiles: {"batch_size": len(profiles)} if not isinstance(profiles, str) else {"file": profiles})
+def calculate_cohere_embeddings(profiles):
+    #profiles is the in-memory list of scraped profile dicts, or the path of the exported JSON file
+    co = get_cohere_client()
     pfp_embeds = {}
     metadata_embeds = {}
 
-    with open(file_path, 'r', encoding="utf-8") as f:
-        data = json.load(f)
-        for i in range(len(data)):
-            if data[i]["scrape_status"] == "ok": #Has to be okay, not auth blocked
-                # pfp_image_url = data[i]["avatar_url"]
-                # if pfp_image_url:
-
-                    #Not null
-                    # temp_image_path = r"HTN-2025\TMP\image" + pfp_image_url
-                    # test = download_image(pfp_image_url, r"C:\Users\Tristan\Downloads\HTN2025\TMP\image.png")
-                    # if not test:
-                    #     continue
-                    # base64_url = image_to_base64_data_url(r"C:\Users\Tristan\Downloads\HTN2025\TMP\image.png")
-                    # image_input = {
-                    #     "content": [
-                    #         {"type": "image_url", "image_url": {"url": base64_url}}
-                    #     ]
-
-                    # }
-                    # image_embed = co.embed(
-                    #     model="embed-v4.0",
-                    #     output_dimension=1024,
-                    #     inputs=[image_input],
-                    #     input_type="search_document",
-                    #     embedding_types=["float"],
-                    # )
-                    # pfp_embeds[i] = image_embed.embeddings.float[0]
-
-                metadata = ""
-                for dataType in ["page_title","bio", "page_text"]:
-                    if dataType == "links":
-                        for link in data[i][dataType]:
-                            metadata += link
-                    elif data[i][dataType]:
-                        #Not null
-                        metadata += data[i][dataType]
-
-                doc_emb =  co.embed(
-                    texts=[metadata],
-                    model="embed-english-v3.0",
-                    input_type="search_document"
-                )
-                metadata_embeds[i] = doc_emb.embeddings[0]
-        # print(pfp_embeds.keys())
-
-        # for key in pfp_embeds.keys():
-            # print(pfp_embeds[key])
-
-        # for key in metadata_embeds.keys():
-            # print(len(metadata_embeds[key]))
-            # break
+    if isinstance(profiles, str):
+        with open(profiles, 'r', encoding="utf-8") as f:
+            data = json.load(f)
+    else:
+        data = profiles
+
+    for i in range(len(data)):
+        if data[i]["scrape_status"] == "ok": #Has to be okay, not auth blocked
+            # pfp_image_url = data[i]["avatar_url"]
+            # if pfp_image_url:
+
+                #Not null
+                # temp_image_path = r"HTN-2025\TMP\image" + pfp_image_url
+                # test = download_image(pfp_image_url, r"C:\Users\Tristan\Downloads\HTN2025\TMP\image.png")
+                # if not test:
+                #     continue
+                # base64_url = image_to_base64_data_url(r"C:\Users\Tristan\Downloads\HTN2025\TMP\image.png")
+                # image_input = {
+                #     "content": [
+                #         {"type": "image_url", "image_url": {"url": base64_url}}
+                #     ]
+
+                # }
+                # image_embed = co.embed(
+                #     model="embed-v4.0",
+                #     output_dimension=1024,
+                #     inputs=[image_input],
+                #     input_type="search_document",
+                #     embedding_types=["float"],
+                # )
+                # pfp_embeds[i] = image_embed.embeddings.float[0]
+
+            metadata = profile_metadata_text(data[i])
+            metadata_embeds[i] = embed_texts(co, [metadata])[0]
+    # print(pfp_embeds.keys())
+
+    # for key in pfp_embeds.keys():
+        # print(pfp_embeds[key])
+
+    # for key in metadata_embeds.keys():
+        # print(len(metadata_embeds[key]))
+        # break
 
     return pfp_embeds, metadata_embeds
 
@@ -97,6 +133,8 @@ def calculate_cohere_embeddings(file_path: str):
 
 
 def cosine_similarity_numpy(vec1, vec2):
+    import numpy as np
+    from numpy.linalg import norm
     vec1_np = np.array(vec1)
     vec2_np = np.array(vec2)
     return np.dot(vec1_np, vec2_np) / (norm(vec1_np) * norm(vec2_np))
@@ -105,58 +143,37 @@ def cosine_similarity_numpy(vec1, vec2):
 # pfp, meta = calculate_cohere_embeddings("generic_scrape_results.json")
 # print("?")
 
+@traced("cluster_profiles_from_modalities",
+        attributes=lambda pfp, meta, *args, **kwargs: {"n": len(set(pfp) | set(meta))})
 def cluster_profiles_from_modalities(pfp: Dict[int, list],
                                      meta: Dict[int, list],
                                      w_meta: float = 0.7,
                                      w_pfp: float  = 0.3,
                                      dbscan_eps: float = 0.5,
                                      dbscan_min_samples: int = 1):
-    #index mapping
-    profile_ids = sorted(set(list(meta.keys()) + list(pfp.keys())))
-    id_to_idx = {pid: idx for idx, pid in enumerate(profile_ids)}
-    n = len(profile_ids)
-
-    #compute pairwise similarities per-modality (symmetric)
-    sim_meta = np.zeros((n, n))
-    sim_meta_mask = np.zeros((n, n), dtype=float) #1 if available
-    sim_pfp = np.zeros((n, n))
-    sim_pfp_mask = np.zeros((n, n), dtype=float)
-
-    for i, pid_i in enumerate(profile_ids):
-        for j in range(i+1, n):
-            pid_j = profile_ids[j]
-            #meta
-            if pid_i in meta and pid_j in meta:
-                s = cosine_similarity_numpy(meta[pid_i], meta[pid_j])
-                sim_meta[i, j] = sim_meta[j, i] = s
-                sim_meta_mask[i, j] = sim_meta_mask[j, i] = 1.0
-            #pfp
-            if pid_i in pfp and pid_j in pfp:
-                s = cosine_similarity_numpy(pfp[pid_i], pfp[pid_j])
-                sim_pfp[i, j] = sim_pfp[j, i] = s
-                sim_pfp_mask[i, j] = sim_pfp_mask[j, i] = 1.0
-
-    #Combine similarities with weights, ignoring missing modalities
-    combined_sim = np.zeros((n, n))
-    for i in range(n):
-        for j in range(n):
-            num = w_meta * sim_meta[i, j] * sim_meta_mask[i, j] + w_pfp * sim_pfp[i, j] * sim_pfp_mask[i, j]
-            denom = w_meta * sim_meta_mask[i, j] + w_pfp * sim_pfp_mask[i, j]
-            if denom == 0:
-                combined_sim[i, j] = 0.0   # no info between these two profiles
-            else:
-                combined_sim[i, j] = num / denom
-
-    #convert similarity -> distance (DBSCAN with precomputed distances)
-    dist = 1.0 - combined_sim
-    #Ensure diagonal is zero
-    np.fill_diagonal(dist, 0.0)
+    """
+    Fuse metadata and profile picture similarities (ignoring a modality a pair doesn't share)
+    and cluster the profiles with DBSCAN on the fused distances.
+    Returns (profile id -> label, label -> profile ids, fused similarities, distances).
+    See cluster_structure.py to re-cluster at other eps or weights without recomputing.
+    """
+    from .cluster_structure import ClusterStructure
+
+    structure = ClusterStructure.from_embeddings(pfp, meta)
+    combined_sim = structure.similarities(w_meta, w_pfp)
+    dist = structure.distances(w_meta, w_pfp)
+    if dbscan_min_samples == 1:
+        #Same labels as DBSCAN, from the spanning tree (see cluster_structure.py)
+        pid_to_label, clusters = structure.cluster(dbscan_eps, w_meta, w_pfp)
+        return pid_to_label, clusters, combined_sim, dist
+
+    from sklearn.cluster import DBSCAN
     #cluster with DBSCAN on the precomputed distance matrix
     clustering = DBSCAN(metric="precomputed", eps=dbscan_eps, min_samples=dbscan_min_samples)
     labels = clustering.fit_predict(dist)
 
     #return mapping profile_id -> label and grouped clusters
-    pid_to_label = {pid: int(labels[idx]) for pid, idx in id_to_idx.items()}
+    pid_to_label = {pid: int(label) for pid, label in zip(structure.profile_ids, labels)}
     clusters = defaultdict(list)
     for pid, lbl in pid_to_label.items():
         clusters[lbl].append(pid)
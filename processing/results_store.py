@@ -0,0 +1,172 @@
+"""
+Finished investigations, stored for the Results page.
+
+processing_results holds one summary row per investigation with its counts precomputed, so
+listing never touches cluster data. Clusters and their member profiles live in their own
+tables and are only read when a result is opened. Listing uses keyset pagination on
+(created_at, id), which costs the same on page 1 and page 4000.
+"""
+import datetime
+import json
+
+from .db import get_db, get_sync_db
+
+DB_PATH = r"data/osint.db"
+
+PAGE_SIZE = 25
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS processing_results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    file_path TEXT,
+    status TEXT NOT NULL, -- success, empty
+    total_profiles INTEGER NOT NULL DEFAULT 0,
+    cluster_count INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS result_clusters (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    result_id INTEGER NOT NULL REFERENCES processing_results(id) ON DELETE CASCADE,
+    cluster_key TEXT NOT NULL,
+    profile_count INTEGER NOT NULL,
+    platforms TEXT, -- JSON list, in member order
+    summary TEXT
+);
+CREATE TABLE IF NOT EXISTS result_cluster_members (
+    cluster_id INTEGER NOT NULL REFERENCES result_clusters(id) ON DELETE CASCADE,
+    profile_index INTEGER NOT NULL,
+    platform TEXT,
+    url TEXT,
+    PRIMARY KEY (cluster_id, profile_index)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_results_created ON processing_results(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_results_username ON processing_results(username, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_results_file ON processing_results(file_path);
+CREATE INDEX IF NOT EXISTS idx_result_clusters_result ON result_clusters(result_id);
+"""
+
+RESULT_COLUMNS = "id, username, file_path, status, total_profiles, cluster_count, created_at"
+
+INSERT_RESULT_SQL = """
+INSERT INTO processing_results (username, file_path, status, total_profiles, cluster_count, created_at)
+VALUES (?, ?, ?, ?, ?, ?)
+"""
+INSERT_CLUSTER_SQL = """
+INSERT INTO result_clusters (result_id, cluster_key, profile_count, platforms, summary) VALUES (?, ?, ?, ?, ?)
+"""
+INSERT_MEMBER_SQL = """
+INSERT INTO result_cluster_members (cluster_id, profile_index, platform, url) VALUES (?, ?, ?, ?)
+"""
+
+#Newest first; the row value comparison lets the index seek straight to the page
+LIST_RESULTS_SQL = f"""
+SELECT {RESULT_COLUMNS} FROM processing_results
+ WHERE (created_at, id) < (?, ?)
+ ORDER BY created_at DESC, id DESC LIMIT ?
+"""
+LIST_USER_RESULTS_SQL = f"""
+SELECT {RESULT_COLUMNS} FROM processing_results
+ WHERE username = ? AND (created_at, id) < (?, ?)
+ ORDER BY created_at DESC, id DESC LIMIT ?
+"""
+GET_RESULT_SQL = f"SELECT {RESULT_COLUMNS} FROM processing_results WHERE id = ?"
+RESULT_CLUSTERS_SQL = """
+SELECT id, cluster_key, profile_count, platforms, summary FROM result_clusters WHERE result_id = ? ORDER BY id
+"""
+CLUSTER_MEMBERS_SQL = """
+SELECT profile_index, platform, url FROM result_cluster_members WHERE cluster_id = ? ORDER BY profile_index
+"""
+
+#Sorts after every ISO timestamp, so the first page needs no special case
+_FIRST_PAGE = ("\uffff", 0)
+
+
+def _row_to_result(row):
+    return {
+        "id": row[0],
+        "username": row[1],
+        "file_path": row[2],
+        "status": row[3],
+        "total_profiles": row[4],
+        "cluster_count": row[5],
+        "created_at": row[6],
+    }
+
+
+async def init_results_db(db_path=DB_PATH):
+    """Create the results tables if they don't exist."""
+    db = await get_db(db_path)
+    await db.executescript(SCHEMA)
+
+
+def init_results_db_sync(db_path=DB_PATH):
+    """Same as init_results_db, for the Streamlit pages"""
+    get_sync_db(db_path).executescript(SCHEMA)
+
+
+async def save_result(username, file_path, data, clusters, summaries, db_path=DB_PATH):
+    """
+    Store a finished investigation in one transaction and return its result id.
+    data is the list of scraped profile dicts, clusters maps cluster -> profile indices into data
+    and summaries maps cluster -> summary text.
+    """
+    created_at = datetime.datetime.utcnow().isoformat()
+    status = "success" if data else "empty"
+    db = await get_db(db_path)
+    async with db.transaction() as conn:
+        cursor = await conn.execute(INSERT_RESULT_SQL, (username, file_path, status, len(data),
+                                                        len(clusters), created_at))
+        result_id = cursor.lastrowid
+        for key, indices in clusters.items():
+            platforms = [data[i].get("platform") for i in indices]
+            cursor = await conn.execute(INSERT_CLUSTER_SQL, (result_id, str(key), len(indices),
+                                                             json.dumps(platforms), summaries.get(key)))
+            cluster_id = cursor.lastrowid
+            await conn.executemany(INSERT_MEMBER_SQL, [
+                (cluster_id, int(i), data[i].get("platform"), data[i].get("url")) for i in indices
+            ])
+    return result_id
+
+
+def list_results(cursor=None, username=None, limit=PAGE_SIZE, db_path=DB_PATH):
+    """
+    One page of results, newest first, and the cursor for the next page (None on the last page).
+    cursor is the (created_at, id) of the last row of the previous page.
+    """
+    after = cursor or _FIRST_PAGE
+    conn = get_sync_db(db_path)
+    if username:
+        rows = conn.execute(LIST_USER_RESULTS_SQL, (username,) + tuple(after) + (limit + 1,)).fetchall()
+    else:
+        rows = conn.execute(LIST_RESULTS_SQL, tuple(after) + (limit + 1,)).fetchall()
+    results = [_row_to_result(row) for row in rows[:limit]]
+    next_cursor = (results[-1]["created_at"], results[-1]["id"]) if len(rows) > limit else None
+    return results, next_cursor
+
+
+def results_version(db_path=DB_PATH):
+    """Changes whenever an investigation is saved; cheap enough to read on every page load"""
+    return get_sync_db(db_path).execute("SELECT coalesce(max(id), 0) FROM processing_results").fetchone()[0]
+
+
+def get_result(result_id, db_path=DB_PATH):
+    row = get_sync_db(db_path).execute(GET_RESULT_SQL, (result_id,)).fetchone()
+    return _row_to_result(row) if row else None
+
+
+def get_result_clusters(result_id, db_path=DB_PATH):
+    """Clusters of one result, without their members"""
+    rows = get_sync_db(db_path).execute(RESULT_CLUSTERS_SQL, (result_id,)).fetchall()
+    return [{
+        "id": row[0],
+        "cluster_key": row[1],
+        "profile_count": row[2],
+        "platforms": json.loads(row[3]) if row[3] else [],
+        "summary": row[4],
+    } for row in rows]
+
+
+def get_cluster_members(cluster_id, db_path=DB_PATH):
+    rows = get_sync_db(db_path).execute(CLUSTER_MEMBERS_SQL, (cluster_id,)).fetchall()
+    return [{"profile_index": row[0], "platform": row[1], "url": row[2]} for row in rows]
@@ -1,15 +1,20 @@
 
 import asyncio
 import json
+import os
 import re
+import time
 from dataclasses import dataclass, asdict, field
 from typing import Dict, List, Optional, Any
 from urllib.parse import urljoin, urlparse
-from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
-import requests
+from .tracing import traced, url_attributes
 
+#playwright and requests are imported where they are used, so importing this module
+#(e.g. for Profile) stays cheap
 
-@dataclass
+
+#Slotted: no per-instance __dict__, which adds up over large sweeps (see profile_batch.py for bulk storage)
+@dataclass(slots=True)
 class Profile:
     platform: str
     url: str
@@ -40,20 +45,20 @@ class Profile:
 
 
 class UniversalScraper:
-    def __init__(self, use_playwright: bool = True, headless: bool = True):
+    def __init__(self, use_playwright: bool = True, headless: bool = True, limiter=None):
         self.use_playwright = use_playwright
         self.headless = headless
+        #Optional HostLimiter shared with other scrapers/sweeps to cap global and per-host load
+        self.limiter = limiter
+        #host -> earliest time (monotonic) its next request may start, shared by every stream
+        self._host_ready = {}
+
+        #Shared browser, only set between start() and close()
+        self._playwright = None
+        self._browser = None
 
-        #Requests session for fallback
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        })
+        #Requests session for fallback, created on first use
+        self._session = None
 
         #Generic selectors to try on any site
         self.generic_selectors = {
@@ -174,73 +179,132 @@ class UniversalScraper:
 
         return url
 
+    @property
+    def session(self):
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+            self._session.headers.update({
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+                'Accept-Language': 'en-US,en;q=0.5',
+                'Accept-Encoding': 'gzip, deflate',
+                'Connection': 'keep-alive',
+                'Upgrade-Insecure-Requests': '1',
+            })
+        return self._session
+
+    @property
+    def started(self):
+        return self._browser is not None
+
+    async def start(self):
+        """Launch one browser that every scrape reuses instead of launching its own"""
+        if self._browser is None:
+            from playwright.async_api import async_playwright
+            self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch(headless=self.headless)
+        return self
+
+    async def close(self):
+        """Shut down the shared browser, if one was started"""
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _new_context(self, browser):
+        return await browser.new_context(
+            user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            viewport={'width': 1920, 'height': 1080}
+        )
+
+    @traced("scrape_with_playwright",
+            attributes=lambda self, url: dict(url_attributes(url), tier="playwright",
+                                              shared_browser=self._browser is not None))
     async def scrape_with_playwright(self, url: str):
-        """Scrape using Playwright (reuses browser/context if you refactor later)"""
+        """Scrape using Playwright, in a fresh context on the shared browser when one is started"""
+        if self._browser is not None:
+            context = await self._new_context(self._browser)
+            try:
+                return await self._scrape_page(context, url)
+            finally:
+                await context.close()
+
+        from playwright.async_api import async_playwright
         async with async_playwright() as p:
             browser = await p.chromium.launch(headless=self.headless)
-            context = await browser.new_context(
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                viewport={'width': 1920, 'height': 1080}
+            try:
+                context = await self._new_context(browser)
+                return await self._scrape_page(context, url)
+            finally:
+                await browser.close()
+
+    async def _scrape_page(self, context, url: str):
+        from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+        try:
+            page = await context.new_page()
+            #Navigate to page; use networkidle for JS-heavy sites
+            await page.goto(url, wait_until='networkidle', timeout=45000)
+            #Small wait for lazy content
+            await page.wait_for_timeout(250)
+            #Try to dismiss cookie banners / easy popups
+            await self._handle_common_popups(page)
+            #Detect auth/login blocks ASAP
+            blocked, reason = await self.detect_auth_block(page)
+            platform = self.identify_platform(url)
+            username = self.extract_username_from_url(url)
+            #Create a minimal profile early so we can return with status
+            profile = Profile(
+                platform=platform,
+                url=url,
+                username=username,
+                domain=urlparse(url).netloc,
+                page_title=await page.title() if await page.title() else None
             )
 
-            try:
-                page = await context.new_page()
-                #Navigate to page; use networkidle for JS-heavy sites
-                await page.goto(url, wait_until='networkidle', timeout=45000)
-                #Small wait for lazy content
-                await page.wait_for_timeout(250)
-                #Try to dismiss cookie banners / easy popups
-                await self._handle_common_popups(page)
-                #Detect auth/login blocks ASAP
-                blocked, reason = await self.detect_auth_block(page)
-                platform = self.identify_platform(url)
-                username = self.extract_username_from_url(url)
-                #Create a minimal profile early so we can return with status
-                profile = Profile(
-                    platform=platform,
-                    url=url,
-                    username=username,
-                    domain=urlparse(url).netloc,
-                    page_title=await page.title() if await page.title() else None
-                )
-
-                if blocked:
-                    profile.scrape_status = 'auth_gate'
-                    profile.scrape_reason = reason
-                    try:
-                        body_text = await page.evaluate("() => document.documentElement.innerText")
-                        profile.page_text = (body_text or "")[:1000]
-                    except Exception:
-                        profile.page_text = None
-                    await browser.close()
-                    return profile
-
-                #If not blocked, proceed to extract the full content
-                content = await page.content()
-                page_title = await page.title()
-
-                #Use evaluate to get the full page text reliably
+            if blocked:
+                profile.scrape_status = 'auth_gate'
+                profile.scrape_reason = reason
                 try:
-                    page_text = await page.evaluate("() => document.documentElement.innerText")
+                    body_text = await page.evaluate("() => document.documentElement.innerText")
+                    profile.page_text = (body_text or "")[:1000]
                 except Exception:
-                    page_text = None
+                    profile.page_text = None
+                return profile
 
-                #Extract profile data normally
-                profile = await self._extract_profile_data(page, url, content, page_title)
-                profile.page_text = page_text[:2000] if page_text else profile.page_text
-                profile.scrape_status = 'ok'
-                profile.scrape_reason = None
+            #If not blocked, proceed to extract the full content
+            content = await page.content()
+            page_title = await page.title()
 
-                return profile
+            #Use evaluate to get the full page text reliably
+            try:
+                page_text = await page.evaluate("() => document.documentElement.innerText")
+            except Exception:
+                page_text = None
 
-            except PlaywrightTimeoutError:
-                print(f"Timeout loading {url}")
-                return None
-            except Exception as e:
-                print(f"Playwright error for {url}: {e}")
-                return None
-            finally:
-                await browser.close()
+            #Extract profile data normally
+            profile = await self._extract_profile_data(page, url, content, page_title)
+            profile.page_text = page_text[:2000] if page_text else profile.page_text
+            profile.scrape_status = 'ok'
+            profile.scrape_reason = None
+
+            return profile
+
+        except PlaywrightTimeoutError:
+            print(f"Timeout loading {url}")
+            return None
+        except Exception as e:
+            print(f"Playwright error for {url}: {e}")
+            return None
 
     async def _handle_common_popups(self, page):
         """Handle common popups that block content"""
@@ -265,6 +329,7 @@ class UniversalScraper:
             except:
                 continue
 
+    @traced("_extract_profile_data", attributes=lambda self, page, url, *args: url_attributes(url))
     async def _extract_profile_data(self, page, url: str, content: str, page_title: str):
         """Extract profile data using generic selectors"""
         platform = self.identify_platform(url)
@@ -368,6 +433,7 @@ class UniversalScraper:
 
         return None
 
+    @traced("detect_auth_block", attributes=lambda self, page: url_attributes(page.url))
     async def detect_auth_block(self, page):
         url = page.url.lower()
         title = (await page.title()).lower()
@@ -398,7 +464,11 @@ class UniversalScraper:
 
 
         try:
-            profile = await self.scrape_with_playwright(url)
+            if self.limiter is not None:
+                async with self.limiter.limit(url):
+                    profile = await self.scrape_with_playwright(url)
+            else:
+                profile = await self.scrape_with_playwright(url)
             if profile:
                 return profile
         except Exception as e:
@@ -446,12 +516,83 @@ class UniversalScraper:
         print(f"Successfully scraped: {len(results)}/{len(urls)} profiles")
         return results
 
-    def export_results(self, profiles: List[Profile], filename: str = 'scraped_profiles.json'):
-        """Export results to JSON"""
-        data = [asdict(profile) for profile in profiles]
+    async def scrape_stream(self, urls: List[str], delay: float = 3.0, concurrency: int = 3, on_attempt=None):
+        """
+        Yield profiles as soon as each one is scraped.
+        Up to `concurrency` URLs are in flight at once, but requests to the same host start at least
+        `delay` seconds apart, as batch_scrape spaced them; different hosts are not held back.
+        on_attempt (optional) is called with each URL once it has been tried, whether or not it worked.
+        """
+        queue = asyncio.Queue(maxsize=max(1, concurrency))
+        pending = iter(urls)
+        done = object()
+
+        async def worker():
+            try:
+                for url in pending:
+                    await self._wait_for_host(url, delay)
+                    try:
+                        profile = await self.scrape_profile(url)
+                    except Exception as e:
+                        print(f"Error processing {url}: {e}")
+                        profile = None
+                    if on_attempt is not None:
+                        on_attempt(url)
+                    if profile:
+                        await queue.put(profile)
+                    else:
+                        print(f"Failed to scrape {url}")
+            finally:
+                await queue.put(done)
 
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, default=str, ensure_ascii=False)
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+        try:
+            remaining = len(workers)
+            while remaining:
+                item = await queue.get()
+                if item is done:
+                    remaining -= 1
+                else:
+                    yield item
+        finally:
+            for task in workers:
+                task.cancel()
+
+    async def _wait_for_host(self, url: str, delay: float):
+        """Reserve the host's next request slot, `delay` after its previous one, and wait for it"""
+        if delay <= 0:
+            return
+        host = urlparse(url).netloc
+        now = time.monotonic()
+        start = max(now, self._host_ready.get(host, 0.0))
+        self._host_ready[host] = start + delay
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def export_results(self, profiles: List[Profile], filename: str = 'scraped_profiles.json',
+                       indent: Optional[int] = 2):
+        """
+        Export results to JSON, or to a columnar file when filename ends in .arrow or .parquet
+        (see profile_batch.py).
+        profiles may already be dicts; indent=None writes compact JSON.
+        The file is written to a temp name and moved into place so readers never see a partial artifact.
+        """
+        if filename.endswith(('.arrow', '.parquet')):
+            from .profile_batch import ProfileWriter
+            with ProfileWriter(filename) as writer:
+                writer.write(profiles)
+            print(f"Results exported to {filename}")
+            return profiles
+
+        data = [profile if isinstance(profile, dict) else asdict(profile) for profile in profiles]
+
+        tmp_name = f"{filename}.tmp"
+        with open(tmp_name, 'w', encoding='utf-8') as f:
+            if indent is None:
+                json.dump(data, f, separators=(',', ':'), default=str, ensure_ascii=False)
+            else:
+                json.dump(data, f, indent=indent, default=str, ensure_ascii=False)
+        os.replace(tmp_name, filename)
 
         print(f"Results exported to {filename}")
         return data
@@ -483,6 +624,22 @@ async def test_scraper():
         #Export results
         scraper.export_results(results, 'generic_scrape_results.json')
 
+def clean_page_text(page_text: Optional[str]):
+    """Strip escaped and literal newlines/tabs from scraped page text"""
+    if page_text is None:
+        return None
+    #Remove all escape sequences \n and \t (newlines and tabs)
+    page_text = re.sub(r'\\n|\\t', '', page_text)  # This will remove the escape sequences
+    #Also remove actual newlines and tabs (not just escape sequences)
+    return page_text.replace('\n', ' ').replace('\t', ' ')
+
+
+def clean_profile(profile: Profile):
+    """In-memory equivalent of clean_json for a single profile"""
+    profile.page_text = clean_page_text(profile.page_text)
+    return profile
+
+
 def clean_json(url: str):
     """Clean up json"""
     with open(url, 'r+', encoding='utf-8') as f:
@@ -490,12 +647,7 @@ def clean_json(url: str):
         for i in range(len(data)):
             #First need to remove back slash characters in page text
             #Then need to remove useless social links. I think we can just ignore social links
-            page_text = data[i]["page_text"]
-            #Remove all escape sequences \n and \t (newlines and tabs)
-            page_text = re.sub(r'\\n|\\t', '', page_text)  # This will remove the escape sequences
-            #Also remove actual newlines and tabs (not just escape sequences)
-            page_text = page_text.replace('\n', ' ').replace('\t', ' ')
-            data[i]["page_text"] = page_text
+            data[i]["page_text"] = clean_page_text(data[i]["page_text"])
 
 
 
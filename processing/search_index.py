@@ -0,0 +1,234 @@
+"""
+Full-text search over every scraped profile and cluster summary.
+
+profile_search is an FTS5 table kept in sync on insert, in the same transaction as the write.
+Profile content is indexed once per unique blob (see blob_store), with the blob id as rowid, when
+insert_profiles_from_json_async stores it; cluster summaries are indexed by trigger, with the
+negated result_clusters.id as rowid. Deleting a blob or cluster removes its row by trigger.
+
+    python -m processing.search_index rebuild          # reindex everything, e.g. after an upgrade
+    python -m processing.search_index search "acme berlin"
+"""
+import argparse
+import re
+import sqlite3
+import time
+
+from .blob_store import decode_blob
+from .db import get_db, get_sync_db
+
+DB_PATH = r"data/osint.db"
+
+#Searchable columns and how much a match in each counts towards the rank
+SEARCH_COLUMNS = {
+    "display_name": 10.0,
+    "handle": 8.0,
+    "bio": 4.0,
+    "location": 4.0,
+    "links": 2.0,
+    "page_text": 1.0,
+    "summary": 2.0,
+}
+#Stored with the row for display, never matched
+DISPLAY_COLUMNS = ("kind", "username", "file_path", "platform", "url")
+
+ALL_COLUMNS = DISPLAY_COLUMNS + tuple(SEARCH_COLUMNS)
+
+SCHEMA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS profile_search USING fts5(
+    {", ".join(f"{c} UNINDEXED" for c in DISPLAY_COLUMNS)},
+    {", ".join(SEARCH_COLUMNS)},
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+"""
+
+RANK_SQL = ("INSERT INTO profile_search (profile_search, rank) VALUES "
+            f"('rank', 'bm25({', '.join(['0'] * len(DISPLAY_COLUMNS) + [str(w) for w in SEARCH_COLUMNS.values()])})')")
+
+
+def profile_search_values(blob_id, profile, username, file_path):
+    """Row for a blob's profile, in (rowid,) + ALL_COLUMNS order"""
+    return (blob_id, "profile", username, file_path, profile.get("platform"), profile.get("url"),
+            profile.get("display_name"), profile.get("handle"), profile.get("bio"), profile.get("location"),
+            " ".join(str(link) for link in profile.get("links") or []), profile.get("page_text"), None)
+
+
+def _summary_values(cluster, result):
+    return (f"-{cluster}.id, 'summary', {result}.username, {result}.file_path, NULL, NULL, "
+            f"NULL, NULL, NULL, NULL, NULL, NULL, {cluster}.summary")
+
+
+_INSERT_INTO = f"INSERT INTO profile_search (rowid, {', '.join(ALL_COLUMNS)})"
+
+INSERT_PROFILE_SQL = f"{_INSERT_INTO} VALUES ({', '.join('?' for _ in range(len(ALL_COLUMNS) + 1))})"
+
+TRIGGERS = f"""
+DROP TRIGGER IF EXISTS profiles_search_insert;
+DROP TRIGGER IF EXISTS profiles_search_delete;
+CREATE TRIGGER IF NOT EXISTS profile_blobs_search_delete AFTER DELETE ON profile_blobs BEGIN
+    DELETE FROM profile_search WHERE rowid = old.id;
+END;
+CREATE TRIGGER IF NOT EXISTS result_clusters_search_insert AFTER INSERT ON result_clusters BEGIN
+    {_INSERT_INTO} SELECT {_summary_values("new", "r")} FROM processing_results r WHERE r.id = new.result_id;
+END;
+CREATE TRIGGER IF NOT EXISTS result_clusters_search_delete AFTER DELETE ON result_clusters BEGIN
+    DELETE FROM profile_search WHERE rowid = -old.id;
+END;
+"""
+
+#Each blob with the newest profiles row that references it
+REBUILD_BLOBS_SQL = """
+SELECT b.id, b.dict_id, b.data, p.username, p.file_path
+  FROM profile_blobs b
+  LEFT JOIN profiles p ON p.id = (SELECT max(id) FROM profiles WHERE blob_hash = b.hash)
+ WHERE b.id > ?
+ ORDER BY b.id
+ LIMIT ?
+"""
+
+REBUILD_SUMMARIES_SQL = f"""
+{_INSERT_INTO} SELECT {_summary_values("c", "r")} FROM result_clusters c JOIN processing_results r ON r.id = c.result_id
+"""
+
+REBUILD_BATCH = 1000
+
+#FTS5 stops at `limit` rows in rank order, so the investigation lookups only run for the hits
+SEARCH_SQL = f"""
+WITH hits AS (
+    SELECT rowid, kind, username, file_path, platform, url,
+           highlight(profile_search, {ALL_COLUMNS.index("display_name")}, '**', '**') AS title,
+           snippet(profile_search, -1, '**', '**', ' … ', 24) AS snippet,
+           rank
+      FROM profile_search
+     WHERE profile_search MATCH ?
+     ORDER BY rank
+     LIMIT ?
+)
+SELECT hits.*,
+       CASE WHEN hits.rowid < 0
+            THEN (SELECT result_id FROM result_clusters WHERE id = -hits.rowid)
+            ELSE (SELECT r.id FROM profiles p JOIN processing_results r ON r.file_path = p.file_path
+                   WHERE p.blob_hash = (SELECT hash FROM profile_blobs WHERE id = hits.rowid)
+                   ORDER BY r.id DESC LIMIT 1)
+       END AS result_id
+  FROM hits
+"""
+
+_TOKEN = re.compile(r'[^\s"]+')
+
+
+def build_match_query(text):
+    """
+    Turn what a user typed into an FTS5 query: every word must appear, and a trailing * keeps
+    prefix matching. Quoting each word stops punctuation (emails, URLs, handles) being read as syntax.
+    """
+    terms = []
+    for token in _TOKEN.findall(text):
+        prefix = token.endswith("*")
+        token = token.rstrip("*")
+        if token:
+            terms.append(f'"{token}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+async def init_search_index(db_path=DB_PATH):
+    """Create the index and its triggers; needs the profile, blob and results tables to exist."""
+    db = await get_db(db_path)
+    await db.executescript(SCHEMA + TRIGGERS)
+    await db.execute(RANK_SQL)
+
+
+async def index_profile_blobs(conn, blobs, username, file_path):
+    """Index newly stored blobs, given as (blob_id, profile); call inside the transaction that stored them."""
+    if blobs:
+        await conn.executemany(INSERT_PROFILE_SQL, [profile_search_values(blob_id, profile, username, file_path)
+                                                    for blob_id, profile in blobs])
+
+
+def rebuild_search_index(db_path=DB_PATH):
+    """Reindex every profile and summary from scratch in one transaction; returns the row count."""
+    conn = get_sync_db(db_path)
+    conn.executescript(SCHEMA + TRIGGERS)
+    conn.execute(RANK_SQL)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM profile_search")
+        last_id = 0
+        while True:
+            rows = conn.execute(REBUILD_BLOBS_SQL, (last_id, REBUILD_BATCH)).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            conn.executemany(INSERT_PROFILE_SQL, [
+                profile_search_values(blob_id, decode_blob(conn, dict_id, data, db_path), username, file_path)
+                for blob_id, dict_id, data, username, file_path in rows
+            ])
+        conn.execute(REBUILD_SUMMARIES_SQL)
+        conn.execute("INSERT INTO profile_search (profile_search) VALUES ('optimize')")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+    return conn.execute("SELECT count(*) FROM profile_search").fetchone()[0]
+
+
+def search_profiles(text, limit=20, raw=False, db_path=DB_PATH):
+    """
+    Best matches first. Each hit has kind ('profile' or 'summary'), username, platform, url,
+    a highlighted title and snippet (matches wrapped in **), its bm25 rank and the result_id of
+    the investigation it came from (None if that investigation has no stored result).
+    raw=True passes text straight to FTS5, for phrase, NEAR, column and boolean queries.
+    """
+    query = text if raw else build_match_query(text)
+    if not query:
+        return []
+    try:
+        rows = get_sync_db(db_path).execute(SEARCH_SQL, (query, limit)).fetchall()
+    except sqlite3.OperationalError as e:
+        #Nothing has been investigated yet
+        if "no such table" in str(e):
+            return []
+        raise
+    return [{
+        "rowid": row[0],
+        "kind": row[1],
+        "username": row[2],
+        "file_path": row[3],
+        "platform": row[4],
+        "url": row[5],
+        "title": row[6],
+        "snippet": row[7],
+        "rank": row[8],
+        "result_id": row[9],
+    } for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text profile search index")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("rebuild", help="reindex all profiles and summaries")
+    search = commands.add_parser("search", help="run a query")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int, default=20)
+    search.add_argument("--raw", action="store_true", help="pass the query to FTS5 unchanged")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        start = time.perf_counter()
+        count = rebuild_search_index(args.db)
+        print(f"Indexed {count} rows in {time.perf_counter() - start:.2f}s")
+    else:
+        start = time.perf_counter()
+        hits = search_profiles(args.query, limit=args.limit, raw=args.raw, db_path=args.db)
+        elapsed = (time.perf_counter() - start) * 1000
+        for hit in hits:
+            print(f"[{hit['kind']}] {hit['username']} {hit['platform'] or ''} {hit['url'] or ''} "
+                  f"(result {hit['result_id']})")
+            print(f"    {hit['snippet']}")
+        print(f"{len(hits)} hits in {elapsed:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""
+Sharded scraping: spread page rendering over several processes, each with its own browser.
+
+One process driving Playwright tops out at one core (CDP messages, page payloads, text cleanup).
+ShardedScraper has the same start/close/scrape_stream interface as UniversalScraper, so the
+pipeline can use either, but hands every URL to one of N shard processes picked by a stable hash
+of its host. All requests to a host go through one shard, so that shard's HostLimiter enforces
+the per-host limit exactly as a single scraper would; the global limit is split between shards.
+
+Shards send results back over a pipe as plain tuples of Profile field values (no field names),
+with the page text already cleaned, so the coordinator only rebuilds the dataclass.
+
+    DEEPSINT_SCRAPE_SHARDS=8 python -m processing.worker
+    python -m processing.cli subjects.txt --shards 8
+"""
+import asyncio
+import hashlib
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+from dataclasses import fields
+from urllib.parse import urlparse
+
+from .scraper import UniversalScraper, Profile, clean_profile
+
+logger = logging.getLogger(__name__)
+
+#0 or 1 scrapes in-process; set DEEPSINT_SCRAPE_SHARDS to the cores rendering may use
+SCRAPE_SHARDS = int(os.getenv("DEEPSINT_SCRAPE_SHARDS", "0"))
+#Seconds a shard gets to launch its browser
+START_TIMEOUT = 60.0
+
+_FIELDS = [f.name for f in fields(Profile)]
+
+
+def shard_for(url, shards):
+    """Shard index for url; the same host always maps to the same shard, in every process"""
+    digest = hashlib.blake2b(urlparse(url).netloc.lower().encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % shards
+
+
+def _pack(profile):
+    return tuple(getattr(profile, name) for name in _FIELDS)
+
+
+def _unpack(values):
+    return Profile(*values)
+
+
+def default_scraper(headless, per_host, global_limit):
+    """Scraper a shard runs, with its own limiter; factories must be picklable top-level callables"""
+    from .discovery import HostLimiter
+    return UniversalScraper(use_playwright=True, headless=headless,
+                            limiter=HostLimiter(global_limit=global_limit, per_host=per_host))
+
+
+def make_scraper(shards=SCRAPE_SHARDS, headless=True, limiter=None):
+    """A ShardedScraper when shards > 1, otherwise a UniversalScraper sharing limiter"""
+    if shards > 1:
+        if limiter is None:
+            return ShardedScraper(shards, headless=headless)
+        return ShardedScraper(shards, headless=headless, per_host=limiter.per_host,
+                              global_limit=limiter.global_limit)
+    return UniversalScraper(use_playwright=True, headless=headless, limiter=limiter)
+
+
+class _Shard:
+    def __init__(self, index, process, conn):
+        self.index = index
+        self.process = process
+        self.conn = conn
+        self.alive = True
+
+
+class ShardedScraper:
+    """Drop-in for UniversalScraper in the pipeline that renders pages in `shards` processes"""
+
+    #Shards run clean_profile on their own cores, so the pipeline skips its clean stage
+    cleans_profiles = True
+
+    def __init__(self, shards=None, headless=True, per_host=4, global_limit=50, scraper_factory=default_scraper):
+        self.shards = shards or os.cpu_count() or 1
+        self.headless = headless
+        self.per_host = per_host
+        self.global_limit = global_limit
+        self.scraper_factory = scraper_factory
+        self._shards = []
+        #stream id -> queue of (kind, shard index, payload) for that scrape_stream call
+        self._streams = {}
+        self._ids = itertools.count()
+        #Held while dead shards are restarted, so concurrent streams restart each once
+        self._respawning = asyncio.Lock()
+
+    @property
+    def started(self):
+        return bool(self._shards)
+
+    def _spawn(self, index):
+        #spawn, not fork: the parent has an event loop and threads running
+        context = multiprocessing.get_context("spawn")
+        options = {"headless": self.headless, "per_host": self.per_host,
+                   "global_limit": max(1, self.global_limit // self.shards)}
+        parent, child = context.Pipe()
+        process = context.Process(target=_shard_main, args=(child, self.scraper_factory, options),
+                                  name=f"scrape-shard-{index}", daemon=True)
+        process.start()
+        child.close()
+        return _Shard(index, process, parent)
+
+    @staticmethod
+    def _wait_ready(shard):
+        """None once the shard has launched its browser, otherwise why it didn't"""
+        if not shard.conn.poll(START_TIMEOUT):
+            return f"no answer in {START_TIMEOUT:.0f}s"
+        try:
+            return shard.conn.recv()[2]
+        except EOFError:
+            return f"exited with code {shard.process.exitcode}"
+
+    def _listen(self, shard):
+        threading.Thread(target=self._read, args=(shard, asyncio.get_running_loop()), daemon=True,
+                         name=f"scrape-shard-{shard.index}-reader").start()
+
+    async def start(self):
+        """Start every shard and wait until each has launched its browser"""
+        if self._shards:
+            return self
+        self._shards = [self._spawn(index) for index in range(self.shards)]
+        errors = [error for error in await asyncio.gather(*(asyncio.to_thread(self._wait_ready, shard)
+                                                            for shard in self._shards)) if error]
+        if errors:
+            await self.close()
+            raise RuntimeError(f"scrape shard failed to start: {errors[0]}")
+        for shard in self._shards:
+            self._listen(shard)
+        logger.info("Started %d scrape shards", self.shards)
+        return self
+
+    async def _respawn_dead(self):
+        """Restart shards that have exited, e.g. after a browser crash; raises if one won't start"""
+        async with self._respawning:
+            for index, old in enumerate(self._shards):
+                if old.alive:
+                    continue
+                old.conn.close()
+                await asyncio.to_thread(old.process.join, 1)
+                shard = self._spawn(index)
+                error = await asyncio.to_thread(self._wait_ready, shard)
+                if error:
+                    shard.process.terminate()
+                    shard.conn.close()
+                    raise RuntimeError(f"scrape shard {index} failed to restart: {error}")
+                self._shards[index] = shard
+                self._listen(shard)
+                logger.info("Restarted scrape shard %d", index)
+
+    async def close(self):
+        """Stop every shard; each closes its own browser"""
+        shards, self._shards = self._shards, []
+        for shard in shards:
+            if shard.alive:
+                try:
+                    shard.conn.send(("stop",))
+                except OSError:
+                    pass
+        for shard in shards:
+            await asyncio.to_thread(shard.process.join, 10)
+            if shard.process.is_alive():
+                shard.process.terminate()
+            shard.conn.close()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _read(self, shard, loop):
+        """Reader thread: hand every message from a shard to the event loop"""
+        while True:
+            try:
+                kind, stream_id, payload = shard.conn.recv()
+            except (EOFError, OSError):
+                kind = None
+            try:
+                if kind is None:
+                    loop.call_soon_threadsafe(self._shard_lost, shard)
+                    return
+                loop.call_soon_threadsafe(self._dispatch, shard.index, kind, stream_id, payload)
+            except RuntimeError:
+                #The event loop has already closed
+                return
+
+    def _dispatch(self, index, kind, stream_id, payload):
+        queue = self._streams.get(stream_id)
+        #Results for a stream that was closed early are dropped
+        if queue is not None:
+            queue.put_nowait((kind, index, payload))
+
+    def _shard_lost(self, shard):
+        if not shard.alive or shard not in self._shards:
+            return
+        shard.alive = False
+        logger.error("Scrape shard %d exited (%s); its URLs in flight are lost", shard.index, shard.process.exitcode)
+        for queue in self._streams.values():
+            queue.put_nowait(("lost", shard.index, None))
+
+    async def scrape_stream(self, urls, delay=3.0, concurrency=3, on_attempt=None):
+        """
+        Yield profiles as each shard scrapes them; same arguments as UniversalScraper.scrape_stream.
+        Each shard scrapes its URLs `concurrency` at a time, so up to shards * concurrency are in flight.
+        """
+        if not self._shards:
+            raise RuntimeError("ShardedScraper.start() must be called before scraping")
+        #A long-lived scraper (the worker's) would otherwise lose a shard's hosts for good
+        await self._respawn_dead()
+        by_shard = {}
+        for url in urls:
+            by_shard.setdefault(shard_for(url, len(self._shards)), []).append(url)
+
+        stream_id = next(self._ids)
+        queue = asyncio.Queue()
+        self._streams[stream_id] = queue
+        waiting = set()
+        #shard index -> its URLs not attempted yet, reported as attempted if the shard dies
+        in_flight = {}
+        try:
+            for index, shard_urls in by_shard.items():
+                shard = self._shards[index]
+                if not shard.alive:
+                    #Died since this stream started; restarted by the next one
+                    logger.warning("Scrape shard %d is down, skipping %d URLs", index, len(shard_urls))
+                    for url in shard_urls:
+                        if on_attempt is not None:
+                            on_attempt(url)
+                    continue
+                shard.conn.send(("scrape", stream_id, (shard_urls, delay, concurrency)))
+                waiting.add(index)
+                in_flight[index] = set(shard_urls)
+
+            while waiting:
+                kind, index, payload = await queue.get()
+                if kind == "profile":
+                    yield _unpack(payload)
+                elif kind == "attempt":
+                    in_flight[index].discard(payload)
+                    if on_attempt is not None:
+                        on_attempt(payload)
+                elif kind == "done":
+                    waiting.discard(index)
+                elif kind == "lost" and index in waiting:
+                    #Keeps progress reaching urls_total
+                    waiting.discard(index)
+                    for url in in_flight.pop(index):
+                        if on_attempt is not None:
+                            on_attempt(url)
+        finally:
+            del self._streams[stream_id]
+            for index in waiting:
+                if self._shards and self._shards[index].alive:
+                    try:
+                        self._shards[index].conn.send(("cancel", stream_id, None))
+                    except OSError:
+                        pass
+
+    #Doesn't touch the scraper's state, so the in-process implementation works as is
+    export_results = UniversalScraper.export_results
+
+
+def _shard_main(conn, scraper_factory, options):
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s [{multiprocessing.current_process().name}] "
+                                                   f"%(levelname)s %(message)s")
+    try:
+        asyncio.run(_serve(conn, scraper_factory(**options)))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _serve(conn, scraper):
+    """Shard process: scrape the URL lists the coordinator sends until told to stop"""
+    try:
+        await scraper.start()
+    except Exception as e:
+        conn.send(("ready", None, f"{type(e).__name__}: {e}"))
+        return
+    conn.send(("ready", None, None))
+
+    loop = asyncio.get_running_loop()
+    inbox = asyncio.Queue()
+
+    def read():
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                #The coordinator is gone
+                message = ("stop",)
+            loop.call_soon_threadsafe(inbox.put_nowait, message)
+            if message[0] == "stop":
+                return
+
+    threading.Thread(target=read, daemon=True).start()
+    tasks = {}
+    try:
+        while True:
+            message = await inbox.get()
+            if message[0] == "stop":
+                break
+            kind, stream_id, payload = message
+            if kind == "scrape":
+                task = asyncio.create_task(_scrape(conn, scraper, stream_id, *payload))
+                tasks[stream_id] = task
+                task.add_done_callback(lambda _, stream_id=stream_id: tasks.pop(stream_id, None))
+            elif kind == "cancel" and stream_id in tasks:
+                tasks[stream_id].cancel()
+    finally:
+        for task in list(tasks.values()):
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        await scraper.close()
+
+
+async def _scrape(conn, scraper, stream_id, urls, delay, concurrency):
+    try:
+        async for profile in scraper.scrape_stream(urls, delay=delay, concurrency=concurrency,
+                                                   on_attempt=lambda url: conn.send(("attempt", stream_id, url))):
+            #Clean here so the regex work runs on this core too
+            conn.send(("profile", stream_id, _pack(clean_profile(profile))))
+    except Exception:
+        logger.exception("Shard scrape of %d URLs failed", len(urls))
+    finally:
+        try:
+            conn.send(("done", stream_id, None))
+        except OSError:
+            pass
@@ -1,45 +1,187 @@
-import cohere
-import os
-from dotenv import load_dotenv
-import json
-def summarize_cluster_full(links, file_path, username):
-    #Takes the index values of the json's as input to summarize
-    #Summarizes the profile as a whole.
-    system_message = f"You are an assistant specializing in extracting key personal details from public online profiles. You will be given various data from websites. Your task is to extract important facts about the user’s activities, interests, affiliations, and any other relevant information. Avoid mentioning the websites or platforms unless necessary to understand the context."
-
-
-    chunked_documents = []
-
-    for index in links:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            text = ""
-            data = json.load(f)
-
-            if data[index]["page_title"]:
-                text += f"{data[index]['page_title']}."
-            if data[index]["domain"]:
-                text += f"The user, {username} has an account for {data[index]['domain']}."
-            if data[index]["page_text"]:
-                text += f"Here is some user information: {data[index]['page_text']}"
-
-            chunked_documents.append({"data": {"text": text}})
-
-    load_dotenv()
-    api_key = os.getenv("COHERE_API_KEY")
-    co = cohere.ClientV2(api_key=api_key)
-
-    message = f"Summarize the key details about the user based on the provided data, highlighting their activities, interests, potential age (based on account creation), affiliations, or any other relevant FACTUAL personal information. Keep it concise—2-3 sentences, and avoid including website names unless essential."
-
-    response = co.chat(
-        model="command-a-03-2025",
-        documents=chunked_documents,
-        messages=[
-            {"role": "system", "content": system_message},
-            {"role": "user", "content": message},
-        ],
-    )
-    return response.message.content[0].text
-
-
-
-print(summarize_cluster_full([0, 1, 2, 3, 4, 5, 6, 7, 9, 10, 12],r"LordFurno_v1.json","LordFurno" ))
+import os
+import time
+import asyncio
+import json
+import logging
+import weakref
+from .summary_cache import SummaryCache, summary_fingerprint
+from .tracing import traced
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_MODEL = "command-a-03-2025"
+
+SYSTEM_MESSAGE = f"You are an assistant specializing in extracting key personal details from public online profiles. You will be given various data from websites. Your task is to extract important facts about the user’s activities, interests, affiliations, and any other relevant information. Avoid mentioning the websites or platforms unless necessary to understand the context."
+
+USER_MESSAGE = f"Summarize the key details about the user based on the provided data, highlighting their activities, interests, potential age (based on account creation), affiliations, or any other relevant FACTUAL personal information. Keep it concise—2-3 sentences, and avoid including website names unless essential."
+
+_default_cache = None
+_chat_client = None
+#event loop -> async client; its connection pool can't outlive the loop it was opened on
+_async_chat_clients = weakref.WeakKeyDictionary()
+
+
+def get_chat_client(async_client=False):
+    """
+    One chat client per process, so every cluster and subject reuses its connection pool.
+    The async client is shared per event loop: one per process in the worker and batch CLI.
+    """
+    global _chat_client
+    if async_client:
+        loop = asyncio.get_running_loop()
+        if loop not in _async_chat_clients:
+            _async_chat_clients[loop] = _new_chat_client(async_client=True)
+        return _async_chat_clients[loop]
+    if _chat_client is None:
+        _chat_client = _new_chat_client()
+    return _chat_client
+
+
+def _new_chat_client(async_client=False):
+    #cohere takes most of a second to import, so it is only loaded once a summary is actually generated
+    import cohere
+    from dotenv import load_dotenv
+    load_dotenv()
+    api_key = os.getenv("COHERE_API_KEY")
+    return cohere.AsyncClientV2(api_key=api_key) if async_client else cohere.ClientV2(api_key=api_key)
+
+
+def get_summary_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = SummaryCache()
+    return _default_cache
+
+
+def load_profiles(profiles):
+    """Accept either the in-memory list of profile dicts or the path of an exported JSON file"""
+    if isinstance(profiles, str):
+        with open(profiles, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return profiles
+
+
+def build_cluster_documents(links, profiles, username):
+    #Takes the index values of the json's as input and builds the chat documents
+    data = load_profiles(profiles)
+    chunked_documents = []
+
+    for index in links:
+        text = ""
+
+        if data[index]["page_title"]:
+            text += f"{data[index]['page_title']}."
+        if data[index]["domain"]:
+            text += f"The user, {username} has an account for {data[index]['domain']}."
+        if data[index]["page_text"]:
+            text += f"Here is some user information: {data[index]['page_text']}"
+
+        chunked_documents.append({"data": {"text": text}})
+
+    return chunked_documents
+
+
+@traced("summarize_cluster_full", attributes=lambda links, *args, **kwargs: {"batch_size": len(links)})
+def summarize_cluster_full(links, profiles, username, cache=None, force_refresh=False):
+    #Takes the index values of the json's as input to summarize
+    #profiles is the list of scraped profile dicts (or the path of the exported file)
+    #Summarizes the profile as a whole.
+    #Unchanged clusters are served from the summary cache unless force_refresh is set.
+    chunked_documents = build_cluster_documents(links, profiles, username)
+
+    if cache is None:
+        cache = get_summary_cache()
+    fingerprint = summary_fingerprint(SUMMARY_MODEL, SYSTEM_MESSAGE, USER_MESSAGE, chunked_documents)
+    if not force_refresh:
+        cached = cache.get(fingerprint)
+        if cached is not None:
+            return cached
+
+    co = get_chat_client()
+
+    start = time.perf_counter()
+    response = co.chat(
+        model=SUMMARY_MODEL,
+        documents=chunked_documents,
+        messages=[
+            {"role": "system", "content": SYSTEM_MESSAGE},
+            {"role": "user", "content": USER_MESSAGE},
+        ],
+    )
+    summary = response.message.content[0].text
+    cache.put(fingerprint, SUMMARY_MODEL, summary, time.perf_counter() - start)
+    return summary
+
+
+@traced("stream_cluster_summary", attributes=lambda links, *args, **kwargs: {"batch_size": len(links)})
+async def stream_cluster_summary(links, profiles, username, cache=None, force_refresh=False, client=None):
+    """
+    Async iterator over the summary text of one cluster as it is generated.
+    A cached summary is yielded as a single chunk; otherwise chunks are token deltas
+    from co.chat_stream and the full text is cached once the stream ends.
+    client (optional) is the async chat client to use, e.g. one shared across subjects.
+    """
+    chunked_documents = build_cluster_documents(links, profiles, username)
+
+    if cache is None:
+        cache = get_summary_cache()
+    fingerprint = summary_fingerprint(SUMMARY_MODEL, SYSTEM_MESSAGE, USER_MESSAGE, chunked_documents)
+    if not force_refresh:
+        cached = cache.get(fingerprint)
+        if cached is not None:
+            yield cached
+            return
+
+    co = client or get_chat_client(async_client=True)
+
+    start = time.perf_counter()
+    parts = []
+    async for event in co.chat_stream(
+        model=SUMMARY_MODEL,
+        documents=chunked_documents,
+        messages=[
+            {"role": "system", "content": SYSTEM_MESSAGE},
+            {"role": "user", "content": USER_MESSAGE},
+        ],
+    ):
+        if event.type == "content-delta":
+            text = event.delta.message.content.text
+            if text:
+                parts.append(text)
+                yield text
+
+    cache.put(fingerprint, SUMMARY_MODEL, "".join(parts), time.perf_counter() - start)
+
+
+async def stream_cluster_summaries(clusters, profiles, username, cache=None, force_refresh=False, client=None):
+    """
+    Stream every cluster's summary concurrently.
+    Yields (cluster_key, chunk) in arrival order, then (cluster_key, None) when that cluster is done,
+    or (cluster_key, exception) if its summary failed; the other clusters carry on.
+    """
+    profiles = load_profiles(profiles)
+    queue = asyncio.Queue()
+
+    async def pump(key, links):
+        try:
+            async for chunk in stream_cluster_summary(links, profiles, username,
+                                                      cache=cache, force_refresh=force_refresh, client=client):
+                await queue.put((key, chunk))
+        except Exception as e:
+            logger.warning("Summary of cluster %s failed: %s", key, e)
+            await queue.put((key, e))
+        else:
+            await queue.put((key, None))
+
+    tasks = [asyncio.create_task(pump(key, links)) for key, links in clusters.items()]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            key, chunk = await queue.get()
+            if chunk is None or isinstance(chunk, Exception):
+                remaining -= 1
+            yield key, chunk
+    finally:
+        for task in tasks:
+            task.cancel()
+
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = r"data/osint.db"
+
+#Summaries older than this are regenerated (seconds)
+DEFAULT_TTL = 30 * 24 * 3600
+#Least recently used rows beyond this count are evicted on write
+DEFAULT_MAX_ENTRIES = 5000
+
+
+def normalize_documents(documents: List[Dict]):
+    """Collapse whitespace in document text so cosmetic changes don't bust the cache"""
+    normalized = []
+    for doc in documents:
+        text = doc.get("data", {}).get("text", "")
+        normalized.append(" ".join(text.split()))
+    return normalized
+
+
+def summary_fingerprint(model: str, system_message: str, message: str, documents: List[Dict]):
+    """Fingerprint of everything that influences a summary: prompt template, model and documents"""
+    payload = json.dumps({
+        "model": model,
+        "system": system_message,
+        "message": message,
+        "documents": normalize_documents(documents),
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SummaryCache:
+    """SQLite backed cache of cluster summaries keyed by content fingerprint"""
+
+    def __init__(self, db_path: str = DB_PATH, ttl: float = DEFAULT_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = None
+        self.reset_stats()
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS summary_cache (
+                fingerprint TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                llm_seconds REAL NOT NULL, -- time the original chat call took
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_summary_cache_last_used ON summary_cache(last_used_at)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.time_saved = 0.0
+        self.llm_time = 0.0
+
+    def get(self, fingerprint: str):
+        """Return the cached summary, or None if missing or past its TTL"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT summary, llm_seconds, created_at FROM summary_cache WHERE fingerprint = ?",
+                (fingerprint,)
+            ).fetchone()
+            if row is None or now - row[2] > self.ttl:
+                self.misses += 1
+                return None
+            conn.execute(
+                "UPDATE summary_cache SET last_used_at = ?, hits = hits + 1 WHERE fingerprint = ?",
+                (now, fingerprint)
+            )
+            conn.commit()
+        self.hits += 1
+        self.time_saved += row[1]
+        return row[0]
+
+    def put(self, fingerprint: str, model: str, summary: str, llm_seconds: float):
+        now = time.time()
+        self.llm_time += llm_seconds
+        with self._lock:
+            conn = self._connect()
+            conn.execute("""
+            INSERT OR REPLACE INTO summary_cache
+              (fingerprint, model, summary, llm_seconds, created_at, last_used_at, hits)
+            VALUES (?, ?, ?, ?, ?, ?, 0)
+            """, (fingerprint, model, summary, llm_seconds, now, now))
+            self._evict(conn, now)
+            conn.commit()
+
+    def _evict(self, conn, now: float):
+        """Drop expired rows, then the least recently used ones beyond max_entries"""
+        conn.execute("DELETE FROM summary_cache WHERE created_at < ?", (now - self.ttl,))
+        conn.execute("""
+        DELETE FROM summary_cache WHERE fingerprint IN (
+            SELECT fingerprint FROM summary_cache
+            ORDER BY last_used_at DESC
+            LIMIT -1 OFFSET ?
+        )
+        """, (self.max_entries,))
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM summary_cache")
+            conn.commit()
+
+    def log_stats(self, label: Optional[str] = None):
+        """Log hit rate and LLM time saved since the last reset"""
+        total = self.hits + self.misses
+        hit_rate = (self.hits / total) if total else 0.0
+        logger.info(
+            "Summary cache%s: %d/%d hits (%.0f%%), %.1fs LLM time saved, %.1fs spent",
+            f" [{label}]" if label else "", self.hits, total, hit_rate * 100,
+            self.time_saved, self.llm_time
+        )
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": hit_rate,
+                "time_saved": self.time_saved, "llm_time": self.llm_time}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,295 @@
+"""
+Lightweight span tracing persisted to SQLite.
+
+    with span("cluster_profiles_from_modalities", n=12):
+        ...
+
+    @traced("scrape_with_playwright", attributes=lambda self, url: url_attributes(url))
+    async def scrape_with_playwright(self, url): ...
+
+Spans are buffered in memory and written to the `spans` table in batches, so the cost on the
+hot path is two perf_counter calls and a context variable swap. Every span started inside
+`trace_investigation(...)` shares its trace id, which `investigation_breakdown` aggregates.
+
+Environment:
+    DEEPSINT_TRACING=0               disable tracing entirely
+    DEEPSINT_PROFILE=name1,name2     profile spans with these names ("*" for all)
+    DEEPSINT_PROFILER=cprofile       or "pyinstrument"; output goes to logs/profiles/
+"""
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = r"data/osint.db"
+PROFILE_DIR = r"logs/profiles"
+#Spans buffered before they are written out
+FLUSH_THRESHOLD = 256
+
+ENABLED = os.getenv("DEEPSINT_TRACING", "1") != "0"
+PROFILE_NAMES = {name.strip() for name in os.getenv("DEEPSINT_PROFILE", "").split(",") if name.strip()}
+PROFILER = os.getenv("DEEPSINT_PROFILER", "cprofile")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def url_attributes(url):
+    return {"url": url, "host": urlparse(url).netloc}
+
+
+class SpanRecorder:
+    """Thread-safe buffer of finished spans, flushed to SQLite in batches"""
+
+    def __init__(self, db_path=DB_PATH, flush_threshold=FLUSH_THRESHOLD):
+        self.db_path = db_path
+        self.flush_threshold = flush_threshold
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def record(self, row):
+        with self._lock:
+            self._buffer.append(row)
+            should_flush = len(self._buffer) >= self.flush_threshold
+        if should_flush:
+            self.flush()
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            #Losing the last few spans in a crash is fine; an fsync per batch is not
+            self._conn.execute("PRAGMA synchronous=OFF")
+            self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS spans (
+                span_id TEXT PRIMARY KEY,
+                trace_id TEXT, -- one per investigation
+                parent_id TEXT,
+                name TEXT NOT NULL,
+                start_at REAL NOT NULL, -- unix time
+                duration REAL NOT NULL, -- seconds
+                status TEXT NOT NULL, -- ok or error
+                error TEXT,
+                attributes TEXT -- JSON
+            )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_spans_trace ON spans(trace_id, name)")
+        return self._conn
+
+    def flush(self):
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            if not rows:
+                return
+            try:
+                conn = self._connect()
+                conn.executemany(
+                    "INSERT OR IGNORE INTO spans VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                #Tracing must never break an investigation
+                logger.warning("Dropped %d spans: %s", len(rows), e)
+
+    def use_database(self, db_path):
+        """Write later spans to db_path, e.g. a worker started with --db"""
+        self.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self.db_path = db_path
+
+
+recorder = SpanRecorder()
+
+
+class _StageProfiler:
+    """Optional cProfile/pyinstrument run around one span"""
+
+    def __init__(self, name, span_id):
+        self.path = os.path.join(PROFILE_DIR, f"{name}-{span_id}")
+        self.profiler = None
+
+    def start(self):
+        if PROFILER == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                logger.warning("pyinstrument is not installed, falling back to cProfile")
+            else:
+                self.profiler = Profiler(async_mode="enabled")
+                self.profiler.start()
+                return
+        import cProfile
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def stop(self):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        if PROFILER == "pyinstrument" and hasattr(self.profiler, "output_html"):
+            self.profiler.stop()
+            with open(self.path + ".html", "w", encoding="utf-8") as f:
+                f.write(self.profiler.output_html())
+        else:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.path + ".prof")
+
+
+class span:
+    """Timed span usable as `with span(...)` or `async with span(...)`"""
+
+    __slots__ = ("name", "attributes", "span_id", "parent_id", "trace_id",
+                 "_start", "_start_at", "_token", "_profiler")
+
+    def __init__(self, name, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self._profiler = None
+
+    def set(self, **attributes):
+        """Add attributes once they are known, e.g. a result size"""
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        #Read by callers (e.g. log_breakdown) even when tracing is off
+        self.trace_id = self.span_id = None
+        if not ENABLED:
+            return self
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.trace_id = _current_trace.get()
+        self.span_id = os.urandom(8).hex()
+        self._token = _current_span.set(self)
+        if PROFILE_NAMES and ("*" in PROFILE_NAMES or self.name in PROFILE_NAMES):
+            self._profiler = _StageProfiler(self.name, self.span_id)
+            self._profiler.start()
+        self._start_at = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not ENABLED:
+            return False
+        duration = time.perf_counter() - self._start
+        if self._profiler is not None:
+            self._profiler.stop()
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            #Exited from a different context (e.g. an async generator closed elsewhere)
+            pass
+        recorder.record((
+            self.span_id, self.trace_id, self.parent_id, self.name, self._start_at, duration,
+            "error" if exc_type else "ok", repr(exc) if exc is not None else None,
+            json.dumps(self.attributes, default=str) if self.attributes else None,
+        ))
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+class trace_investigation(span):
+    """Root span of an investigation; every span inside it shares the trace id it yields"""
+
+    __slots__ = ("_trace_token",)
+
+    def __init__(self, username, **attributes):
+        super().__init__("investigation", username=username, **attributes)
+
+    def __enter__(self):
+        self._trace_token = _current_trace.set(uuid.uuid4().hex)
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        result = super().__exit__(exc_type, exc, tb)
+        try:
+            _current_trace.reset(self._trace_token)
+        except ValueError:
+            pass
+        recorder.flush()
+        return result
+
+
+def current_trace_id():
+    return _current_trace.get()
+
+
+def traced(name=None, attributes=None):
+    """
+    Decorate a sync, async or async-generator function so each call runs in a span.
+    attributes (optional) is called with the function's arguments and returns span attributes.
+    """
+    def decorator(func):
+        span_name = name or func.__name__
+
+        def make_span(args, kwargs):
+            if attributes is None:
+                return span(span_name)
+            try:
+                return span(span_name, **attributes(*args, **kwargs))
+            except Exception:
+                return span(span_name)
+
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def gen_wrapper(*args, **kwargs):
+                with make_span(args, kwargs):
+                    async for item in func(*args, **kwargs):
+                        yield item
+            return gen_wrapper
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with make_span(args, kwargs):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with make_span(args, kwargs):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def investigation_breakdown(trace_id, db_path=DB_PATH):
+    """Time per span name for one investigation, slowest first"""
+    recorder.flush()
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("""
+        SELECT name, COUNT(*), SUM(duration), MAX(duration), SUM(status = 'error')
+          FROM spans WHERE trace_id = ?
+         GROUP BY name ORDER BY SUM(duration) DESC
+        """, (trace_id,)).fetchall()
+    except sqlite3.OperationalError:
+        return []
+    finally:
+        conn.close()
+    return [{"name": row[0], "count": row[1], "total": row[2], "max": row[3], "errors": row[4]}
+            for row in rows]
+
+
+def log_breakdown(trace_id, db_path=DB_PATH):
+    breakdown = investigation_breakdown(trace_id, db_path=db_path)
+    logger.info("Trace %s breakdown:", trace_id)
+    for row in breakdown:
+        logger.info("  %-34s calls=%-4d total=%.3fs max=%.3fs errors=%d",
+                    row["name"], row["count"], row["total"], row["max"], row["errors"])
+    return breakdown
@@ -0,0 +1,50 @@
+"""
+Background warm-up for worker processes.
+
+Heavy dependencies are imported where they are used, so starting a process is fast but the first
+investigation would pay for them (several seconds for sklearn, cohere and playwright) and for
+launching Chromium. warm_up does that work in the background right after startup, while the
+worker is still waiting for its first job.
+"""
+import asyncio
+import importlib
+import logging
+import time
+
+from .profiler import get_cohere_client
+
+logger = logging.getLogger(__name__)
+
+#What the first investigation imports: the browser driver, embeddings and summaries, clustering, sweeps
+MODULES = ("playwright.async_api", "cohere", "numpy", "sklearn.cluster", "aiohttp")
+
+
+def preload(modules=MODULES):
+    """Import modules and create the shared Cohere client; failures are logged, not raised"""
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning("Warm-up could not import %s: %s", name, e)
+    try:
+        get_cohere_client()
+    except Exception as e:
+        logger.warning("Warm-up could not create the Cohere client: %s", e)
+
+
+async def _start_browser(scraper):
+    try:
+        await scraper.start()
+    except Exception as e:
+        #The pipeline launches a browser per investigation instead
+        logger.warning("Warm-up could not start the browser: %s", e)
+
+
+async def warm_up(scraper=None, modules=MODULES):
+    """Preload modules on a thread and start scraper's shared browser at the same time"""
+    start = time.perf_counter()
+    tasks = [asyncio.to_thread(preload, modules)]
+    if scraper is not None:
+        tasks.append(_start_browser(scraper))
+    await asyncio.gather(*tasks)
+    logger.info("Warm-up finished in %.1fs", time.perf_counter() - start)
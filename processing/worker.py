@@ -0,0 +1,201 @@
+"""
+Worker pool that runs queued investigations.
+
+    python -m processing.worker --workers 4
+
+Each worker process claims jobs from the `jobs` table, runs discovery (if the job has no
+profile links) and findProfiles, and heartbeats its current stage and partial results.
+The supervisor restarts workers that die and requeues their jobs.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import socket
+import time
+import uuid
+
+from .discovery import discover_profiles
+from .jobs import (DB_PATH, HEARTBEAT_TIMEOUT, init_jobs_db, claim_job, heartbeat,
+                   complete_job, fail_job, requeue_stale_jobs)
+from .main import stream_profiles
+from .shards import make_scraper
+from .tracing import recorder
+from .warmup import warm_up
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = 10.0
+POLL_INTERVAL = 2.0
+#Minimum seconds between partial result writes while summaries stream in
+PARTIAL_WRITE_INTERVAL = 1.0
+#Minimum seconds between progress writes while URLs are being scraped
+PROGRESS_WRITE_INTERVAL = 1.0
+
+
+def new_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+async def run_job(job, worker_id, db_path=DB_PATH, scraper=None):
+    """
+    Run one claimed job to completion, keeping its heartbeat, stage and partial result current.
+    scraper (optional) is the worker's UniversalScraper, whose browser outlives the job.
+    """
+    job_id = job["id"]
+    state = {"stage": "claimed", "urls_done": 0, "urls_total": 0, "stage_started_at": time.time()}
+
+    def progress():
+        return state["urls_done"], state["urls_total"], state["stage_started_at"]
+
+    def on_progress(done, total):
+        state["urls_done"], state["urls_total"] = done, total
+
+    async def set_stage(stage):
+        state["stage"], state["stage_started_at"] = stage, time.time()
+        await heartbeat(job_id, worker_id, stage=stage, progress=progress(), db_path=db_path)
+
+    async def beat():
+        #Progress goes out as soon as it moves, the bare heartbeat every HEARTBEAT_INTERVAL
+        written, last_beat = progress(), time.monotonic()
+        while True:
+            await asyncio.sleep(PROGRESS_WRITE_INTERVAL)
+            if progress() != written or time.monotonic() - last_beat >= HEARTBEAT_INTERVAL:
+                written, last_beat = progress(), time.monotonic()
+                await heartbeat(job_id, worker_id, stage=state["stage"], progress=written, db_path=db_path)
+
+    beat_task = asyncio.create_task(beat())
+    try:
+        profile_links = job["profile_links"]
+        if not profile_links:
+            await set_stage("discovery")
+            profile_links = await asyncio.to_thread(discover_profiles, job["username"])
+
+        #cluster -> {"platforms": [...], "summary": "..."}, written out as it fills in
+        result = {}
+        last_write = 0.0
+        async for event in stream_profiles(profile_links, job["username"],
+                                           refresh_summaries=job["options"].get("refresh_summaries", False),
+                                           delta=job["options"].get("delta", False),
+                                           pivot=job["options"].get("pivot"),
+                                           on_stage=set_stage, scraper=scraper, db_path=db_path,
+                                           pipeline_options={"on_progress": on_progress}):
+            if event[0] == "clusters":
+                for key, platforms in event[1].items():
+                    result[str(key)] = {"platforms": platforms, "summary": ""}
+            elif event[0] == "summary":
+                result[str(event[1])]["summary"] += event[2]
+            elif event[0] == "summary_done":
+                result[str(event[1])]["summary"] = event[2]
+            elif event[0] == "summary_failed":
+                #Drop the partial text; the cluster is saved without a summary
+                result[str(event[1])].update(summary="", summary_error=event[2])
+
+            if time.monotonic() - last_write >= PARTIAL_WRITE_INTERVAL or event[0] == "clusters":
+                await heartbeat(job_id, worker_id, stage=state["stage"], partial_result=result, db_path=db_path)
+                last_write = time.monotonic()
+
+        await complete_job(job_id, worker_id, result, db_path=db_path)
+        logger.info("Job %s (%s) done with %d clusters", job_id, job["username"], len(result))
+    except Exception as e:
+        logger.exception("Job %s (%s) failed", job_id, job["username"])
+        await fail_job(job_id, worker_id, e, db_path=db_path)
+    finally:
+        beat_task.cancel()
+
+
+async def work_loop(worker_id, db_path=DB_PATH, poll_interval=POLL_INTERVAL, max_jobs=None, warm=True):
+    """
+    Claim and run jobs until max_jobs have been run (forever by default).
+    With warm, heavy modules, the Cohere client and a browser shared by every job are loaded in
+    the background while the worker waits for its first job.
+    """
+    await init_jobs_db(db_path)
+    #Shared by every job; its shard processes too, when DEEPSINT_SCRAPE_SHARDS > 1
+    scraper = make_scraper()
+    warming = asyncio.create_task(warm_up(scraper)) if warm else None
+    jobs_run = 0
+    try:
+        while max_jobs is None or jobs_run < max_jobs:
+            job = await claim_job(worker_id, db_path=db_path)
+            if job is None:
+                await asyncio.sleep(poll_interval)
+                continue
+            if warming is not None:
+                #The job needs all of it anyway
+                await warming
+                warming = None
+            logger.info("Worker %s claimed job %s (%s)", worker_id, job["id"], job["username"])
+            await run_job(job, worker_id, db_path=db_path, scraper=scraper)
+            jobs_run += 1
+    finally:
+        if warming is not None:
+            warming.cancel()
+            await asyncio.gather(warming, return_exceptions=True)
+        await scraper.close()
+
+
+def _worker_main(worker_id, db_path):
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s [{worker_id}] %(levelname)s %(message)s")
+    #Spans go to the same database as the jobs and investigations
+    recorder.use_database(db_path)
+    try:
+        asyncio.run(work_loop(worker_id, db_path))
+    except KeyboardInterrupt:
+        pass
+
+
+def run_pool(num_workers, db_path=DB_PATH):
+    """
+    Start num_workers worker processes and supervise them: dead workers are replaced and their
+    jobs requeued, and jobs whose heartbeat went stale are requeued too.
+    """
+    asyncio.run(init_jobs_db(db_path))
+    workers = {}
+
+    def spawn():
+        worker_id = new_worker_id()
+        process = multiprocessing.Process(target=_worker_main, args=(worker_id, db_path), name=worker_id)
+        process.start()
+        workers[worker_id] = process
+
+    for _ in range(num_workers):
+        spawn()
+    logger.info("Started %d workers", num_workers)
+
+    try:
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            for worker_id, process in list(workers.items()):
+                if not process.is_alive():
+                    count = asyncio.run(requeue_stale_jobs(worker_id=worker_id, db_path=db_path))
+                    logger.warning("Worker %s exited (%s), requeued %d jobs", worker_id, process.exitcode, count)
+                    del workers[worker_id]
+                    spawn()
+            count = asyncio.run(requeue_stale_jobs(timeout=HEARTBEAT_TIMEOUT, db_path=db_path))
+            if count:
+                logger.warning("Requeued %d jobs with stale heartbeats", count)
+    except KeyboardInterrupt:
+        logger.info("Shutting down workers")
+    finally:
+        for process in workers.values():
+            process.terminate()
+        for worker_id, process in workers.items():
+            process.join(timeout=10)
+            asyncio.run(requeue_stale_jobs(worker_id=worker_id, db_path=db_path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the investigation worker pool")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="number of worker processes")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite database holding the job queue and investigations")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [supervisor] %(levelname)s %(message)s")
+    run_pool(args.workers, db_path=args.db)
+
+
+if __name__ == "__main__":
+    main()
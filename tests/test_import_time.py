@@ -0,0 +1,6 @@
+from benchmarks.import_time import check
+
+
+def test_entry_points_import_within_budget():
+    results, failures = check()
+    assert not failures, "\n".join(failures)
@@ -0,0 +1,80 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+from processing.jobs import (FAILED, MAX_ATTEMPTS, QUEUED, RUNNING, claim_job, enqueue_job, get_job,
+                             init_jobs_db, requeue_stale_jobs)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def make_queue(db_path, count):
+    async def setup():
+        await init_jobs_db(db_path)
+        return [await enqueue_job(f"user{i}", ["https://example.com"], db_path=db_path) for i in range(count)]
+    return run(setup())
+
+
+def test_concurrent_claimers_never_share_a_job(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    job_ids = make_queue(db_path, 40)
+    claimed = {}
+    start = threading.Barrier(4)
+
+    def claimer(worker_id):
+        #Each thread runs its own event loop, so each has its own connection
+        async def drain():
+            jobs = []
+            while (job := await claim_job(worker_id, db_path=db_path)) is not None:
+                jobs.append(job["id"])
+            return jobs
+        start.wait()
+        claimed[worker_id] = run(drain())
+
+    threads = [threading.Thread(target=claimer, args=(f"worker-{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    all_claims = [job_id for jobs in claimed.values() for job_id in jobs]
+    assert sorted(all_claims) == sorted(job_ids)
+
+
+def test_stale_heartbeat_requeues_the_job(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    stale_id, fresh_id = make_queue(db_path, 2)
+
+    async def scenario():
+        await claim_job("worker-a", db_path=db_path)
+        await claim_job("worker-b", db_path=db_path)
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time() - 120, stale_id))
+        count = await requeue_stale_jobs(timeout=60, db_path=db_path)
+        return count, await get_job(stale_id, db_path=db_path), await get_job(fresh_id, db_path=db_path)
+
+    count, stale, fresh = run(scenario())
+    assert count == 1
+    assert stale["status"] == QUEUED and stale["worker_id"] is None
+    assert fresh["status"] == RUNNING and fresh["worker_id"] == "worker-b"
+
+
+def test_attempt_cap_fails_the_job(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    (job_id,) = make_queue(db_path, 1)
+
+    async def scenario():
+        statuses = []
+        for attempt in range(MAX_ATTEMPTS):
+            job = await claim_job(f"worker-{attempt}", db_path=db_path)
+            assert job["id"] == job_id and job["attempts"] == attempt + 1
+            await requeue_stale_jobs(worker_id=f"worker-{attempt}", db_path=db_path)
+            statuses.append((await get_job(job_id, db_path=db_path))["status"])
+        return statuses, await claim_job("worker-last", db_path=db_path)
+
+    statuses, reclaimed = run(scenario())
+    assert statuses == [QUEUED] * (MAX_ATTEMPTS - 1) + [FAILED]
+    assert reclaimed is None
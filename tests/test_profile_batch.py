@@ -0,0 +1,27 @@
+import pytest
+
+from processing.profile_batch import ProfileBatch, PROFILE_FIELDS
+from processing.scraper import Profile
+
+
+def make_profiles(count):
+    return [Profile(url=f"https://site{i % 7}.example/alice{i}", platform=f"site{i % 7}", username="alice",
+                    followers=i, links=[f"https://link{i}.example"], posts=[{"text": f"post {i}"}],
+                    metadata={"k": i}, scraped_at=f"2026-01-0{i % 9 + 1}T12:00:00")
+            for i in range(count)]
+
+
+def as_dicts(profiles):
+    return [{name: getattr(profile, name) for name in PROFILE_FIELDS} for profile in profiles]
+
+
+@pytest.mark.parametrize("first, second", [("a.arrow", "b.parquet"), ("a.parquet", "b.arrow"),
+                                           ("a.arrow", "b.arrow")])
+def test_resaving_a_loaded_batch_round_trips(tmp_path, first, second):
+    profiles = make_profiles(25)
+    ProfileBatch.from_profiles(profiles, chunk_size=10).write(str(tmp_path / first))
+    ProfileBatch.read(str(tmp_path / first)).write(str(tmp_path / second))
+
+    reloaded = ProfileBatch.read(str(tmp_path / second))
+    assert as_dicts(reloaded) == as_dicts(profiles)
+    assert reloaded.to_dicts()[3]["metadata"] == {"k": 3}
@@ -0,0 +1,86 @@
+"""
+Cached data layer for the Streamlit pages.
+
+Streamlit reruns the whole script on every click, so pages read through here instead of going to
+SQLite each time. Lists and searches are cached under the current results version (the newest
+processing_results id), which moves as soon as any investigation is saved, whether by a worker
+or the batch CLI; stale entries are then simply never asked for again. A saved result never
+changes, so its detail is cached by id alone. Job progress is never cached: it is a single-row
+read meant to be polled. Cluster structures are cached as shared resources, so moving the
+granularity slider re-clusters without reading or copying the similarity matrices again.
+"""
+import asyncio
+
+import streamlit as st
+
+from processing.delta import get_changes
+from processing.jobs import init_jobs_db, get_job_progress, list_jobs_sync
+from processing.results_store import (init_results_db_sync, results_version, list_results, get_result,
+                                      get_result_clusters, get_cluster_members)
+from processing.search_index import search_profiles
+
+DB_PATH = "data/osint.db"
+
+#Bump when the shape of cached values changes, so old entries are never read back
+CACHE_VERSION = 1
+#Cached pages and searches kept per function; older ones are dropped first
+MAX_ENTRIES = 256
+
+
+@st.cache_resource
+def init_storage(db_path=DB_PATH):
+    """Create the tables the pages read, once per server process instead of on every rerun"""
+    init_results_db_sync(db_path)
+    asyncio.run(init_jobs_db(db_path))
+    return True
+
+
+def current_version(db_path=DB_PATH):
+    return (CACHE_VERSION, results_version(db_path))
+
+
+@st.cache_data(max_entries=MAX_ENTRIES, show_spinner=False)
+def results_page(version, cursor=None, username=None, db_path=DB_PATH):
+    """One page of list_results; cursor must be hashable (a tuple or None)"""
+    return list_results(cursor, username=username, db_path=db_path)
+
+
+@st.cache_data(max_entries=MAX_ENTRIES, show_spinner=False)
+def result_detail(result_id, cache_version=CACHE_VERSION, db_path=DB_PATH):
+    """A result with its clusters, their members and any recorded changes, in one cached read"""
+    result = get_result(result_id, db_path=db_path)
+    if result is None:
+        return None
+    clusters = get_result_clusters(result_id, db_path=db_path)
+    for cluster in clusters:
+        cluster["members"] = get_cluster_members(cluster["id"], db_path=db_path)
+    changes = get_changes(result["file_path"], db_path=db_path) if result["file_path"] else []
+    return {"result": result, "clusters": clusters, "changes": changes}
+
+
+@st.cache_data(max_entries=MAX_ENTRIES, show_spinner=False)
+def profile_search(version, query, limit, db_path=DB_PATH):
+    return search_profiles(query, limit=limit, db_path=db_path)
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def cluster_structure(file_path, db_path=DB_PATH):
+    """(ClusterStructure, saved parameters) of an investigation, or None if it has none saved"""
+    #numpy is only loaded once a result is opened
+    from processing.cluster_structure import load_cluster_structure
+    return load_cluster_structure(file_path, db_path=db_path)
+
+
+def job_progress(job_id, db_path=DB_PATH):
+    """Status, stage, URLs done/total, ETA and partial result of a job (uncached, for polling)"""
+    return get_job_progress(job_id, db_path=db_path)
+
+
+def recent_jobs(limit=10, db_path=DB_PATH):
+    return list_jobs_sync(limit=limit, db_path=db_path)
+
+
+def invalidate():
+    """Drop every cached read, e.g. after a job this session was following finishes"""
+    results_page.clear()
+    profile_search.clear()